@@ -0,0 +1,166 @@
+import glob
+import os
+import tempfile
+import zipfile
+import numpy as np
+from face_store import gallery_fingerprint
+
+INDEX_VERSION = 2
+# What a missing, truncated, outdated or half-replaced index file raises on load
+INDEX_ERRORS = (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile)
+
+
+def _assign(vectors, centroids, chunk=8192):
+    """Index of the nearest centroid for each vector, computed in chunks to bound memory."""
+    c_norms = np.einsum('ij,ij->i', centroids, centroids)
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        block = vectors[start:start + chunk]
+        # ||x||^2 is constant per row, so it does not change the argmin
+        out[start:start + chunk] = np.argmin(c_norms[None, :] - 2.0 * (block @ centroids.T), axis=1)
+    return out
+
+
+def _kmeans(vectors, n_lists, n_iter, rng):
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = _assign(vectors, centroids)
+        counts = np.bincount(assign, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty lists from random points so no list stays dead
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over face encodings (pure NumPy).
+
+    The gallery is partitioned into ``n_lists`` k-means cells. A query only
+    scans the ``nprobe`` closest cells, so ``nprobe`` is the recall/latency
+    knob: larger values approach exact search, smaller ones are faster.
+
+    ``vectors`` holds the gallery rows in list order (row i is gallery row
+    ``list_ids[i]``), so each probed list is one contiguous slice. A saved
+    index keeps them in a sidecar .npy that load() memory-maps, so worker
+    processes share them through the page cache like the store itself.
+    """
+
+    def __init__(self, centroids, list_offsets, list_ids, vectors, fingerprint=''):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_ids = np.asarray(list_ids, dtype=np.int32)
+        self.vectors = vectors
+        self.fingerprint = fingerprint
+        self._c_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, encodings, n_lists=None, n_iter=10, seed=0, fingerprint=None):
+        vectors = np.ascontiguousarray(encodings, dtype=np.float32)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(seed)
+        # Train on a subsample; ~64 points per list is plenty for k-means
+        sample_size = min(len(vectors), 64 * n_lists)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = _kmeans(sample, n_lists, n_iter, rng)
+        assign = _assign(vectors, centroids)
+        list_ids = np.argsort(assign, kind='stable').astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=list_offsets[1:])
+        return cls(centroids, list_offsets, list_ids, np.ascontiguousarray(vectors[list_ids]),
+                   fingerprint or gallery_fingerprint(vectors))
+
+    def probe(self, queries, nprobe=8):
+        """Ids of the ``nprobe`` closest lists for each query, shape (queries, nprobe)."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        nprobe = min(nprobe, self.n_lists)
+        scores = self._c_norms[None, :] - 2.0 * (queries @ self.centroids.T)
+        if nprobe < self.n_lists:
+            return np.argpartition(scores, nprobe - 1, axis=1)[:, :nprobe]
+        return np.broadcast_to(np.arange(self.n_lists), scores.shape)
+
+    def list_slices(self, probes):
+        """Slices into list-ordered storage (gallery rows permuted by list_ids) for the given lists."""
+        offsets = self.list_offsets
+        return [slice(offsets[p], offsets[p + 1]) for p in probes]
+
+    def save(self, path):
+        """Write the index to path (.npz) and its list-ordered vectors to a sidecar .npy.
+
+        Both go through unique temporary files and are renamed into place,
+        vectors first, so processes building the same index at once never
+        write into each other's files. The sidecar is named after the gallery
+        and the list count, which fix its content.
+        """
+        directory = os.path.dirname(path) or '.'
+        stem = os.path.splitext(os.path.basename(path))[0]
+        vectors_file = f'{stem}.{self.fingerprint[:16]}.{self.n_lists}.vectors.npy'
+        _atomic_save(os.path.join(directory, vectors_file), lambda f: np.save(f, np.ascontiguousarray(self.vectors)))
+        _atomic_save(path, lambda f: np.savez(f, version=INDEX_VERSION, centroids=self.centroids,
+                                              list_offsets=self.list_offsets, list_ids=self.list_ids,
+                                              vectors_file=np.array(vectors_file), fingerprint=np.array(self.fingerprint)))
+        for old in glob.glob(os.path.join(directory, f'{stem}.*.vectors.npy')):
+            if os.path.basename(old) != vectors_file:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass # Still mapped by a reader on Windows; replaced on a later save
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != INDEX_VERSION:
+                raise ValueError(f'Unsupported index version in {path}')
+            centroids, list_offsets, list_ids = data['centroids'], data['list_offsets'], data['list_ids']
+            vectors_file, fingerprint = str(data['vectors_file']), str(data['fingerprint'])
+        vectors = np.load(os.path.join(os.path.dirname(path), vectors_file), mmap_mode='r' if mmap else None,
+                          allow_pickle=False)
+        if vectors.shape[0] != len(list_ids) or vectors.shape[1] != centroids.shape[1]:
+            raise ValueError(f'Index vectors in {vectors_file} do not match {path}')
+        return cls(centroids, list_offsets, list_ids, vectors, fingerprint)
+
+
+def _atomic_save(path, write_fn):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_or_build_index(path, encodings, n_lists=None, fingerprint=None):
+    """Load the index at path if it matches the gallery, otherwise rebuild and save it.
+
+    Pass the store's precomputed fingerprint to avoid hashing the whole gallery.
+    """
+    fingerprint = fingerprint or gallery_fingerprint(encodings)
+    if os.path.exists(path):
+        try:
+            index = IVFIndex.load(path)
+            if index.fingerprint == fingerprint and (n_lists is None or index.n_lists == min(n_lists, len(encodings))):
+                return index
+            print('ANN index is stale, rebuilding.')
+        except INDEX_ERRORS as e:
+            print(f'Could not load ANN index ({e}), rebuilding.')
+    index = IVFIndex.build(encodings, n_lists=n_lists, fingerprint=fingerprint)
+    try:
+        index.save(path)
+        # Map the saved vectors instead of keeping this process's private copy
+        return IVFIndex.load(path)
+    except INDEX_ERRORS as e:
+        print(f'Could not save ANN index: {e}')
+    return index
@@ -0,0 +1,302 @@
+import os
+import glob
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from detections import DetectionWriter
+from engine import RecognitionEngine, YOLO_MODEL_PATH
+from main import analyze_frame, analyze_frames, read_frames
+from metrics import get_metrics
+from tracking import IoUTracker, IdentityCache, make_motion_gate
+from utils import draw_detections
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v')
+MANIFEST_EXTENSIONS = ('.txt', '.lst')
+DETECTIONS_SUFFIX = '.detections' # + .jsonl or .parquet; renamed into place last, so its presence marks an item as finished
+DETECTIONS_FORMATS = ('jsonl', 'parquet')
+REPORT_FILE = 'batch_report.json'
+
+# Per-worker state, set by _init_worker in each pool process
+_engine = None
+_settings = None
+
+
+def media_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    return None
+
+
+def collect_inputs(inputs):
+    """Expand files, directories (recursively), glob patterns and manifest files into media paths.
+
+    A manifest is a .txt/.lst file with one path or pattern per line; blank
+    lines and lines starting with # are ignored. Duplicates are dropped and
+    the order of first appearance is kept.
+    """
+    found = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            for root, _, files in os.walk(entry):
+                found.extend(os.path.join(root, f) for f in sorted(files))
+        elif os.path.isfile(entry) and entry.lower().endswith(MANIFEST_EXTENSIONS):
+            with open(entry) as f:
+                lines = [line.strip() for line in f]
+            found.extend(collect_inputs([line for line in lines if line and not line.startswith('#')]))
+        elif os.path.isfile(entry):
+            found.append(entry)
+        else:
+            matches = sorted(glob.glob(entry, recursive=True))
+            if not matches:
+                print(f'No input matches {entry}')
+            found.extend(collect_inputs(matches) if any(os.path.isdir(m) for m in matches) else matches)
+    seen = set()
+    paths = []
+    for path in found:
+        key = os.path.abspath(path)
+        if key not in seen and media_kind(path):
+            seen.add(key)
+            paths.append(path)
+    return paths
+
+
+def output_paths(path, output_dir, fmt='jsonl'):
+    """Annotated-output and detections paths for an input; stable across runs for resuming."""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    # Short hash of the absolute path keeps same-named files from different folders apart
+    tag = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    base = os.path.join(output_dir, f'{stem}_{tag}')
+    return base + ext.lower(), f'{base}{DETECTIONS_SUFFIX}.{fmt}'
+
+
+def _write_json(path, payload):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(settings, model_path):
+    """Load a private detector and gallery in each worker process."""
+    global _engine, _settings
+    _settings = settings
+    _engine = RecognitionEngine(model_path).load(settings)
+    if _engine.matcher is None:
+        print('No known faces loaded; every face will be reported as Unknown.')
+
+
+def _class_ids(classes):
+    """Resolve a class filter against this worker's model (ValueError for unknown classes)."""
+    return _engine.class_ids(classes)
+
+
+def _process_image(path, media_out, sink):
+    """Returns (frames, faces, extra summary fields)."""
+    frame = cv2.imread(path)
+    if frame is None:
+        raise IOError(f'Cannot read image {path}')
+    matcher = _engine.current_matcher(_settings)
+    detections = analyze_frame(frame, None, matcher, _settings['threshold'],
+                               results=_engine.detect(frame, _settings['yolo_conf'], _settings['yolo_iou'], _settings.get('classes')),
+                               settings=_settings)
+    if media_out:
+        draw_detections(frame, detections, _settings.get('render', 'full'))
+        root, ext = os.path.splitext(media_out)
+        part_path = root + '.part' + ext
+        cv2.imwrite(part_path, frame)
+        os.replace(part_path, media_out)
+    sink.write(0, 0.0, detections)
+    get_metrics().frame_done()
+    return 1, sum(len(d.faces) for d in detections), {}
+
+
+def _process_video(path, media_out, sink):
+    """Stream per-frame detections to sink; returns (frames, faces, extra summary fields)."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f'Cannot open video {path}')
+    writer = None
+    part_path = None
+    if media_out:
+        root, ext = os.path.splitext(media_out)
+        part_path = root + '.part' + ext
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        writer = cv2.VideoWriter(part_path, cv2.VideoWriter.fourcc(*'mp4v'), fps, size)
+    tracker = identity_cache = None
+    if _settings.get('identity_cache'):
+        identity_cache = IdentityCache(clock=lambda: cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+        tracker = IoUTracker()
+    gate = make_motion_gate(_settings.get('motion_gate'))
+    batch_size = max(1, int(_settings.get('batch_size', 1)))
+    frame_index = faces = 0
+    try:
+        while True:
+            # Stream position is read before the batch so each frame gets its own timestamp
+            start_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            frames = read_frames(cap, batch_size)
+            if not frames:
+                break
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25
+            matcher = _engine.current_matcher(_settings)
+            moved = gate.select(frames) if gate is not None else [True] * len(frames)
+            active = [frame for frame, flag in zip(frames, moved) if flag]
+            started = time.perf_counter()
+            batch_results = _engine.detect_batch(active, _settings['yolo_conf'], _settings['yolo_iou'],
+                                                 _settings.get('classes')) if active else []
+            batch_detections = analyze_frames(active, None, matcher, _settings['threshold'],
+                                              results=[[r] for r in batch_results],
+                                              tracker=tracker, identity_cache=identity_cache, settings=_settings)
+            if gate is not None:
+                gate.record(time.perf_counter() - started, len(active))
+                batch_detections = gate.fill(moved, batch_detections)
+            for offset, (frame, detections) in enumerate(zip(frames, batch_detections)):
+                sink.write(frame_index, round(start_ms / 1000.0 + offset / fps, 3), detections)
+                get_metrics().frame_done()
+                frame_index += 1
+                faces += sum(len(d.faces) for d in detections)
+                if writer is not None:
+                    draw_detections(frame, detections, _settings.get('render', 'full'))
+                    writer.write(frame)
+    except BaseException:
+        if writer is not None:
+            writer.release()
+            writer = None
+            if os.path.exists(part_path):
+                os.remove(part_path) # No half-written annotated copy left behind
+        raise
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    if part_path is not None:
+        os.replace(part_path, media_out)
+    return frame_index, faces, ({'motion_gate': gate.stats()} if gate is not None else {})
+
+
+def process_item(path, media_out, detections_out):
+    """Process one input inside a worker; returns its summary for the batch report.
+
+    Detections are streamed through a buffered DetectionWriter into a .part
+    file, so memory stays flat for long videos, and renamed into place at
+    the end.
+    """
+    start = time.perf_counter()
+    kind = media_kind(path)
+    root, ext = os.path.splitext(detections_out)
+    part_path = root + '.part' + ext
+    process = _process_image if kind == 'image' else _process_video
+    try:
+        with DetectionWriter(part_path, fmt=ext[1:], source=os.path.abspath(path)) as sink:
+            frames, faces, extra = process(path, media_out, sink)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    os.replace(part_path, detections_out)
+    summary = {'path': path, 'kind': kind, 'frames': frames, 'faces': faces,
+               'seconds': round(time.perf_counter() - start, 3)}
+    summary.update(extra)
+    return summary
+
+
+def run_batch(inputs, output_dir, settings, workers=1, resume=True, model_path=YOLO_MODEL_PATH):
+    """Process images and videos without a display, spread over a pool of worker processes.
+
+    Each worker loads its own detector and gallery once. For every input an
+    annotated copy (unless settings['render'] is 'none') and a detections
+    file (settings['detections_format'], 'jsonl' or 'parquet'; one
+    detections.RECORD_FIELDS row per box and face) are written to
+    output_dir. With resume, inputs whose
+    detections file already exists are skipped, so an interrupted run can
+    simply be restarted. Returns the aggregate report, also saved as
+    batch_report.json.
+    """
+    fmt = settings.get('detections_format', 'jsonl')
+    if fmt not in DETECTIONS_FORMATS:
+        raise ValueError(f'Unknown detections format {fmt!r}')
+    if fmt == 'parquet':
+        try:
+            import pyarrow # Fail once here rather than once per input in the workers
+        except ImportError:
+            raise ImportError('Parquet detection output needs pyarrow (pip install pyarrow); use --detections-format jsonl')
+    os.makedirs(output_dir, exist_ok=True)
+    paths = collect_inputs(inputs)
+    jobs = []
+    skipped = 0
+    for path in paths:
+        media_out, detections_out = output_paths(path, output_dir, fmt)
+        if resume and os.path.exists(detections_out):
+            skipped += 1
+            continue
+        jobs.append((path, media_out if settings.get('render', 'full') != 'none' else None, detections_out))
+    print(f'{len(paths)} inputs, {skipped} already done, {len(jobs)} to process with {workers} worker(s)')
+
+    done, failed = [], []
+    start = time.perf_counter()
+
+    def finished(path, future_result):
+        try:
+            summary = future_result()
+        except Exception as e:
+            print(f'[{len(done) + len(failed) + 1}/{len(jobs)}] FAILED {path}: {e}')
+            failed.append({'path': path, 'error': str(e)})
+            return
+        done.append(summary)
+        gate = summary.get('motion_gate')
+        print(f"[{len(done) + len(failed)}/{len(jobs)}] {path}: {summary['frames']} frame(s), "
+              f"{summary['faces']} face(s) in {summary['seconds']}s"
+              + (f", {gate['skipped']} static frame(s) skipped" if gate else ''))
+
+    if workers <= 1:
+        if jobs:
+            _init_worker(settings, model_path)
+            _class_ids(settings.get('classes')) # ValueError before any input is processed
+        for job in jobs:
+            finished(job[0], lambda: process_item(*job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(settings, model_path)) as pool:
+            if jobs:
+                # Checked against a worker's model, so no extra model is loaded here
+                pool.submit(_class_ids, settings.get('classes')).result()
+            futures = {pool.submit(process_item, *job): job[0] for job in jobs}
+            for future in as_completed(futures):
+                finished(futures[future], future.result)
+
+    elapsed = time.perf_counter() - start
+    frames = sum(s['frames'] for s in done)
+    report = {
+        'inputs': len(paths),
+        'skipped': skipped,
+        'processed': len(done),
+        'failed': failed,
+        'images': sum(1 for s in done if s['kind'] == 'image'),
+        'videos': sum(1 for s in done if s['kind'] == 'video'),
+        'frames': frames,
+        'faces': sum(s['faces'] for s in done),
+        'elapsed_s': round(elapsed, 3),
+        'items_per_s': round(len(done) / elapsed, 3) if elapsed else 0.0,
+        'frames_per_s': round(frames / elapsed, 2) if elapsed else 0.0,
+        'workers': workers,
+        'items': done,
+    }
+    gated = [s['motion_gate'] for s in done if 'motion_gate' in s]
+    if gated:
+        gated_frames = sum(g['frames'] for g in gated)
+        report['motion_gate'] = {'skipped': sum(g['skipped'] for g in gated),
+                                 'skip_ratio': round(sum(g['skipped'] for g in gated) / gated_frames, 3) if gated_frames else 0.0,
+                                 'saved_s': round(sum(g['saved_s'] for g in gated), 2)}
+    _write_json(os.path.join(output_dir, REPORT_FILE), report)
+    print(f"Processed {report['processed']} item(s) ({report['frames']} frames) in {report['elapsed_s']}s: "
+          f"{report['items_per_s']} items/s, {report['frames_per_s']} frames/s, {len(failed)} failed")
+    if 'motion_gate' in report:
+        print(f"Motion gate: {report['motion_gate']['skipped']} static frames skipped "
+              f"({report['motion_gate']['skip_ratio']:.0%}), about {report['motion_gate']['saved_s']}s of detection saved")
+    return report
@@ -0,0 +1,72 @@
+"""Compare the IVF ANN index against exact search on synthetic galleries.
+
+Reports recall@1 (ANN identity == exact identity) and queries per second.
+
+    python benchmarks/bench_ann.py --sizes 1000 10000 100000 --nprobe 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_matcher import FaceMatcher
+from ann_index import IVFIndex
+
+DIM = 128
+
+
+def synthetic_gallery(n_identities, per_identity, rng):
+    """Identity centres with roughly dlib-like scale, plus jittered samples around them."""
+    centres = rng.normal(0, 0.09, size=(n_identities, DIM)).astype(np.float32)
+    samples = np.repeat(centres, per_identity, axis=0)
+    samples += rng.normal(0, 0.02, size=samples.shape).astype(np.float32)
+    names = [f'person_{i}' for i in range(n_identities) for _ in range(per_identity)]
+    return centres, samples, names
+
+
+def run_queries(matcher, queries, batch):
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(queries), batch):
+        results.extend(matcher.match(queries[i:i + batch], tolerance=0.6))
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ANN vs exact face matcher benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--per-identity', type=int, default=1, help='Encodings per synthetic identity')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=8, help='Faces matched per call (faces per frame)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'identities':>10} {'mode':>12} {'recall@1':>9} {'qps':>10} {'build_s':>8}")
+    for size in args.sizes:
+        centres, samples, names = synthetic_gallery(size, args.per_identity, rng)
+        picks = rng.integers(0, size, args.queries)
+        queries = centres[picks] + rng.normal(0, 0.03, size=(args.queries, DIM)).astype(np.float32)
+
+        matcher = FaceMatcher(samples, names)
+        exact, exact_qps = run_queries(matcher, queries, args.batch)
+        print(f"{size:>10} {'exact':>12} {1.0:>9.3f} {exact_qps:>10.0f} {0.0:>8.2f}")
+
+        start = time.perf_counter()
+        index = IVFIndex.build(matcher.encodings)
+        build_s = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            if nprobe >= index.n_lists:
+                continue
+            matcher.attach_index(index, nprobe)
+            approx, qps = run_queries(matcher, queries, args.batch)
+            recall = np.mean([a.name == e.name for a, e in zip(approx, exact)])
+            print(f"{size:>10} {'ivf/' + str(nprobe):>12} {recall:>9.3f} {qps:>10.0f} {build_s:>8.2f}")
+        matcher.attach_index(None)
+
+
+if __name__ == '__main__':
+    main()
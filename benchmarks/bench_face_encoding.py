@@ -0,0 +1,58 @@
+"""Per-face-ROI encoding calls versus one batched encoder call per frame window.
+
+Reuses the tiled known_faces/ scenes of bench_face_modes.py. The baseline
+calls face_recognition.face_encodings once per person box, as the ROI path
+used to; the batched path locates the same faces and encodes every chip of
+--window frames in a single face_ops.encode_faces call. Face location time
+is excluded from both.
+
+    python benchmarks/bench_face_encoding.py --people 1 5 10 20 --window 1 8
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+import face_recognition
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench_face_modes import load_tiles, synthetic_scene
+from face_ops import encode_faces
+from main import locate_in_boxes
+
+
+def per_box(rgb, boxes, located):
+    # Original path: crop each box and encode its faces in box coordinates
+    for (x1, y1, x2, y2), locations in zip(boxes, located):
+        face_recognition.face_encodings(rgb[y1:y2, x1:x2], [(t-y1, r-x1, b-y1, l-x1) for t, r, b, l in locations])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-ROI vs batched face encoding benchmark')
+    parser.add_argument('--people', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--window', type=int, nargs='+', default=[1, 8], help='Frames encoded per batched call')
+    parser.add_argument('--overlap', type=float, default=0.25, help='Box padding as a fraction of the tile')
+    args = parser.parse_args()
+
+    tiles = load_tiles(max(args.people))
+    print(f"{'people':>6} {'window':>6} {'faces':>6} {'roi_ms':>8} {'batch_ms':>9} {'speedup':>8}")
+    for people in args.people:
+        frame, boxes = synthetic_scene(tiles, people, args.overlap)
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        located = locate_in_boxes(rgb, boxes, 'roi')
+        flat = [loc for locations in located for loc in locations]
+        for window in args.window:
+            start = time.perf_counter()
+            for _ in range(window):
+                per_box(rgb, boxes, located)
+            roi_s = time.perf_counter() - start
+            start = time.perf_counter()
+            encode_faces([rgb] * window, [flat] * window)
+            batch_s = time.perf_counter() - start
+            print(f"{people:>6} {window:>6} {len(flat) * window:>6} {roi_s * 1000:>8.1f} {batch_s * 1000:>9.1f} "
+                  f"{roi_s / batch_s if batch_s else float('nan'):>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Per-person-ROI face detection versus one full-frame pass, as the crowd grows.
+
+Builds synthetic frames by tiling images from known_faces/ into a grid, uses
+the tiles (widened so neighbours overlap) as person boxes, and times face
+recognition for each mode. YOLO is not involved.
+
+    python benchmarks/bench_face_modes.py --people 1 5 10 20
+"""
+import argparse
+import glob
+import math
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from face_matcher import FaceMatcher
+from main import recognize_in_box, recognize_in_frame
+
+TILE = 240
+
+
+def load_tiles(limit):
+    paths = sorted(glob.glob(os.path.join(ROOT, 'known_faces', '*', '*')))
+    tiles = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is not None:
+            tiles.append(cv2.resize(image, (TILE, TILE), interpolation=cv2.INTER_AREA))
+        if len(tiles) >= limit:
+            break
+    return tiles
+
+
+def synthetic_scene(tiles, people, overlap):
+    cols = math.ceil(math.sqrt(people))
+    rows = math.ceil(people / cols)
+    frame = np.zeros((rows * TILE, cols * TILE, 3), dtype=np.uint8)
+    boxes = []
+    for i in range(people):
+        r, c = divmod(i, cols)
+        frame[r * TILE:(r + 1) * TILE, c * TILE:(c + 1) * TILE] = tiles[i % len(tiles)]
+        pad = int(TILE * overlap)
+        boxes.append((max(0, c * TILE - pad), max(0, r * TILE - pad),
+                      min(frame.shape[1], (c + 1) * TILE + pad), min(frame.shape[0], (r + 1) * TILE + pad)))
+    return frame, boxes
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ROI vs full-frame face detection benchmark')
+    parser.add_argument('--people', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--overlap', type=float, default=0.25, help='Box padding as a fraction of the tile')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tiles = load_tiles(max(args.people))
+    matcher = FaceMatcher([], [])
+    print(f"{'people':>6} {'roi_ms':>8} {'roi_faces':>9} {'frame_ms':>9} {'frame_faces':>11} {'speedup':>8}")
+    for people in args.people:
+        frame, boxes = synthetic_scene(tiles, people, args.overlap)
+        roi_s, roi = timed(lambda: [recognize_in_box(frame, b, matcher, 0.5) for b in boxes], args.repeat)
+        frame_s, full = timed(lambda: recognize_in_frame(frame, boxes, matcher, 0.5), args.repeat)
+        roi_faces = sum(len(f) for f in roi)
+        frame_faces = sum(len(f) for f in full)
+        print(f"{people:>6} {roi_s * 1000:>8.1f} {roi_faces:>9} {frame_s * 1000:>9.1f} {frame_faces:>11} {roi_s / frame_s:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Speed and recall of face location at several detection scales.
+
+Each image under known_faces/ is letterboxed into 1080p and 4K canvases.
+Faces located at full scale are the reference; for every other scale the
+benchmark reports location time, recall (reference faces found again with
+IoU >= 0.5) and the mean encoding drift of the recovered faces, since
+encodings are always computed from full-resolution pixels.
+
+    python benchmarks/bench_face_scale.py --scales 1.0 0.75 0.5 0.25
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import cv2
+import numpy as np
+import face_recognition
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from face_ops import locate_faces
+from tracking import iou
+
+RESOLUTIONS = {'1080p': (1920, 1080), '4k': (3840, 2160)}
+
+
+def letterbox(image, size):
+    w, h = size
+    ratio = min(w / image.shape[1], h / image.shape[0])
+    resized = cv2.resize(image, (int(image.shape[1] * ratio), int(image.shape[0] * ratio)))
+    canvas = np.zeros((h, w, 3), dtype=np.uint8)
+    y, x = (h - resized.shape[0]) // 2, (w - resized.shape[1]) // 2
+    canvas[y:y + resized.shape[0], x:x + resized.shape[1]] = resized
+    return canvas
+
+
+def as_xyxy(location):
+    top, right, bottom, left = location
+    return (left, top, right, bottom)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Face detection scale benchmark')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.75, 0.5, 0.25])
+    parser.add_argument('--resolutions', nargs='+', default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument('--limit', type=int, default=10, help='Number of known_faces images to use')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(ROOT, 'known_faces', '*', '*')))[:args.limit]
+    images = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in map(cv2.imread, paths) if img is not None]
+    print(f"{'res':>6} {'scale':>6} {'ms/img':>8} {'recall':>7} {'drift':>7}")
+    for res in args.resolutions:
+        canvases = [letterbox(img, RESOLUTIONS[res]) for img in images]
+        reference = [face_recognition.face_locations(c) for c in canvases]
+        ref_encodings = [face_recognition.face_encodings(c, locs) for c, locs in zip(canvases, reference)]
+        total_ref = sum(len(r) for r in reference)
+        for scale in args.scales:
+            elapsed, found, drifts = 0.0, 0, []
+            for canvas, ref_locs, ref_encs in zip(canvases, reference, ref_encodings):
+                start = time.perf_counter()
+                locations = locate_faces(canvas, scale)
+                elapsed += time.perf_counter() - start
+                encodings = face_recognition.face_encodings(canvas, locations)
+                for ref_loc, ref_enc in zip(ref_locs, ref_encs):
+                    scores = [iou(as_xyxy(ref_loc), as_xyxy(loc)) for loc in locations]
+                    if scores and max(scores) >= 0.5:
+                        found += 1
+                        drifts.append(float(np.linalg.norm(encodings[int(np.argmax(scores))] - ref_enc)))
+            recall = found / total_ref if total_ref else float('nan')
+            drift = np.mean(drifts) if drifts else float('nan')
+            print(f"{res:>6} {scale:>6.2f} {elapsed / len(canvases) * 1000:>8.1f} {recall:>7.3f} {drift:>7.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Startup time and memory of the legacy pickle versus the memory-mapped store.
+
+Each measurement runs in a fresh interpreter that loads the gallery and
+builds a FaceMatcher, then reports wall time, RSS and USS (memory unique to
+the process). Mapped store pages live in the page cache; they only leave USS
+once a second process maps the same store, so USS here is an upper bound.
+
+    python benchmarks/bench_store.py --sizes 10000 100000
+"""
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from face_store import save_store
+
+CHILD = r'''
+import json, os, pickle, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import numpy as np
+from face_matcher import FaceMatcher
+from face_store import load_store
+if {kind!r} == 'pickle':
+    with open({path!r}, 'rb') as f:
+        data = pickle.load(f)
+    matcher = FaceMatcher(data['encodings'], data['names'])
+else:
+    matcher = FaceMatcher.from_store(load_store({path!r}))
+matcher.match(np.zeros((1, 128), dtype=np.float32))
+elapsed = time.perf_counter() - start
+try:
+    import psutil
+    mem = psutil.Process().memory_full_info()
+    rss, uss = mem.rss, mem.uss
+except ImportError:
+    # Linux fallback; ru_maxrss is not usable here as it inherits the parent's peak
+    fields = {{}}
+    for name in ('/proc/self/status', '/proc/self/smaps_rollup'):
+        if os.path.exists(name):
+            with open(name) as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    if value.strip().endswith('kB'):
+                        fields[key] = int(value.split()[0]) * 1024
+    rss = fields.get('VmRSS')
+    uss = fields['Private_Clean'] + fields['Private_Dirty'] if 'Private_Dirty' in fields else None
+print(json.dumps({{'seconds': elapsed, 'rss': rss, 'uss': uss}}))
+'''
+
+
+def measure(kind, path):
+    out = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT, kind=kind, path=path)],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def fmt_mb(value):
+    return f'{value / 2**20:.1f}' if value is not None else 'n/a'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pickle vs memory-mapped store benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'encodings':>10} {'format':>7} {'load_s':>8} {'rss_mb':>8} {'uss_mb':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            encodings = rng.normal(0, 0.09, size=(size, 128))
+            names = [f'person_{i // 5}' for i in range(size)]
+            pickle_path = os.path.join(tmp, f'{size}.pkl')
+            store_dir = os.path.join(tmp, f'{size}_store')
+            # Same layout encode_faces.py used to write: a list of float64 arrays
+            with open(pickle_path, 'wb') as f:
+                pickle.dump({'encodings': list(encodings), 'names': names}, f)
+            save_store(store_dir, encodings, names)
+            for kind, path in (('pickle', pickle_path), ('store', store_dir)):
+                runs = [measure(kind, path) for _ in range(args.repeat)]
+                best = min(runs, key=lambda r: r['seconds'])
+                print(f"{size:>10} {kind:>7} {best['seconds']:>8.3f} {fmt_mb(best['rss']):>8} {fmt_mb(best['uss']):>8}")
+
+
+if __name__ == '__main__':
+    main()
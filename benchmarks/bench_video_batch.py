@@ -0,0 +1,57 @@
+"""Frames per second of the per-frame video loop versus batched detection.
+
+Runs detection plus process_frame over the first --frames frames of a video
+for each batch size (1 is the original per-frame loop). Needs the YOLO weights.
+
+    python benchmarks/bench_video_batch.py Input/clip.mp4 --batch-sizes 1 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import RecognitionEngine
+from face_matcher import FaceMatcher
+from main import process_frame, read_frames
+
+
+def run(engine, matcher, video, batch_size, max_frames, conf, iou):
+    cap = cv2.VideoCapture(video)
+    processed = 0
+    start = time.perf_counter()
+    while processed < max_frames:
+        frames = read_frames(cap, min(batch_size, max_frames - processed))
+        if not frames:
+            break
+        for frame, results in zip(frames, engine.detect_batch(frames, conf, iou)):
+            process_frame(frame, None, matcher, 0.5, results=[results])
+        processed += len(frames)
+    cap.release()
+    return processed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-frame vs batched YOLO video throughput')
+    parser.add_argument('video')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--iou', type=float, default=0.45)
+    args = parser.parse_args()
+
+    engine = RecognitionEngine().load()
+    # Recognition cost is identical across batch sizes; an empty gallery is enough without one
+    matcher = engine.matcher or FaceMatcher([], [])
+    baseline = None
+    print(f"{'batch':>6} {'frames':>7} {'fps':>8} {'speedup':>8}")
+    for batch_size in args.batch_sizes:
+        frames, seconds = run(engine, matcher, args.video, batch_size, args.frames, args.conf, args.iou)
+        fps = frames / seconds if seconds else 0.0
+        baseline = baseline or fps
+        print(f"{batch_size:>6} {frames:>7} {fps:>8.2f} {fps / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Load test for the recognition service (python main.py serve): requests/s and tail latency.
+
+Each client thread keeps one HTTP connection open and posts images back to
+back for --duration seconds. Run it with several --concurrency values to see
+how micro-batching trades latency for throughput:
+
+    python main.py serve --port 8080 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 --concurrency 1 4 16
+    python benchmarks/load_test.py --unix /tmp/facerec.sock --batch 4
+"""
+import argparse
+import base64
+import glob
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def connect(args):
+    if args.unix:
+        return UnixHTTPConnection(args.unix)
+    url = urlparse(args.url)
+    return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+
+
+def load_payloads(pattern, batch):
+    """Encoded request bodies: raw images for /recognize, base64 JSON lists for /recognize_batch."""
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise SystemExit(f'No images match {pattern}')
+    images = []
+    for path in paths[:64]:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+    if batch <= 1:
+        return '/recognize', images
+    bodies = []
+    for i in range(0, len(images), batch):
+        chunk = (images[i:i + batch] * batch)[:batch]
+        bodies.append(json.dumps({'images': [base64.b64encode(b).decode() for b in chunk]}).encode())
+    return '/recognize_batch', bodies
+
+
+def client(args, path, bodies, deadline, latencies, errors):
+    conn = connect(args)
+    i = 0
+    while time.perf_counter() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body, {'Content-Type': 'application/octet-stream'})
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append('connection')
+            conn.close()
+            conn = connect(args)
+            continue
+        if response.status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(response.status)
+    conn.close()
+
+
+def run(args, concurrency, path, bodies):
+    latencies, errors = [], [] # list.append is atomic, no lock needed
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=client, args=(args, path, bodies, deadline, latencies, errors))
+               for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    pct = lambda q: round(float(np.percentile(ms, q)), 1) if len(ms) else None
+    return {'concurrency': concurrency, 'batch': args.batch, 'requests': len(latencies), 'errors': len(errors),
+            'requests_per_s': round(len(latencies) / elapsed, 2),
+            'images_per_s': round(len(latencies) * max(args.batch, 1) / elapsed, 2),
+            'p50_ms': pct(50), 'p95_ms': pct(95), 'p99_ms': pct(99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the recognition service')
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--unix', help='Unix socket path (instead of --url)')
+    parser.add_argument('--images', default=os.path.join(ROOT, 'known_faces', '*', '*'), help='Glob of images to send')
+    parser.add_argument('--batch', type=int, default=1, help='Images per request; >1 uses /recognize_batch')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per concurrency level')
+    parser.add_argument('--out', help='Also write the results as JSON')
+    args = parser.parse_args()
+
+    path, bodies = load_payloads(args.images, args.batch)
+    rows = []
+    for concurrency in args.concurrency:
+        row = run(args, concurrency, path, bodies)
+        rows.append(row)
+        print(f"concurrency={concurrency:<4} {row['requests_per_s']:>8} req/s  {row['images_per_s']:>8} images/s  "
+              f"p50 {row['p50_ms']} ms  p95 {row['p95_ms']} ms  p99 {row['p99_ms']} ms  errors {row['errors']}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'target': args.unix or args.url, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""Reproducible CPU-only benchmark suite; every run is saved as JSON so runs can be compared.
+
+Sections:
+  enroll  images/s of encode_faces.encode_images over known_faces/, per worker count
+  match   FaceMatcher queries/s versus synthetic gallery size (exact, plus IVF for large galleries)
+  frames  per-frame latency (decode + detect + process_frame) on synthetic videos, for several
+          resolutions and person counts
+
+Each section records the peak resident memory reached so far. When the YOLO
+weights are missing (or with --detector stub), a stub detector returns the
+persons planted in the synthetic frames, so the suite runs offline. Inputs
+are seeded, and the environment (versions, CPU count, git commit) is stored
+with the results.
+
+    python benchmarks/suite.py --out benchmarks/results/baseline.json
+    python benchmarks/suite.py --quick --compare benchmarks/results/baseline.json
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench_ann import synthetic_gallery
+from ann_index import IVFIndex
+from face_matcher import FaceMatcher
+from engine import YOLO_MODEL_PATH, ANN_MIN_GALLERY
+
+RESOLUTIONS = {'480p': (640, 480), '720p': (1280, 720), '1080p': (1920, 1080)}
+DIM = 128
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'opencv': cv2.__version__, 'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def bench_enroll(workers_list, limit):
+    from encode_faces import scan_known_faces, encode_images
+    paths = [path for path, _ in scan_known_faces()][:limit]
+    rows = []
+    for workers in workers_list:
+        start = time.perf_counter()
+        encoded = sum(1 for _, enc, _ in encode_images(paths, workers=workers, report_every=1e9) if enc is not None)
+        seconds = time.perf_counter() - start
+        rows.append({'workers': workers, 'images': len(paths), 'encoded': encoded,
+                     'images_per_s': round(len(paths) / seconds, 2) if seconds else None})
+        print(f"enroll  workers={workers:<3} {rows[-1]['images_per_s']} images/s")
+    return {'results': rows, 'peak_rss_mb': peak_rss_mb()}
+
+
+def bench_match(sizes, queries, batches, seed):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for size in sizes:
+        centres, samples, names = synthetic_gallery(size, 1, rng)
+        picks = rng.integers(0, size, queries)
+        probe = centres[picks] + rng.normal(0, 0.03, size=(queries, DIM)).astype(np.float32)
+        matcher = FaceMatcher(samples, names)
+        modes = [('exact', None)]
+        if size >= ANN_MIN_GALLERY:
+            modes.append(('ivf/16', IVFIndex.build(matcher.encodings)))
+        for mode, index in modes:
+            matcher.attach_index(index, 16)
+            for batch in batches:
+                start = time.perf_counter()
+                for i in range(0, queries, batch):
+                    matcher.match(probe[i:i + batch], tolerance=0.6)
+                qps = queries / (time.perf_counter() - start)
+                rows.append({'gallery': size, 'mode': mode, 'batch': batch, 'queries_per_s': round(qps, 1)})
+                print(f"match   gallery={size:<7} {mode:<7} batch={batch:<3} {qps:,.0f} queries/s")
+    return {'results': rows, 'peak_rss_mb': peak_rss_mb()}
+
+
+def load_tiles():
+    tiles = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'known_faces', '*', '*'))):
+        image = cv2.imread(path)
+        if image is not None:
+            tiles.append(image)
+    if not tiles:
+        raise SystemExit('No images under known_faces/ to build synthetic frames from')
+    return tiles
+
+
+def synthetic_video(path, size, people, frames, tiles):
+    """Write a video of `people` known-face tiles drifting across a grey background; returns boxes per frame."""
+    w, h = size
+    cols = math.ceil(math.sqrt(people))
+    rows = math.ceil(people / cols)
+    tile = min(w // (cols + 1), h // rows, 360)
+    resized = [cv2.resize(t, (tile, tile), interpolation=cv2.INTER_AREA) for t in tiles]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter.fourcc(*'mp4v'), 25, size)
+    boxes_per_frame = []
+    for f in range(frames):
+        frame = np.full((h, w, 3), 90, dtype=np.uint8)
+        shift = int((w - cols * tile) * f / max(frames - 1, 1)) # Drift left to right over the clip
+        boxes = []
+        for i in range(people):
+            r, c = divmod(i, cols)
+            x, y = c * tile + shift, r * tile
+            frame[y:y + tile, x:x + tile] = resized[i % len(resized)]
+            boxes.append((x, y, x + tile, y + tile))
+        writer.write(frame)
+        boxes_per_frame.append(boxes)
+    writer.release()
+    return boxes_per_frame
+
+
+def stub_results(boxes):
+    """Minimal stand-in for an ultralytics result list holding person boxes."""
+    n = len(boxes)
+    array = lambda values: types.SimpleNamespace(cpu=lambda: types.SimpleNamespace(numpy=lambda: np.asarray(values)))
+    result = types.SimpleNamespace(
+        boxes=types.SimpleNamespace(xyxy=array(np.asarray(boxes, dtype=np.float32).reshape(n, 4)),
+                                    cls=array(np.zeros(n)), conf=array(np.full(n, 0.9))),
+        names={0: 'person'})
+    return [result]
+
+
+def bench_frames(resolutions, people_counts, frames, detector, settings):
+    from main import process_frame
+    from engine import RecognitionEngine, load_known_faces
+    engine = None
+    if detector == 'yolo':
+        engine = RecognitionEngine().load(settings)
+    store = load_known_faces()
+    matcher = FaceMatcher.from_store(store) if store is not None and len(store.labels) else FaceMatcher([], [])
+    tiles = load_tiles()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for res in resolutions:
+            for people in people_counts:
+                path = os.path.join(tmp, f'{res}_{people}.mp4')
+                boxes_per_frame = synthetic_video(path, RESOLUTIONS[res], people, frames, tiles)
+                cap = cv2.VideoCapture(path)
+                latencies = []
+                for boxes in boxes_per_frame:
+                    start = time.perf_counter()
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if engine is not None:
+                        results = engine.detect(frame, settings['yolo_conf'], settings['yolo_iou'])
+                    else:
+                        results = stub_results(boxes)
+                    process_frame(frame, None, matcher, settings['threshold'], results=results, settings=settings)
+                    latencies.append(time.perf_counter() - start)
+                cap.release()
+                ms = np.array(latencies) * 1000
+                row = {'resolution': res, 'people': people, 'frames': len(latencies),
+                       'p50_ms': round(float(np.percentile(ms, 50)), 1), 'p95_ms': round(float(np.percentile(ms, 95)), 1),
+                       'fps': round(1000 / float(ms.mean()), 2)}
+                rows.append(row)
+                print(f"frames  {res:<6} people={people:<3} p50 {row['p50_ms']} ms  p95 {row['p95_ms']} ms  {row['fps']} fps")
+    return {'detector': detector, 'gallery': len(matcher), 'results': rows, 'peak_rss_mb': peak_rss_mb()}
+
+
+def compare(current, baseline):
+    """Print each metric next to the baseline run; keys identify matching rows."""
+    keys = {'enroll': ('workers',), 'match': ('gallery', 'mode', 'batch'), 'frames': ('resolution', 'people')}
+    metric = {'enroll': 'images_per_s', 'match': 'queries_per_s', 'frames': 'fps'}
+    print(f"\nCompared with {baseline['environment'].get('commit')} ({baseline['environment'].get('time')}):")
+    for section, key_fields in keys.items():
+        if section not in current['sections'] or section not in baseline['sections']:
+            continue
+        old = {tuple(r[k] for k in key_fields): r for r in baseline['sections'][section]['results']}
+        for row in current['sections'][section]['results']:
+            key = tuple(row[k] for k in key_fields)
+            before, after = old.get(key, {}).get(metric[section]), row[metric[section]]
+            if before and after:
+                print(f"  {section:<7} {str(key):<28} {metric[section]} {before} -> {after} ({after / before:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Face recognition benchmark suite')
+    parser.add_argument('--sections', nargs='+', choices=['enroll', 'match', 'frames'], default=['enroll', 'match', 'frames'])
+    parser.add_argument('--quick', action='store_true', help='Smaller galleries, fewer frames')
+    parser.add_argument('--detector', choices=['auto', 'yolo', 'stub'], default='auto',
+                        help="'auto' uses YOLO if its weights are present, otherwise the stub")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1], help='Enrollment worker counts')
+    parser.add_argument('--resolutions', nargs='+', choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument('--people', type=int, nargs='+', default=[1, 4, 10])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=os.path.join(ROOT, 'benchmarks', 'results', f"run_{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    detector = args.detector
+    if detector == 'auto':
+        detector = 'yolo' if os.path.exists(os.path.join(ROOT, YOLO_MODEL_PATH)) else 'stub'
+    settings = {'threshold': 0.5, 'yolo_conf': 0.5, 'yolo_iou': 0.45}
+    os.chdir(ROOT) # Store and known_faces paths are relative to the project root
+    np.random.seed(args.seed)
+
+    run = {'environment': environment(), 'args': vars(args), 'sections': {}}
+    if 'enroll' in args.sections:
+        run['sections']['enroll'] = bench_enroll(sorted(set(args.workers)), 20 if args.quick else None)
+    if 'match' in args.sections:
+        sizes = [1000, 10000] if args.quick else [1000, 10000, 100000]
+        run['sections']['match'] = bench_match(sizes, 500 if args.quick else 2000, [1, 16], args.seed)
+    if 'frames' in args.sections:
+        run['sections']['frames'] = bench_frames(args.resolutions, args.people, 10 if args.quick else 40, detector, settings)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f'\nResults written to {args.out}')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(run, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+
+class LatestFrameCapture:
+    """Background capture that always holds only the newest frame of a stream.
+
+    A thread reads the source continuously, so the OpenCV buffer never fills
+    up and the consumer always gets the freshest frame. Frames replaced
+    before anyone read them are counted as dropped. read(), get() and
+    release() mirror cv2.VideoCapture, so it can replace one in a processing
+    loop. Video files stand in for live streams: with pace=True (the default
+    for files) they are read at their native frame rate.
+    """
+
+    def __init__(self, source, name=None, pace=None):
+        self.source = source
+        self.name = name or str(source)
+        is_file = os.path.isfile(str(source))
+        self.pace = is_file if pace is None else pace
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0 # Frames overwritten by a newer one before they were read
+        self.finished = False
+        self.last_captured_at = None # Capture time of the frame most recently returned
+        self._cap = None
+        self._latest = None # (seq, frame, captured_at)
+        self._taken_seq = 0
+        self._latencies = deque(maxlen=1000)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    def start(self):
+        """Open the source and start the capture thread; returns self."""
+        self._cap = cv2.VideoCapture(int(self.source) if str(self.source).isdigit() else self.source)
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f'capture-{self.name}', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        interval = 1.0 / (self._cap.get(cv2.CAP_PROP_FPS) or 25) if self.pace else 0.0
+        next_at = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                ret, frame = self._cap.read()
+                if not ret:
+                    break
+                now = time.perf_counter()
+                with self._cond:
+                    if self._latest is not None and self._latest[0] > self._taken_seq:
+                        self.dropped += 1
+                    self.captured += 1
+                    self._latest = (self.captured, frame, now)
+                    self._cond.notify_all()
+                if interval:
+                    next_at += interval
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_at = time.perf_counter() # Fell behind; do not try to catch up
+        finally:
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+
+    def _hand_out(self):
+        self._taken_seq = self._latest[0]
+        self.delivered += 1
+        self.last_captured_at = self._latest[2]
+        return self._latest
+
+    def take(self):
+        """The newest frame not handed out yet, as (seq, frame, captured_at), or None. Never blocks."""
+        with self._cond:
+            if self._latest is None or self._latest[0] <= self._taken_seq:
+                return None
+            return self._hand_out()
+
+    def read(self, poll=0.5):
+        """Wait for a frame newer than the last one read; (ret, frame) like cv2.VideoCapture.read.
+
+        A stalled source is waited out (re-checking every `poll` seconds);
+        (False, None) means the stream ended or the capture was stopped.
+        """
+        fresh = lambda: self._latest is not None and self._latest[0] > self._taken_seq
+        with self._cond:
+            while not fresh():
+                if self.finished or self._stop.is_set():
+                    return False, None
+                self._cond.wait(poll)
+            return True, self._hand_out()[1]
+
+    def frame_shown(self, captured_at=None):
+        """Record capture-to-display latency for a frame (by default the last one read)."""
+        captured_at = self.last_captured_at if captured_at is None else captured_at
+        if captured_at is not None:
+            self._latencies.append(time.perf_counter() - captured_at)
+
+    def get(self, prop):
+        return self._cap.get(prop) if self._cap is not None else 0.0
+
+    def isOpened(self):
+        return self._cap is not None and self._cap.isOpened()
+
+    def stats(self):
+        """Captured, delivered and dropped frames, effective rates and capture-to-display latency."""
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        latencies = np.array(self._latencies) * 1000
+        return {
+            'captured': self.captured,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'capture_fps': round(self.captured / elapsed, 2) if elapsed else 0.0,
+            'effective_fps': round(self.delivered / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {'p50': round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+                           'p95': round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None},
+        }
+
+    def release(self):
+        """Stop the capture thread and close the source."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._cap is not None:
+            self._cap.release()
+
+    stop = release
@@ -0,0 +1,135 @@
+import json
+import math
+import threading
+from collections import namedtuple
+
+# One YOLO box. faces is a list of Face; track_id is set when a tracker owns the box.
+Detection = namedtuple('Detection', ['box', 'label', 'confidence', 'faces', 'track_id'], defaults=(None,))
+
+# One recognized face in frame coordinates (left, top, right, bottom).
+Face = namedtuple('Face', ['box', 'name', 'distance'])
+
+# Columns of a flat detection record: one row per face, or one row with empty face columns for a box without faces
+RECORD_FIELDS = ('source', 'frame', 'timestamp', 'track_id', 'label', 'confidence',
+                 'x1', 'y1', 'x2', 'y2', 'face_x1', 'face_y1', 'face_x2', 'face_y2', 'name', 'distance')
+
+
+def available_formats():
+    """Detection file formats that can be written here: jsonl always, parquet when pyarrow imports."""
+    try:
+        import pyarrow.parquet # noqa: F401
+    except ImportError:
+        return ('jsonl',)
+    return ('jsonl', 'parquet')
+
+
+def _distance(value):
+    """Rounded face distance; None when there was nothing to compare with (inf is not valid JSON)."""
+    value = float(value)
+    return round(value, 4) if math.isfinite(value) else None
+
+
+def detection_to_dict(detection):
+    """JSON-ready form of a Detection and its faces."""
+    return {
+        'box': [int(v) for v in detection.box],
+        'label': detection.label,
+        'confidence': round(float(detection.confidence), 4),
+        'track_id': detection.track_id,
+        'faces': [{'box': [int(v) for v in f.box], 'name': f.name, 'distance': _distance(f.distance)}
+                  for f in detection.faces],
+    }
+
+
+def detection_records(detections, frame_index=None, timestamp=None, source=None):
+    """Flatten a frame's detections into RECORD_FIELDS dicts."""
+    records = []
+    for det in detections:
+        base = {'source': source, 'frame': frame_index, 'timestamp': timestamp, 'track_id': det.track_id,
+                'label': det.label, 'confidence': round(float(det.confidence), 4)}
+        base.update(zip(('x1', 'y1', 'x2', 'y2'), (int(v) for v in det.box)))
+        for face in det.faces or [None]:
+            record = dict(base)
+            if face is None:
+                record.update(face_x1=None, face_y1=None, face_x2=None, face_y2=None, name=None, distance=None)
+            else:
+                record.update(zip(('face_x1', 'face_y1', 'face_x2', 'face_y2'), (int(v) for v in face.box)))
+                record.update(name=face.name, distance=_distance(face.distance))
+            records.append(record)
+    return records
+
+
+class DetectionWriter:
+    """Buffered writer of detection records to JSON Lines or Parquet.
+
+    Records are kept in memory and written every buffer_size rows (one
+    Parquet row group per flush), so per-frame cost is a list append. The
+    format follows the file extension (.jsonl or .parquet) unless given.
+    Parquet needs pyarrow. Safe to share between threads; call close() at
+    the end, or use it as a context manager.
+    """
+
+    def __init__(self, path, fmt=None, source=None, buffer_size=2000):
+        self.path = path
+        self.format = fmt or ('parquet' if path.lower().endswith('.parquet') else 'jsonl')
+        self.source = source
+        self.buffer_size = buffer_size
+        self.rows = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._parquet = None
+        if self.format == 'parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError('Parquet detection output needs pyarrow (pip install pyarrow); use a .jsonl path instead')
+            self._pa = pa
+            self._schema = pa.schema([
+                ('source', pa.string()), ('frame', pa.int64()), ('timestamp', pa.float64()), ('track_id', pa.int64()),
+                ('label', pa.string()), ('confidence', pa.float32()),
+                ('x1', pa.int32()), ('y1', pa.int32()), ('x2', pa.int32()), ('y2', pa.int32()),
+                ('face_x1', pa.int32()), ('face_y1', pa.int32()), ('face_x2', pa.int32()), ('face_y2', pa.int32()),
+                ('name', pa.string()), ('distance', pa.float32())])
+            self._parquet = pq.ParquetWriter(path, self._schema)
+        else:
+            self._file = open(path, 'w')
+
+    def write(self, frame_index, timestamp, detections):
+        """Queue the detections of one frame."""
+        records = detection_records(detections, frame_index, timestamp, self.source)
+        with self._lock:
+            self._buffer.extend(records)
+            if len(self._buffer) >= self.buffer_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        if self._parquet is not None:
+            columns = {name: [r[name] for r in self._buffer] for name in RECORD_FIELDS}
+            self._parquet.write_table(self._pa.Table.from_pydict(columns, schema=self._schema))
+        else:
+            self._file.write(''.join(json.dumps(r) + '\n' for r in self._buffer))
+            self._file.flush()
+        self.rows += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._parquet is not None:
+                self._parquet.close()
+                self._parquet = None
+            elif not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,28 +1,235 @@
 import os
+import argparse
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
 import face_recognition
+import numpy as np
 import pickle
+from face_store import save_store, HEADER_FILE
 
 KNOWN_FACES_DIR = 'known_faces'
-ENCODINGS_FILE = 'known_faces_encodings.pkl'
+STORE_DIR = 'known_faces_store'
+MANIFEST_FILE = 'known_faces_manifest.pkl' # Per-image cache of encodings for incremental runs
+MANIFEST_VERSION = 1
 
-def encode_known_faces():
-    encodings = []
-    names = []
+# Bounds for the per-identity tolerance derived during compaction
+MIN_IDENTITY_TOLERANCE = 0.4
+MAX_IDENTITY_TOLERANCE = 0.6
+
+def _medoids(samples, k, n_iter=5):
+    """Pick k representative samples (k-medoids with farthest-point seeding)."""
+    sq_norms = np.einsum('ij,ij->i', samples, samples)
+    dists = np.sqrt(np.maximum(sq_norms[:, None] + sq_norms[None, :] - 2 * samples @ samples.T, 0))
+    chosen = [int(np.argmin(dists.sum(axis=1)))]
+    while len(chosen) < k:
+        chosen.append(int(np.argmax(dists[:, chosen].min(axis=1))))
+    for _ in range(n_iter):
+        assign = np.argmin(dists[:, chosen], axis=1)
+        updated = []
+        for c in range(k):
+            members = np.flatnonzero(assign == c)
+            if len(members) == 0:
+                updated.append(chosen[c])
+                continue
+            inner = dists[np.ix_(members, members)].sum(axis=1)
+            updated.append(int(members[np.argmin(inner)]))
+        if updated == chosen:
+            break
+        chosen = updated
+    return samples[chosen]
+
+def compact_identities(encodings, names, k=2):
+    """Reduce each identity to its mean centroid plus k medoids (k=0: the centroid alone).
+
+    Returns (encodings, names, stats) where stats maps each identity with at
+    least two samples to the mean/std/max distance of its samples to the
+    centroid and a tolerance derived from them.
+    """
+    groups = {}
+    for encoding, name in zip(encodings, names):
+        groups.setdefault(name, []).append(encoding)
+    out_encodings, out_names, stats = [], [], {}
+    for name, group in groups.items():
+        samples = np.asarray(group, dtype=np.float64)
+        if len(samples) <= k + 1:
+            # Already as small as the compacted form would be
+            prototypes = samples
+        else:
+            centroid = samples.mean(axis=0)
+            prototypes = np.vstack([centroid, _medoids(samples, k)]) if k > 0 else centroid[None, :]
+        if len(samples) > 1:
+            spread = np.linalg.norm(samples - samples.mean(axis=0), axis=1)
+            tolerance = float(np.clip(spread.mean() + 3 * spread.std(), MIN_IDENTITY_TOLERANCE, MAX_IDENTITY_TOLERANCE))
+            stats[name] = {'count': len(samples), 'mean': float(spread.mean()), 'std': float(spread.std()),
+                           'max': float(spread.max()), 'tolerance': tolerance}
+        out_encodings.extend(prototypes)
+        out_names.extend([name] * len(prototypes))
+    return out_encodings, out_names, stats
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-1 of a file's content."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _atomic_pickle(path, obj):
+    """Write obj next to path and rename it into place so readers never see a partial file."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(tmp_path, path)
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {'version': MANIFEST_VERSION, 'compact': None, 'files': {}}
+    with open(MANIFEST_FILE, 'rb') as f:
+        manifest = pickle.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        print('Manifest version changed, re-encoding everything.')
+        return {'version': MANIFEST_VERSION, 'compact': None, 'files': {}}
+    return manifest
+
+def scan_known_faces():
+    """Sorted (image_path, person_name) pairs for every image under KNOWN_FACES_DIR."""
+    images = []
     for root, dirs, files in os.walk(KNOWN_FACES_DIR):
         for file in files:
             if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                image_path = os.path.join(root, file)
-                person_name = os.path.basename(root)
-                image = face_recognition.load_image_file(image_path)
-                face_encs = face_recognition.face_encodings(image)
-                if face_encs:
-                    encodings.append(face_encs[0])
-                    names.append(person_name)
-                else:
-                    print(f'No face found in {image_path}')
-    with open(ENCODINGS_FILE, 'wb') as f:
-        pickle.dump({'encodings': encodings, 'names': names}, f)
+                images.append((os.path.join(root, file), os.path.basename(root)))
+    return sorted(images)
+
+def encode_image(image_path):
+    """Encoding of the first face in the image, or None if no face is found."""
+    image = face_recognition.load_image_file(image_path)
+    face_encs = face_recognition.face_encodings(image)
+    return face_encs[0] if face_encs else None
+
+def _encode_job(image_path):
+    """(encoding, error message) for one image."""
+    try:
+        return encode_image(image_path), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+def _encode_chunk(image_paths):
+    """Process-pool entry point: _encode_job for a chunk of images, in order."""
+    return [_encode_job(image_path) for image_path in image_paths]
+
+def encode_images(image_paths, workers=1, report_every=5.0):
+    """Yield (image_path, encoding, error) in input order, fanning out over a process pool.
+
+    Decoding, face location and encoding all run in the workers; results come
+    back in chunks, consumed in submission order.
+    """
+    total = len(image_paths)
+    if total == 0:
+        return
+    start = last_report = time.perf_counter()
+    executor = None
+    futures = []
+    if workers > 1:
+        chunksize = max(1, min(32, total // (workers * 4)))
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = [executor.submit(_encode_chunk, image_paths[i:i + chunksize]) for i in range(0, total, chunksize)]
+        results = (result for future in futures for result in future.result())
+    else:
+        results = map(_encode_job, image_paths)
+    try:
+        for done, (image_path, (encoding, error)) in enumerate(zip(image_paths, results), 1):
+            yield image_path, encoding, error
+            now = time.perf_counter()
+            if now - last_report >= report_every or done == total:
+                last_report = now
+                print(f'Encoded {done}/{total} images ({done / (now - start):.1f} images/s)')
+    finally:
+        if executor:
+            # Drop chunks not started yet after an early exit (shutdown(cancel_futures=True) needs Python 3.9)
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
+
+def encode_known_faces(compact=None, full=False, workers=1):
+    """Update the encodings file, re-encoding only images that are new or changed.
+
+    Each image is tracked in MANIFEST_FILE by size, mtime and content hash; the
+    hash is only computed when size or mtime differ, so a touched but unchanged
+    file is not re-encoded. Entries for deleted images are pruned.
+    """
+    manifest = {'version': MANIFEST_VERSION, 'compact': None, 'files': {}} if full else load_manifest()
+    old_files = manifest['files']
+    files = {}
+    pending = []
+    added, changed, reused = 0, 0, 0
+    scanned = scan_known_faces()
+    for image_path, person_name in scanned:
+        st = os.stat(image_path)
+        entry = old_files.get(image_path)
+        if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns:
+            files[image_path] = dict(entry, name=person_name)
+            reused += 1
+            continue
+        digest = file_digest(image_path)
+        if entry and entry['sha1'] == digest:
+            files[image_path] = dict(entry, name=person_name, size=st.st_size, mtime=st.st_mtime_ns)
+            reused += 1
+            continue
+        # Placeholder keeps the scan order; filled in once the encoding is back
+        files[image_path] = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'sha1': digest,
+                             'name': person_name, 'encoding': None}
+        pending.append(image_path)
+        if entry:
+            changed += 1
+        else:
+            added += 1
+    removed = len(set(old_files) - {image_path for image_path, _ in scanned})
+    print(f'{added} new, {changed} changed, {removed} removed, {reused} unchanged images.')
+
+    failed = 0
+    for image_path, encoding, error in encode_images(pending, workers=workers):
+        if error:
+            # Left out of the manifest so the image is retried on the next run
+            print(f'Failed to encode {image_path}: {error}')
+            del files[image_path]
+            failed += 1
+        elif encoding is None:
+            print(f'No face found in {image_path}')
+        else:
+            files[image_path]['encoding'] = encoding
+    if failed:
+        print(f'{failed} images failed and will be retried next run.')
+
+    if not (added or changed or removed) and manifest.get('compact') == compact and os.path.exists(os.path.join(STORE_DIR, HEADER_FILE)):
+        print('Encodings are up to date.')
+        return
+
+    encodings = [e['encoding'] for e in files.values() if e['encoding'] is not None]
+    names = [e['name'] for e in files.values() if e['encoding'] is not None]
+    store_encodings, store_names, stats = encodings, names, None
+    if compact is not None:
+        store_encodings, store_names, stats = compact_identities(encodings, names, k=compact)
+        print(f'Compacted {len(encodings)} encodings to {len(store_encodings)} prototypes.')
+    encoder = {'library': 'face_recognition', 'version': getattr(face_recognition, '__version__', None),
+               'model': 'dlib_face_recognition_resnet_model_v1', 'detector': 'hog', 'compact': compact}
+    # Store first, manifest second: a crash in between only causes a redundant rebuild
+    save_store(STORE_DIR, store_encodings, store_names, encoder=encoder, stats=stats,
+               tolerances={name: s['tolerance'] for name, s in stats.items()} if stats else None)
+    _atomic_pickle(MANIFEST_FILE, {'version': MANIFEST_VERSION, 'compact': compact, 'files': files})
     print(f'Encoded {len(encodings)} faces.')
 
+def _non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f'must be 0 or more, got {number}')
+    return number
+
 if __name__ == '__main__':
-    encode_known_faces()
+    parser = argparse.ArgumentParser(description='Encode the faces under known_faces/')
+    parser.add_argument('--compact', type=_non_negative_int, metavar='K', default=None,
+                        help='Store each person as a centroid plus K medoids (0: centroid only) with a per-person tolerance')
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and re-encode every image')
+    parser.add_argument('--workers', type=int, default=1, help='Number of encoder processes (default: 1)')
+    args = parser.parse_args()
+    encode_known_faces(compact=args.compact, full=args.full, workers=max(1, args.workers))
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+import numpy as np
+from ultralytics import YOLO
+from face_matcher import FaceMatcher
+from face_ops import FacePool
+from ann_index import load_or_build_index
+from face_store import load_store, migrate_pickle, HEADER_FILE
+from metrics import get_metrics
+
+YOLO_MODEL_PATH = 'models/yolov8s.pt'
+KNOWN_FACES_STORE = 'known_faces_store' # Memory-mapped gallery written by encode_faces.py
+KNOWN_FACES_ENCODINGS = 'known_faces_encodings.pkl' # Legacy pickle, migrated to the store on first load
+KNOWN_FACES_INDEX = os.path.join(KNOWN_FACES_STORE, 'ivf_index.npz') # ANN index stored next to the encodings
+ANN_MIN_GALLERY = 5000 # Below this size the exact scan is already fast enough
+GALLERY_CHECK_INTERVAL = 1.0 # Seconds between checks of the store for changes
+# Class filters by name; None lets YOLO report all 80 COCO classes
+CLASS_PRESETS = {'all': None, 'person': ('person',)}
+
+
+def load_known_faces():
+    """Open the known-faces store, migrating a legacy pickle if that is all there is."""
+    if not os.path.exists(os.path.join(KNOWN_FACES_STORE, HEADER_FILE)):
+        if not os.path.exists(KNOWN_FACES_ENCODINGS):
+            print('Known faces encodings not found. Please run encode_faces.py first.')
+            return None
+        print(f'Migrating {KNOWN_FACES_ENCODINGS} to {KNOWN_FACES_STORE}/')
+        migrate_pickle(KNOWN_FACES_ENCODINGS, KNOWN_FACES_STORE)
+    return load_store(KNOWN_FACES_STORE)
+
+def build_matcher(store, settings):
+    """Build the face matcher, loading or building an ANN index for large galleries.
+
+    settings['ann'] is 'auto' (index only galleries of ANN_MIN_GALLERY or more),
+    'on' or 'off'. settings['ann_nprobe'] trades recall for latency.
+    """
+    matcher = FaceMatcher.from_store(store)
+    ann = settings.get('ann', 'auto')
+    if ann == 'on' or (ann == 'auto' and len(matcher) >= ANN_MIN_GALLERY):
+        try:
+            index = load_or_build_index(KNOWN_FACES_INDEX, matcher.encodings, settings.get('ann_lists'),
+                                        fingerprint=store.header.get('fingerprint'))
+            matcher.attach_index(index, settings.get('ann_nprobe', 16))
+        except Exception as e:
+            print(f'ANN index unavailable, falling back to exact search: {e}')
+    return matcher
+
+def resolve_classes(names, classes):
+    """YOLO class ids for a class filter, or None for all classes.
+
+    names is the model's id -> name table. classes is None, a CLASS_PRESETS
+    name ('all', 'person'), a comma-separated string of class names, or a
+    list of class names and/or ids. Raises ValueError for unknown names or ids.
+    """
+    if isinstance(classes, str):
+        classes = CLASS_PRESETS[classes] if classes in CLASS_PRESETS else [c.strip() for c in classes.split(',') if c.strip()]
+    if classes is None:
+        return None
+    by_name = {name: cls for cls, name in names.items()}
+    ids = []
+    for c in classes:
+        if isinstance(c, str):
+            if c not in by_name:
+                raise ValueError(f'Unknown YOLO class {c!r}')
+            ids.append(by_name[c])
+        elif int(c) not in names:
+            raise ValueError(f'Unknown YOLO class id {c} (the model has {len(names)} classes)')
+        else:
+            ids.append(int(c))
+    return sorted(set(ids))
+
+def _store_mtime():
+    try:
+        return os.path.getmtime(os.path.join(KNOWN_FACES_STORE, HEADER_FILE))
+    except OSError:
+        return None
+
+
+class RecognitionEngine:
+    """Long-lived owner of the YOLO model and the face matcher.
+
+    Create it once at startup and pass it to every process_request call. The
+    detector is loaded and warmed up once; the gallery is reloaded only when
+    the store on disk changes (encode_faces.py rewrites header.json last) or
+    the ANN settings change. Ultralytics models are not thread-safe, so
+    detector calls are serialized; callers on several threads (service,
+    multicam, pipeline) only overlap the recognition work. multicam and the
+    staged pipeline run its dlib part in parallel on face_pool processes.
+    """
+
+    def __init__(self, model_path=YOLO_MODEL_PATH):
+        self.model_path = model_path
+        self.model = None
+        self.matcher = None
+        self._lock = threading.RLock()
+        self._detect_lock = threading.Lock() # One inference on the YOLO model at a time
+        self._gallery_key = None
+        self._last_check = 0.0
+        self._class_ids = {}
+        self._face_pool = None
+        self._empty_matcher = FaceMatcher([], [])
+
+    def load(self, settings=None):
+        """Load and warm up the detector, and load the gallery. Safe to call repeatedly."""
+        with self._lock:
+            if self.model is None:
+                start = time.perf_counter()
+                self.model = YOLO(self.model_path)
+                self.warm_up()
+                print(f'Detector ready in {time.perf_counter() - start:.1f}s')
+            self.refresh_gallery(settings or {}, force=self.matcher is None)
+        return self
+
+    def warm_up(self, size=640):
+        """Run one dummy inference so the first real frame does not pay for lazy setup."""
+        with self._detect_lock:
+            self.model(np.zeros((size, size, 3), dtype=np.uint8), verbose=False)
+
+    def class_ids(self, classes):
+        """resolve_classes against the loaded model, cached per filter."""
+        key = classes if isinstance(classes, (str, type(None))) else tuple(classes)
+        if key not in self._class_ids:
+            self._class_ids[key] = resolve_classes(self.model.names, classes)
+        return self._class_ids[key]
+
+    def detect(self, frame, conf, iou, classes=None):
+        """Run the detector on one frame; classes (see class_ids) filters inside inference, before NMS."""
+        classes = self.class_ids(classes)
+        with self._detect_lock, get_metrics().timer('detect'):
+            return self.model(frame, conf=conf, iou=iou, classes=classes)
+
+    def detect_batch(self, frames, conf, iou, classes=None):
+        """Run the detector once over a list of frames; returns one result per frame, in order."""
+        classes = self.class_ids(classes)
+        with self._detect_lock, get_metrics().timer('detect'):
+            return self.model(list(frames), conf=conf, iou=iou, classes=classes)
+
+    def face_pool(self, workers):
+        """A started face_ops.FacePool of `workers` processes, kept for later runs; a new size replaces it."""
+        with self._lock:
+            if self._face_pool is not None and self._face_pool.workers != workers:
+                self._face_pool.close()
+                self._face_pool = None
+            if self._face_pool is None:
+                self._face_pool = FacePool(workers).warm_up()
+            return self._face_pool
+
+    def current_matcher(self, settings):
+        """refresh_gallery for entry points: without a gallery every face is matched as Unknown.
+
+        Detection never stops for a missing or emptied gallery; a gallery that
+        appears later is picked up by the next call.
+        """
+        matcher = self.refresh_gallery(settings)
+        return matcher if matcher is not None else self._empty_matcher
+
+    def refresh_gallery(self, settings, force=False):
+        """Reload the matcher if the store or the ANN settings changed; returns the current matcher."""
+        now = time.monotonic()
+        if not force and self.matcher is not None and now - self._last_check < GALLERY_CHECK_INTERVAL:
+            return self.matcher
+        with self._lock:
+            self._last_check = now
+            key = (_store_mtime(), settings.get('ann', 'auto'), settings.get('ann_nprobe', 16), settings.get('ann_lists'))
+            if force or key != self._gallery_key:
+                try:
+                    store = load_known_faces()
+                except ValueError as e:
+                    # Caught mid-update: keep the current gallery and look again on the next check
+                    print(f'Known faces not reloaded: {e}')
+                    return self.matcher
+                if store is None or not len(store.labels):
+                    self.matcher = None
+                else:
+                    if self._gallery_key is not None:
+                        print('Known faces changed, reloading gallery.')
+                    self.matcher = build_matcher(store, settings)
+                self._gallery_key = key
+            return self.matcher
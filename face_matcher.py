@@ -0,0 +1,138 @@
+import numpy as np
+from collections import namedtuple
+
+UNKNOWN_NAME = 'Unknown'
+
+# name: best identity (or 'Unknown'), distance: Euclidean distance to it,
+# margin: distance gap to the runner-up identity (inf when there is none)
+Match = namedtuple('Match', ['name', 'distance', 'margin'])
+
+
+class FaceMatcher:
+    """Nearest-neighbour matcher over the whole known-faces gallery.
+
+    Encodings are kept in one contiguous float32 matrix, grouped by identity,
+    with their squared norms precomputed so every face in a frame is scored
+    against the gallery in a single matrix product.
+
+    An optional ANN index (see ann_index.IVFIndex) built over ``self.encodings``
+    restricts each query to a candidate subset; without one the search is exact.
+
+    ``tolerances`` optionally maps identities to their own match tolerance
+    (see encode_faces.compact_identities); the tolerance passed to match()
+    then acts as a ceiling for them.
+    """
+
+    def __init__(self, encodings, names, index=None, nprobe=16, tolerances=None):
+        if len(encodings) != len(names):
+            raise ValueError('encodings and names must have the same length')
+        identities = []
+        positions = {}
+        labels = np.empty(len(names), dtype=np.int32)
+        for i, name in enumerate(names):
+            if name not in positions:
+                positions[name] = len(identities)
+                identities.append(name)
+            labels[i] = positions[name]
+        if len(names):
+            matrix = np.asarray(encodings, dtype=np.float32).reshape(len(names), -1)
+        else:
+            matrix = np.empty((0, 128), dtype=np.float32)
+        self._setup(matrix, labels, identities, index, nprobe, tolerances)
+
+    @classmethod
+    def from_store(cls, store, index=None, nprobe=16):
+        """Build a matcher over a face_store.FaceStore without copying its encodings."""
+        matcher = cls.__new__(cls)
+        matcher._setup(store.encodings, np.asarray(store.labels), store.names, index, nprobe,
+                       store.header.get('tolerances'))
+        return matcher
+
+    def _setup(self, matrix, labels, identities, index, nprobe, tolerances):
+        # Group rows by identity so per-identity minima are a single reduceat.
+        # Stores are already grouped, which keeps a memory-mapped matrix zero-copy.
+        if len(labels) > 1 and np.any(labels[1:] < labels[:-1]):
+            order = np.argsort(labels, kind='stable')
+            matrix, labels = matrix[order], labels[order]
+        self.encodings = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.labels = labels
+        self.identities = identities
+        # NaN means "no per-identity tolerance, use the global one"
+        self.identity_tolerances = np.array([(tolerances or {}).get(name, np.nan) for name in identities], dtype=np.float64)
+        self.sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+        self._starts = np.flatnonzero(np.r_[True, self.labels[1:] != self.labels[:-1]]) if len(self.labels) else np.empty(0, dtype=np.intp)
+        self.index = None
+        self.nprobe = nprobe
+        self.attach_index(index)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def attach_index(self, index, nprobe=None):
+        """Use an ANN index for future queries; pass None to go back to exact search."""
+        if index is not None and index.vectors.shape != self.encodings.shape:
+            raise ValueError('ANN index does not match the gallery size')
+        # The index brings its own list-ordered vectors (memory-mapped when loaded from disk),
+        # so attaching it does not copy the gallery
+        self.index = index
+        if nprobe is not None:
+            self.nprobe = nprobe
+
+    def distances(self, face_encodings):
+        """Euclidean distances between each query (rows) and each gallery encoding (columns)."""
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.encodings.shape[1])
+        q_norms = np.einsum('ij,ij->i', queries, queries)
+        sq = q_norms[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.encodings.T)
+        np.maximum(sq, 0.0, out=sq)  # Guard against tiny negatives from rounding
+        return np.sqrt(sq)
+
+    def identity_distances(self, face_encodings):
+        """Distance from each query to the closest encoding of every identity."""
+        return np.minimum.reduceat(self.distances(face_encodings), self._starts, axis=1)
+
+    def match(self, face_encodings, tolerance=0.6):
+        """Return a Match for each face encoding, nearest identity first."""
+        if len(face_encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [Match(UNKNOWN_NAME, float('inf'), float('inf')) for _ in face_encodings]
+        if self.index is not None and self.nprobe < self.index.n_lists:
+            return self._match_approx(face_encodings, tolerance)
+        per_identity = self.identity_distances(face_encodings)
+        best = np.argmin(per_identity, axis=1)
+        rows = np.arange(len(best))
+        best_dist = per_identity[rows, best]
+        if per_identity.shape[1] > 1:
+            runner_up = np.partition(per_identity, 1, axis=1)[:, 1]
+            margins = runner_up - best_dist
+        else:
+            margins = np.full(len(best), np.inf, dtype=np.float32)
+        limits = np.fmin(self.identity_tolerances[best], tolerance)
+        results = []
+        for label, dist, margin, limit in zip(best, best_dist, margins, limits):
+            name = self.identities[label] if dist <= limit else UNKNOWN_NAME
+            results.append(Match(name, float(dist), float(margin)))
+        return results
+
+    def _match_approx(self, face_encodings, tolerance):
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.encodings.shape[1])
+        results = []
+        for query, probes in zip(queries, self.index.probe(queries, self.nprobe)):
+            slices = [s for s in self.index.list_slices(probes) if s.stop > s.start]
+            if not slices:
+                results.append(Match(UNKNOWN_NAME, float('inf'), float('inf')))
+                continue
+            q_norm = float(query @ query)
+            # Probed rows are contiguous in the index vectors; norms and labels are gathered for them only
+            ids = np.concatenate([self.index.list_ids[s] for s in slices])
+            sq = self.sq_norms[ids] - 2.0 * np.concatenate([self.index.vectors[s] @ query for s in slices])
+            labels = self.labels[ids]
+            dists = np.sqrt(np.maximum(sq + q_norm, 0.0))
+            best = int(np.argmin(dists))
+            others = dists[labels != labels[best]]
+            margin = float(others.min() - dists[best]) if len(others) else float('inf')
+            dist = float(dists[best])
+            limit = np.fmin(self.identity_tolerances[labels[best]], tolerance)
+            name = self.identities[labels[best]] if dist <= limit else UNKNOWN_NAME
+            results.append(Match(name, dist, margin))
+        return results
@@ -0,0 +1,153 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import dlib
+import numpy as np
+import face_recognition
+from face_recognition import api as face_api
+from utils import resize_image
+
+# face_recognition keeps one module-global HOG detector, shape predictor and encoder,
+# and dlib does not support concurrent use of them. Threads that recognize faces
+# in this process take turns here; FacePool runs them in parallel on processes instead.
+DLIB_LOCK = threading.Lock()
+
+
+def locate_faces(rgb_image, scale=1.0):
+    """HOG face locations (top, right, bottom, left) in rgb_image coordinates.
+
+    With scale < 1 the detector runs on a downscaled copy and the boxes are
+    mapped back to full resolution.
+    """
+    if scale >= 1.0:
+        with DLIB_LOCK:
+            return face_recognition.face_locations(rgb_image)
+    h, w = rgb_image.shape[:2]
+    small = resize_image(rgb_image, width=max(1, int(round(w * scale))))
+    sx, sy = w / small.shape[1], h / small.shape[0]
+    with DLIB_LOCK:
+        found = face_recognition.face_locations(small)
+    return [(int(round(t * sy)), min(w, int(round(r * sx))), min(h, int(round(b * sy))), int(round(l * sx)))
+            for t, r, b, l in found]
+
+
+def face_landmarks(rgb_image, face_locations):
+    """5-point dlib shapes for (top, right, bottom, left) locations, the ones the encoder aligns with.
+
+    Not locked itself; callers on several threads hold DLIB_LOCK (encode_faces does).
+    """
+    shapes = dlib.full_object_detections()
+    for top, right, bottom, left in face_locations:
+        shapes.append(face_api.pose_predictor_5_point(rgb_image, dlib.rectangle(int(left), int(top), int(right), int(bottom))))
+    return shapes
+
+
+def encode_faces(rgb_images, face_locations, num_jitters=1):
+    """128-d encodings for the faces of several RGB images in one encoder call.
+
+    face_locations holds one list of (top, right, bottom, left) per image.
+    Landmarks are predicted once per face and every face chip goes through
+    a single batched dlib call, instead of one face_recognition.face_encodings
+    call per image. Returns one list of encodings per image.
+    """
+    encodings = [[] for _ in rgb_images]
+    with DLIB_LOCK:
+        shapes = [face_landmarks(img, locs) for img, locs in zip(rgb_images, face_locations)]
+        used = [i for i, s in enumerate(shapes) if len(s)]
+        if not used:
+            return encodings
+        try:
+            descriptors = face_api.face_encoder.compute_face_descriptor(
+                [rgb_images[i] for i in used], [shapes[i] for i in used], num_jitters)
+        except TypeError:
+            # dlib builds without the multi-image overload: still one call per image for all its faces
+            descriptors = [face_api.face_encoder.compute_face_descriptor(rgb_images[i], shapes[i], num_jitters) for i in used]
+    for i, per_image in zip(used, descriptors):
+        encodings[i] = [np.array(d) for d in per_image]
+    return encodings
+
+
+def locate_in_boxes(rgb_frame, boxes, mode='roi', scale=1.0):
+    """Face locations (top, right, bottom, left) in frame coordinates, one list per person box.
+
+    mode 'roi' runs face detection inside each box; 'frame' runs it once on
+    the whole frame and assigns faces to boxes geometrically, so a face in
+    overlapping boxes is located once.
+    """
+    if mode == 'frame':
+        locations = locate_faces(rgb_frame, scale)
+        return [[locations[fi] for fi in per_box] for per_box in assign_faces_to_boxes(locations, boxes)]
+    per_box = []
+    for x1, y1, x2, y2 in boxes:
+        found = locate_faces(rgb_frame[y1:y2, x1:x2], scale)
+        per_box.append([(t+y1, r+x1, b+y1, l+x1) for t, r, b, l in found])
+    return per_box
+
+
+def locate_and_encode(rgb_images, boxes_per_image, mode='roi', scale=1.0):
+    """The dlib half of recognition for several images: locate faces in the boxes, then encode them.
+
+    Images without boxes may be None. Returns (located, encoded, timings):
+    per image one location list per box, per image the encodings of those
+    faces in box order, and the seconds spent in 'locate' and 'encode'.
+    """
+    start = time.perf_counter()
+    located = [locate_in_boxes(rgb, boxes, mode, scale) if boxes else []
+               for rgb, boxes in zip(rgb_images, boxes_per_image)]
+    located_at = time.perf_counter()
+    encoded = encode_faces(rgb_images, [[loc for per_box in per_image for loc in per_box] for per_image in located])
+    return located, encoded, {'locate': located_at - start, 'encode': time.perf_counter() - located_at}
+
+
+class FacePool:
+    """locate_and_encode on `workers` processes, each loading its own dlib models.
+
+    Threads that recognize faces in one process take turns on DLIB_LOCK;
+    threads that hand their frames to a shared FacePool run dlib in
+    parallel, so recognition scales with cores. Matching stays in the
+    calling process.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        # spawn: the parent runs threads (and possibly CUDA), which a forked child must not inherit
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def warm_up(self):
+        """Start every worker process (each loads the dlib models) before the first frame needs one."""
+        for future in [self._executor.submit(locate_and_encode, [], []) for _ in range(self.workers)]:
+            future.result()
+        return self
+
+    def locate_and_encode(self, rgb_images, boxes_per_image, mode='roi', scale=1.0):
+        """locate_and_encode on a worker process; blocks the calling thread until it is done."""
+        return self._executor.submit(locate_and_encode, rgb_images, boxes_per_image, mode, scale).result()
+
+    def close(self):
+        self._executor.shutdown()
+
+
+def assign_faces_to_boxes(face_locations, boxes):
+    """Map each face (top, right, bottom, left) to at most one (x1, y1, x2, y2) box.
+
+    A face belongs to the box that contains its centre and covers most of its
+    area; ties go to the smaller box. Faces inside overlapping boxes are thus
+    counted once, and faces outside every box are dropped. Returns a list of
+    face-index lists, one per box.
+    """
+    assigned = [[] for _ in boxes]
+    for fi, (top, right, bottom, left) in enumerate(face_locations):
+        cx, cy = (left + right) / 2, (top + bottom) / 2
+        face_area = max((right - left) * (bottom - top), 1)
+        best, best_key = None, None
+        for bi, (x1, y1, x2, y2) in enumerate(boxes):
+            if not (x1 <= cx < x2 and y1 <= cy < y2):
+                continue
+            overlap = max(0, min(right, x2) - max(left, x1)) * max(0, min(bottom, y2) - max(top, y1))
+            key = (overlap / face_area, -(x2 - x1) * (y2 - y1))
+            if best_key is None or key > best_key:
+                best, best_key = bi, key
+        if best is not None:
+            assigned[best].append(fi)
+    return assigned
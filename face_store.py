@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+import numpy as np
+from collections import namedtuple
+
+SCHEMA_VERSION = 2
+HEADER_FILE = 'header.json'
+ENCODINGS_FILE = 'encodings.npy'
+LABELS_FILE = 'labels.npy'
+NAMES_FILE = 'names.json'
+
+# encodings: (N, D) float32, memory-mapped read-only and grouped by label
+# labels: (N,) int32 index into names; names: identity names; header: dict
+# names.json also carries the header's generation token (schema 2)
+FaceStore = namedtuple('FaceStore', ['encodings', 'labels', 'names', 'header'])
+
+
+def _atomic_write(path, write_fn, mode='wb'):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, mode) as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+
+
+def save_store(store_dir, encodings, names, tolerances=None, stats=None, encoder=None):
+    """Write a gallery as a memory-mappable store.
+
+    Rows are grouped by identity so FaceMatcher can use the mapped matrix
+    without copying it. Each file is renamed into place on its own and the
+    header is written last. The header records a generation token (also
+    written to names.json), the file sizes and cheap digests of the labels,
+    the names and a sample of encoding rows, so a reader can detect a store
+    caught halfway through an update without hashing the whole matrix.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    identities, positions = [], {}
+    labels = np.empty(len(names), dtype=np.int32)
+    for i, name in enumerate(names):
+        if name not in positions:
+            positions[name] = len(identities)
+            identities.append(name)
+        labels[i] = positions[name]
+    order = np.argsort(labels, kind='stable')
+    if len(names):
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(len(names), -1)[order]
+    else:
+        matrix = np.empty((0, 128), dtype=np.float32)
+    labels = labels[order]
+    generation = uuid.uuid4().hex
+    header = {
+        'schema_version': SCHEMA_VERSION,
+        'count': int(len(labels)),
+        'dim': int(matrix.shape[1]),
+        'identities': len(identities),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'encoder': encoder or {},
+        'generation': generation,
+        'fingerprint': gallery_fingerprint(matrix),
+        'sample_digest': _sample_digest(matrix),
+        'labels_digest': _digest(labels),
+        'names_digest': _digest(identities),
+        'tolerances': tolerances or {},
+        'stats': stats or {},
+    }
+    _atomic_write(os.path.join(store_dir, ENCODINGS_FILE), lambda f: np.save(f, np.ascontiguousarray(matrix)))
+    _atomic_write(os.path.join(store_dir, LABELS_FILE), lambda f: np.save(f, labels))
+    _atomic_write(os.path.join(store_dir, NAMES_FILE),
+                  lambda f: json.dump({'generation': generation, 'names': identities}, f), mode='w')
+    header['sizes'] = {name: os.path.getsize(os.path.join(store_dir, name))
+                       for name in (ENCODINGS_FILE, LABELS_FILE, NAMES_FILE)}
+    _atomic_write(os.path.join(store_dir, HEADER_FILE), lambda f: json.dump(header, f, indent=2), mode='w')
+    return header
+
+
+def gallery_fingerprint(matrix):
+    """Digest of the whole gallery matrix, used to detect a stale ANN index."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    digest = hashlib.sha1(str(matrix.shape).encode())
+    digest.update(matrix.data)
+    return digest.hexdigest()
+
+
+def _digest(value):
+    """SHA-1 of a labels array or a names list, as stored in the header."""
+    if isinstance(value, np.ndarray):
+        return hashlib.sha1(np.ascontiguousarray(value, dtype=np.int32).data).hexdigest()
+    return hashlib.sha1(json.dumps(value).encode()).hexdigest()
+
+
+def _sample_digest(matrix, rows=64):
+    """SHA-1 of up to `rows` evenly spaced rows; only those pages of a mapped matrix are read."""
+    picks = np.unique(np.linspace(0, len(matrix) - 1, min(len(matrix), rows)).astype(np.int64))
+    digest = hashlib.sha1(str(matrix.shape).encode())
+    digest.update(np.ascontiguousarray(matrix[picks], dtype=np.float32).data)
+    return digest.hexdigest()
+
+
+def load_store(store_dir, mmap=True, retries=3, retry_delay=0.2):
+    """Open a store; with mmap the encodings are shared through the page cache.
+
+    A store whose files do not match its header (an update in progress) is
+    re-read up to `retries` times before ValueError is raised.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return _read_store(store_dir, mmap)
+        except ValueError as e:
+            if 'incomplete' not in str(e) or attempt == retries:
+                raise
+            time.sleep(retry_delay)
+
+
+def _read_store(store_dir, mmap):
+    with open(os.path.join(store_dir, HEADER_FILE)) as f:
+        header = json.load(f)
+    if header.get('schema_version') not in (1, SCHEMA_VERSION):
+        raise ValueError(f"Unsupported store schema {header.get('schema_version')} in {store_dir}")
+    # numpy cannot map a zero-length array
+    mmap_mode = 'r' if mmap and header['count'] else None
+    encodings = np.load(os.path.join(store_dir, ENCODINGS_FILE), mmap_mode=mmap_mode, allow_pickle=False)
+    labels = np.load(os.path.join(store_dir, LABELS_FILE), mmap_mode=mmap_mode, allow_pickle=False)
+    with open(os.path.join(store_dir, NAMES_FILE)) as f:
+        names = json.load(f)
+    generation = None
+    if isinstance(names, dict):
+        generation, names = names.get('generation'), names.get('names', [])
+    if len(encodings) != header['count'] or len(labels) != header['count']:
+        raise ValueError(f'Store in {store_dir} is incomplete (being updated?)')
+    # Schema 1 stores only have the row count check and, later ones, the digests
+    if 'generation' in header:
+        # The sizes are taken after loading: a file replaced in between shows a mismatch
+        sizes = {name: os.path.getsize(os.path.join(store_dir, name)) for name in header['sizes']}
+        if (generation != header['generation'] or sizes != header['sizes']
+                or _sample_digest(encodings) != header['sample_digest']):
+            raise ValueError(f'Store in {store_dir} is incomplete (being updated?): files do not match the header')
+    if 'labels_digest' in header and (_digest(labels) != header['labels_digest']
+                                      or _digest(names) != header['names_digest']):
+        raise ValueError(f'Store in {store_dir} is incomplete (being updated?): files do not match the header')
+    return FaceStore(encodings, labels, names, header)
+
+
+def migrate_pickle(pickle_path, store_dir):
+    """Convert a legacy known_faces_encodings.pkl into a store. Only use on trusted files."""
+    import pickle
+    with open(pickle_path, 'rb') as f:
+        data = pickle.load(f)
+    return save_store(store_dir, data['encodings'], data['names'],
+                      tolerances=data.get('tolerances'), stats=data.get('stats'),
+                      encoder={'migrated_from': os.path.basename(pickle_path)})
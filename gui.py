@@ -7,9 +7,14 @@ import cv2
 import threading
 from PIL import Image, ImageTk
 import shutil # Import shutil
+from metrics import get_metrics, format_metrics
+from detections import available_formats
+
+PREVIEW_FPS = 30 # Upper bound on preview refreshes; processing runs at its own pace
+_NO_FRAME = object() # Empty preview slot (None means "clear the preview")
 
 class FaceRecognitionGUI:
-    def __init__(self, process_callback=None):
+    def __init__(self, process_callback=None, threshold=0.5):
         self.INPUT_DIR = os.path.join(os.getcwd(), 'Input')
         self.BASE_OUTPUT_DIR = os.path.join(os.getcwd(), 'Output')
         self.IMAGE_OUTPUT_DIR = os.path.join(self.BASE_OUTPUT_DIR, 'Image')
@@ -32,7 +37,7 @@ class FaceRecognitionGUI:
 
         self.root = ctk.CTk()
         self.root.title("Detection APP")
-        self.root.geometry("1000x680") # Adjusted geometry to better fit the design
+        self.root.geometry("1000x800") # Adjusted geometry to better fit the design
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.file_var = ctk.StringVar() # Initialize file_var
         
@@ -104,15 +109,15 @@ class FaceRecognitionGUI:
         self.browse_button = ctk.CTkButton(file_input_frame, text="Browse", command=self.browse_file, corner_radius=8, width=80)
         self.browse_button.pack(side=ctk.RIGHT)
         
-        # Settings frame
-        settings_frame = ctk.CTkFrame(left_panel, corner_radius=10)
-        settings_frame.pack(fill=ctk.X, pady=10, padx=10)
+        # Settings frame (scrolls once the options outgrow the panel)
+        settings_frame = self.settings_frame = ctk.CTkScrollableFrame(left_panel, corner_radius=10)
+        settings_frame.pack(fill=ctk.BOTH, expand=True, pady=10, padx=10)
 
         settings_title = ctk.CTkLabel(settings_frame, text="Detection Settings", font=ctk.CTkFont(weight="bold"))
         settings_title.pack(pady=(10, 5))
         
         # Create settings
-        self.threshold_var = ctk.DoubleVar(value=0.5)
+        self.threshold_var = ctk.DoubleVar(value=threshold)
         # StringVar for formatted threshold display and two-way sync
         self.threshold_strvar = ctk.StringVar(value=f"{self.threshold_var.get():.2f}")
         self.threshold_var.trace_add('write', lambda *args: self.threshold_strvar.set(f"{self.threshold_var.get():.2f}"))
@@ -154,7 +159,79 @@ class FaceRecognitionGUI:
         ctk.CTkButton(yolo_iou_input_frame, text="-", width=30, command=self.decrement_yolo_iou).pack(side=ctk.LEFT)
         ctk.CTkEntry(yolo_iou_input_frame, textvariable=self.yolo_iou_strvar, width=50, justify=ctk.CENTER).pack(side=ctk.LEFT, expand=True, fill=ctk.X, padx=5)
         ctk.CTkButton(yolo_iou_input_frame, text="+", width=30, command=self.increment_yolo_iou).pack(side=ctk.RIGHT)
+
+        # Face detection mode: 'roi' searches each person box, 'frame' searches the whole frame once
+        # and assigns faces to boxes (cheaper with many or overlapping people)
+        ctk.CTkLabel(settings_frame, text="Face Detection Mode:").pack(anchor=ctk.W, padx=10, pady=(10,0))
+        self.face_mode_var = ctk.StringVar(value="roi")
+        ctk.CTkOptionMenu(settings_frame, variable=self.face_mode_var,
+                          values=["roi", "frame"]).pack(fill=ctk.X, padx=10, pady=(0,10))
+
+        # Face detection scale: locate faces on a downscaled copy (encodings still use full resolution)
+        ctk.CTkLabel(settings_frame, text="Face Detection Scale:").pack(anchor=ctk.W, padx=10, pady=(0,0))
+        self.face_scale_var = ctk.StringVar(value="1.0")
+        ctk.CTkOptionMenu(settings_frame, variable=self.face_scale_var,
+                          values=["1.0", "0.75", "0.5", "0.25"]).pack(fill=ctk.X, padx=10, pady=(0,10))
+
+        # Face search index: approximate search for large galleries ('auto' from 5000 encodings);
+        # more probes scan more of the gallery, closer to exact search but slower
+        ctk.CTkLabel(settings_frame, text="Face Search Index:").pack(anchor=ctk.W, padx=10, pady=(0,0))
+        self.ann_var = ctk.StringVar(value="auto")
+        ctk.CTkOptionMenu(settings_frame, variable=self.ann_var,
+                          values=["auto", "on", "off"]).pack(fill=ctk.X, padx=10, pady=(0,10))
+        ctk.CTkLabel(settings_frame, text="Index Probes:").pack(anchor=ctk.W, padx=10, pady=(0,0))
+        self.ann_nprobe_var = ctk.StringVar(value="16")
+        ctk.CTkOptionMenu(settings_frame, variable=self.ann_nprobe_var,
+                          values=["4", "8", "16", "32", "64"]).pack(fill=ctk.X, padx=10, pady=(0,10))
+
+        # Detect Classes: 'person' keeps YOLO to the boxes face recognition uses
+        ctk.CTkLabel(settings_frame, text="Detect Classes:").pack(anchor=ctk.W, padx=10, pady=(0,0))
+        self.classes_var = ctk.StringVar(value="all")
+        ctk.CTkOptionMenu(settings_frame, variable=self.classes_var,
+                          values=["all", "person"]).pack(fill=ctk.X, padx=10, pady=(0,10))
+
+        # Annotation: full labels, plain boxes with face names, or no drawing at all
+        ctk.CTkLabel(settings_frame, text="Annotation:").pack(anchor=ctk.W, padx=10, pady=(0,0))
+        self.render_var = ctk.StringVar(value="full")
+        ctk.CTkOptionMenu(settings_frame, variable=self.render_var,
+                          values=["full", "minimal", "none"]).pack(fill=ctk.X, padx=10, pady=(0,10))
         
+        # Save detections: one structured record per box and face, streamed to Output/Detections
+        # (parquet is only offered when pyarrow is installed)
+        ctk.CTkLabel(settings_frame, text="Save Detections:").pack(anchor=ctk.W, padx=10, pady=(0,0))
+        self.detections_format_var = ctk.StringVar(value="off")
+        ctk.CTkOptionMenu(settings_frame, variable=self.detections_format_var,
+                          values=["off", *available_formats()]).pack(fill=ctk.X, padx=10, pady=(0,10))
+
+        # Performance HUD: per-stage timings and FPS on the frames and in the panel below the preview
+        self.metrics_overlay_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(settings_frame, text="Performance HUD", variable=self.metrics_overlay_var).pack(anchor=ctk.W, padx=10, pady=(0,5))
+
+        # Detection interval (real-time): full detection every Nth frame, tracked boxes in between;
+        # 'auto' picks N from the measured detection time and the camera frame rate
+        ctk.CTkLabel(settings_frame, text="Detection Interval (Real-time):").pack(anchor=ctk.W, padx=10, pady=(0,0))
+        self.detect_interval_var = ctk.StringVar(value="1")
+        ctk.CTkOptionMenu(settings_frame, variable=self.detect_interval_var,
+                          values=["1", "2", "3", "5", "auto"]).pack(fill=ctk.X, padx=10, pady=(0,10))
+
+        # Batch size (video): frames per detector call; larger batches use the GPU better but add latency
+        ctk.CTkLabel(settings_frame, text="Batch Size (Video):").pack(anchor=ctk.W, padx=10, pady=(0,0))
+        self.batch_size_var = ctk.StringVar(value="1")
+        ctk.CTkOptionMenu(settings_frame, variable=self.batch_size_var,
+                          values=["1", "2", "4", "8", "16"]).pack(fill=ctk.X, padx=10, pady=(0,10))
+
+        # Motion gate: static frames reuse the previous detections instead of running YOLO
+        self.motion_gate_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(settings_frame, text="Skip Static Frames", variable=self.motion_gate_var).pack(anchor=ctk.W, padx=10, pady=(0,5))
+
+        # Identity cache: tracked people recognized recently are not re-encoded; hit rate shows in the HUD
+        self.identity_cache_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(settings_frame, text="Reuse Tracked Identities", variable=self.identity_cache_var).pack(anchor=ctk.W, padx=10, pady=(0,5))
+
+        # Staged pipeline: read, detect, recognize and write overlap on separate threads (video and real-time)
+        self.pipeline_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(settings_frame, text="Staged Pipeline", variable=self.pipeline_var).pack(anchor=ctk.W, padx=10, pady=(0,10))
+
         # Version label
         version_label = ctk.CTkLabel(left_panel, text="V 1.0", font=ctk.CTkFont(size=12), text_color="gray")
         version_label.pack(side=ctk.BOTTOM, pady=10)
@@ -171,6 +248,13 @@ class FaceRecognitionGUI:
         self.preview_height = 400 # Adjusted for new layout
         self.preview_label = ctk.CTkLabel(self.preview_frame, text="", font=ctk.CTkFont(size=24, weight="bold"), text_color="#666666")
         self.preview_label.pack(expand=True)
+        # Single-slot buffer between the processing thread and the Tk loop
+        self._preview_lock = threading.Lock()
+        self._preview_slot = _NO_FRAME
+        self.preview_dropped = 0 # Frames replaced before the preview showed them
+        self.photo_image = None
+        self.current_frame_to_save = None
+        self.root.after(int(1000 / PREVIEW_FPS), self._poll_preview)
 
         # Status frame
         self.status_frame = ctk.CTkFrame(right_panel, fg_color="transparent")
@@ -181,6 +265,13 @@ class FaceRecognitionGUI:
                                    font=ctk.CTkFont(size=14), text_color="#00B0F0") # A shade of blue
         self.status_label.pack(side=ctk.LEFT, padx=10)
 
+        # Performance panel, filled only while metrics are being collected
+        self.metrics_var = ctk.StringVar(value="")
+        self.metrics_label = ctk.CTkLabel(right_panel, textvariable=self.metrics_var, justify=ctk.LEFT,
+                                          font=ctk.CTkFont(family="Courier", size=11), text_color="gray")
+        self.metrics_label.pack(fill=ctk.X, padx=20)
+        self.root.after(1000, self._poll_metrics)
+
         # Control buttons
         control_button_frame = ctk.CTkFrame(right_panel, fg_color="transparent")
         control_button_frame.pack(pady=10)
@@ -238,7 +329,7 @@ class FaceRecognitionGUI:
         if mode == "webcam":
             self.file_frame.pack_forget() # Hides the file input section
         else:
-            self.file_frame.pack(fill=ctk.X, pady=10, padx=10) # Shows the file input section
+            self.file_frame.pack(fill=ctk.X, pady=10, padx=10, before=self.settings_frame) # Shows the file input section
 
     def update_mode_buttons(self, current_mode):
         buttons = {
@@ -414,7 +505,20 @@ class FaceRecognitionGUI:
         return {
             'threshold': self.threshold_var.get(),
             'yolo_conf': self.yolo_conf_var.get(),
-            'yolo_iou': self.yolo_iou_var.get()
+            'yolo_iou': self.yolo_iou_var.get(),
+            'classes': self.classes_var.get(),
+            'face_detect_mode': self.face_mode_var.get(),
+            'face_detect_scale': float(self.face_scale_var.get()),
+            'ann': self.ann_var.get(),
+            'ann_nprobe': int(self.ann_nprobe_var.get()),
+            'render': self.render_var.get(),
+            'detections_format': None if self.detections_format_var.get() == 'off' else self.detections_format_var.get(),
+            'metrics_overlay': self.metrics_overlay_var.get(),
+            'motion_gate': self.motion_gate_var.get(),
+            'identity_cache': self.identity_cache_var.get(),
+            'detect_interval': self.detect_interval_var.get() if self.detect_interval_var.get() == 'auto' else int(self.detect_interval_var.get()),
+            'batch_size': int(self.batch_size_var.get()),
+            'pipeline': self.pipeline_var.get()
         }
     
     def start_processing(self):
@@ -557,31 +661,54 @@ class FaceRecognitionGUI:
             self.yolo_iou_strvar.set(f"{self.yolo_iou_var.get():.2f}")
 
     def display_frame(self, frame):
-        """Display the given frame in the preview area."""
+        """Post a frame for preview; safe to call from the processing thread.
+
+        Only the newest frame is kept: a frame the preview loop has not picked
+        up yet is replaced, so processing never waits for the display.
+        """
+        self.current_frame_to_save = frame
+        with self._preview_lock:
+            if self._preview_slot is not _NO_FRAME:
+                self.preview_dropped += 1
+            self._preview_slot = frame
+
+    def _poll_preview(self):
+        """Show the latest posted frame; runs on the Tk main loop at up to PREVIEW_FPS."""
+        with self._preview_lock:
+            frame, self._preview_slot = self._preview_slot, _NO_FRAME
+        if frame is not _NO_FRAME:
+            self._show_frame(frame)
+        self.root.after(int(1000 / PREVIEW_FPS), self._poll_preview)
+
+    def _poll_metrics(self):
+        snapshot = get_metrics().snapshot()
+        text = format_metrics(snapshot) if snapshot is not None else ""
+        if snapshot is not None and self.preview_dropped:
+            text += f"\npreview dropped {self.preview_dropped}"
+        self.metrics_var.set(text)
+        self.root.after(1000, self._poll_metrics)
+
+    def _show_frame(self, frame):
         if frame is None:
             self.preview_label.configure(image=None)
             self.preview_label.configure(text="No video stream")
-            self.current_frame_to_save = None
+            self.photo_image = None
             return
 
-        # Convert the frame to RGB format
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Convert to PIL Image
-        pil_image = Image.fromarray(rgb_frame)
-
-        # Resize image to fit preview area while maintaining aspect ratio
-        img_width, img_height = pil_image.size
+        # Shrink first with INTER_AREA (cheap, and the colour conversion then touches fewer pixels)
+        img_height, img_width = frame.shape[:2]
         ratio = min(self.preview_width / img_width, self.preview_height / img_height)
-        new_width = int(img_width * ratio)
-        new_height = int(img_height * ratio)
-        pil_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        # Convert to PhotoImage and update label
-        self.photo_image = ImageTk.PhotoImage(image=pil_image)
-        self.preview_label.configure(image=self.photo_image, text="")
-        self.preview_label_image = self.photo_image  # Keep a reference!
-        self.current_frame_to_save = frame
+        size = (max(1, int(img_width * ratio)), max(1, int(img_height * ratio)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        pil_image = Image.fromarray(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+
+        # Reuse the PhotoImage while the size stays the same; paste() updates the label in place
+        if self.photo_image is not None and (self.photo_image.width(), self.photo_image.height()) == size:
+            self.photo_image.paste(pil_image)
+        else:
+            self.photo_image = ImageTk.PhotoImage(image=pil_image)
+            self.preview_label.configure(image=self.photo_image, text="")
+            self.preview_label_image = self.photo_image  # Keep a reference!
 
     def decrement_threshold(self):
         """Decrement the threshold value"""
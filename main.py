@@ -4,83 +4,155 @@ warnings.filterwarnings("ignore", category=UserWarning, module="face_recognition
 import argparse
 import cv2
 import numpy as np
-import pickle
-from ultralytics import YOLO
-import face_recognition
 import os
 import time
+import threading
+import functools
 import shutil # Import shutil for file operations
-from utils import draw_box
-from gui import FaceRecognitionGUI
+from utils import draw_detections, RENDER_MODES
+from detections import Detection, Face, DetectionWriter
+from tracking import IoUTracker, DetectionScheduler, IdentityCache, make_motion_gate
+from face_ops import locate_in_boxes, locate_and_encode
+from engine import RecognitionEngine
+from pipeline import run_pipeline, format_report
+from metrics import get_metrics, enable_metrics, disable_metrics, metrics_enabled, draw_overlay, MetricsExporter
+from capture import LatestFrameCapture
 
 # Import ctypes only if on Windows for setting hidden attribute
 if os.name == 'nt':
     import ctypes
     FILE_ATTRIBUTE_HIDDEN = 0x02
 
-KNOWN_FACES_ENCODINGS = 'known_faces_encodings.pkl'
 OUTPUT_DIR_BASE = os.path.join(os.getcwd(), 'Output')
 VIDEO_TEMP_OUTPUT_DIR = os.path.join(OUTPUT_DIR_BASE, 'Video') # New temp and final video directory
+DETECTIONS_OUTPUT_DIR = os.path.join(OUTPUT_DIR_BASE, 'Detections') # Structured detections saved from the GUI
 
 
-def load_known_faces():
-    if not os.path.exists(KNOWN_FACES_ENCODINGS):
-        print('Known faces encodings not found. Please run encode_faces.py first.')
-        return [], []
-    with open(KNOWN_FACES_ENCODINGS, 'rb') as f:
-        data = pickle.load(f)
-    return data['encodings'], data['names']
+def process_request(mode, source, settings, display_fn=None, stop_event=None, save_video_to_path=None, engine=None):
+    """Process the detection request. For video, save_video_to_path determines output location.
 
-def recognize_faces(frame, known_encodings, known_names, threshold=0.2):
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    face_locations = face_recognition.face_locations(rgb_frame)
-    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-    results = []
-    for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-        matches = face_recognition.compare_faces(known_encodings, face_encoding, tolerance=1-threshold)
-        name = 'Unknown'
-        if True in matches:
-            first_match_index = matches.index(True)
-            name = known_names[first_match_index]
-        results.append(((left, top, right, bottom), name))
-    return results
+    engine is a RecognitionEngine shared across requests; without one a
+    throwaway engine is created, which reloads the model every call.
+    settings['detections_output'] is an optional .jsonl or .parquet path
+    that receives one structured record per detected box and face; with
+    only settings['detections_format'] ('jsonl' or 'parquet') a file named
+    after the source is created under Output/Detections.
+    """
+    # A HUD-only run switches instrumentation on just for itself; an exporter keeps it on for the session
+    owns_metrics = settings.get('metrics_overlay') and not metrics_enabled()
+    sink = None
+    detections_output = settings.get('detections_output')
+    if not detections_output and settings.get('detections_format'):
+        stem = os.path.splitext(os.path.basename(source))[0] if isinstance(source, str) and source else mode
+        os.makedirs(DETECTIONS_OUTPUT_DIR, exist_ok=True)
+        detections_output = os.path.join(DETECTIONS_OUTPUT_DIR, f"{stem}_{time.strftime('%Y%m%d-%H%M%S')}.{settings['detections_format']}")
+    if detections_output:
+        sink = DetectionWriter(detections_output, source=source if isinstance(source, str) else mode)
+    try:
+        return run_request(mode, source, settings, display_fn, stop_event, save_video_to_path, engine, sink)
+    finally:
+        if sink is not None:
+            sink.close()
+            print(f'{sink.rows} detection records written to {sink.path}')
+        if owns_metrics:
+            disable_metrics()
 
-def process_request(mode, source, settings, display_fn=None, stop_event=None, save_video_to_path=None):
-    """Process the detection request. For video, save_video_to_path determines output location."""
-    # Load face encodings
-    known_encodings, known_names = load_known_faces()
-    if not known_encodings:
-        print('No known faces loaded. Exiting.')
-        return None # Return None for consistency
+def run_request(mode, source, settings, display_fn=None, stop_event=None, save_video_to_path=None, engine=None, sink=None):
+    """Body of process_request; detections are also written to sink if one is given."""
+    if engine is None:
+        engine = RecognitionEngine()
+    engine.load(settings)
+    # Face encodings are reloaded only if the store changed since the last request
+    matcher = engine.current_matcher(settings)
+    if not len(matcher):
+        print('No known faces loaded; every face will be reported as Unknown.')
 
     # Extract settings
     threshold = settings['threshold']
     yolo_conf = settings['yolo_conf']
     yolo_iou = settings['yolo_iou']
-    
-    # Initialize YOLO model
-    model = YOLO('models/yolov8s.pt')  # Load YOLO model
+    classes = settings.get('classes') # YOLO class filter: None/'all', 'person' or a list of names (see engine.class_ids)
+    render_mode = settings.get('render', 'full') # 'full', 'minimal' or 'none' (detections only)
+    overlay = settings.get('metrics_overlay', False) # Performance HUD drawn onto the frames
+    metrics = enable_metrics() if overlay else get_metrics()
 
     def yolo_infer(frame):
-        return model(frame, conf=yolo_conf, iou=yolo_iou)
+        return engine.detect(frame, yolo_conf, yolo_iou, classes)
+
+    # Motion gate: frames where nothing moved skip detection and recognition and reuse the last results
+    gate = make_motion_gate(settings.get('motion_gate'))
 
     if mode == 'realtime' or mode == 'webcam':  # Handle both naming conventions
-        cap = cv2.VideoCapture(0)
+        # Latest-frame capture: a thread drains the camera so each iteration gets the newest
+        # frame and latency stays bounded; settings['latest_frame'] = False reads in-loop instead
+        latest_frame = settings.get('latest_frame', True)
+        cap = LatestFrameCapture(0, name='webcam').start() if latest_frame else cv2.VideoCapture(0)
+        if settings.get('pipeline') and display_fn:
+            # Staged mode: capture, detection, recognition and preview overlap on separate threads
+            run_staged(cap, engine, settings, matcher, display_fn, stop_event, sink=sink)
+            cap.release()
+            if latest_frame:
+                print(f'Capture: {cap.stats()}')
+            return None
+        # detect_interval N > 1 (or 'auto') runs full detection every Nth frame and moves
+        # tracked boxes and their identities along on the frames in between
+        detect_interval = settings.get('detect_interval', 1)
+        identity_cache = IdentityCache() if settings.get('identity_cache') else None
+        tracker = IoUTracker() if detect_interval != 1 or identity_cache else None
+        scheduler = DetectionScheduler(detect_interval, target_fps=cap.get(cv2.CAP_PROP_FPS) or 30)
+        frame_index = 0
         while True:
             if stop_event and stop_event.is_set():
                 break
             ret, frame = cap.read()
             if not ret:
                 break
-            frame = process_frame(frame, yolo_infer, known_encodings, known_names, threshold)
+            captured = cap.last_captured_at if latest_frame else time.perf_counter() # For end-to-end latency
+            matcher = engine.current_matcher(settings) # Picks up re-encoded galleries
+            if tracker is None and gate is None:
+                frame = process_frame(frame, yolo_infer, matcher, threshold, settings=settings,
+                                      sink=sink, frame_index=frame_index, timestamp=time.time())
+            else:
+                moved = True
+                if gate is not None:
+                    with metrics.timer('gate'):
+                        moved = gate.changed(frame)
+                if not moved:
+                    detections = gate.last
+                elif tracker is None or scheduler.should_detect():
+                    started = time.perf_counter()
+                    detections = analyze_frame(frame, yolo_infer, matcher, threshold,
+                                               tracker=tracker, identity_cache=identity_cache, settings=settings)
+                    scheduler.record(time.perf_counter() - started)
+                    if gate is not None:
+                        gate.record(time.perf_counter() - started)
+                else:
+                    detections = tracker.predict()
+                if gate is not None:
+                    gate.last = detections
+                if sink is not None:
+                    sink.write(frame_index, time.time(), detections)
+                with metrics.timer('draw'):
+                    draw_detections(frame, detections, render_mode)
+            frame_index += 1
+            metrics.frame_done(time.perf_counter() - captured)
+            if overlay:
+                draw_overlay(frame, metrics.snapshot())
             if display_fn:
-                display_fn(frame)
-                time.sleep(0.03)
+                display_fn(frame) # Non-blocking: the GUI shows the latest frame at its own rate
             else:
                 cv2.imshow('Detection & Recognition', frame)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
                     break
+            if latest_frame:
+                cap.frame_shown()
         cap.release()
+        if latest_frame:
+            print(f'Capture: {cap.stats()}')
+        if identity_cache is not None:
+            print(f'Identity cache: {identity_cache.stats()}')
+        if gate is not None:
+            print(f'Motion gate: {gate.stats()}')
         if not display_fn:
             cv2.destroyAllWindows()
         return None # Return None for consistency
@@ -93,7 +165,11 @@ def process_request(mode, source, settings, display_fn=None, stop_event=None, sa
         if frame is None:
             print('Image not found.')
             return None 
-        frame = process_frame(frame, yolo_infer, known_encodings, known_names, threshold)
+        frame = process_frame(frame, yolo_infer, matcher, threshold, settings=settings,
+                              sink=sink, frame_index=0, timestamp=0.0)
+        metrics.frame_done()
+        if overlay:
+            draw_overlay(frame, metrics.snapshot(max_age=0))
         if display_fn:
             display_fn(frame)
         else:
@@ -137,25 +213,71 @@ def process_request(mode, source, settings, display_fn=None, stop_event=None, sa
         out = cv2.VideoWriter(output_file_path_for_writer, fourcc, fps, (width, height))
         print(f"Processing video. Output will be temporarily at: {output_file_path_for_writer}")
 
-        while True:
+        batch_size = max(1, int(settings.get('batch_size', 1))) # Frames per detector call
+        identity_cache = None
+        tracker = None
+        if settings.get('identity_cache'):
+            # Cache ages are measured in stream time, not wall time
+            identity_cache = IdentityCache(clock=lambda: cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+            tracker = IoUTracker()
+        quit_requested = False
+        frame_index = 0
+        if settings.get('pipeline'):
+            # Staged mode writes (and previews, if there is a display) from the writer thread
+            def write_frame(frame):
+                out.write(frame)
+                if display_fn:
+                    display_fn(frame)
+            run_staged(cap, engine, settings, matcher, write_frame, stop_event, sink=sink, fps=fps)
+            quit_requested = True # Skip the sequential loop below
+        while not quit_requested:
             if stop_event and stop_event.is_set():
                 break
-            ret, frame = cap.read()
-            if not ret:
+            frames = read_frames(cap, batch_size)
+            if not frames:
                 break
-            frame = process_frame(frame, yolo_infer, known_encodings, known_names, threshold)
-            
-            if out: # Write frame if VideoWriter is initialized
-                out.write(frame)
+            captured = time.perf_counter()
+            matcher = engine.current_matcher(settings) # Picks up re-encoded galleries
+            # One detector call for the whole batch, one face encoder call for all its faces,
+            # then each frame is finished in order
+            active = frames
+            if gate is not None:
+                with metrics.timer('gate'):
+                    moved = gate.select(frames)
+                active = [frame for frame, flag in zip(frames, moved) if flag]
+            started = time.perf_counter()
+            batch_results = engine.detect_batch(active, yolo_conf, yolo_iou, classes) if active else []
+            batch_detections = analyze_frames(active, yolo_infer, matcher, threshold,
+                                              results=[[results] for results in batch_results],
+                                              tracker=tracker, identity_cache=identity_cache, settings=settings)
+            if gate is not None:
+                gate.record(time.perf_counter() - started, len(active))
+                batch_detections = gate.fill(moved, batch_detections)
+            for frame, detections in zip(frames, batch_detections):
+                if sink is not None:
+                    sink.write(frame_index, round(frame_index / fps, 3), detections)
+                frame_index += 1
+                with metrics.timer('draw'):
+                    draw_detections(frame, detections, render_mode)
+                metrics.frame_done(time.perf_counter() - captured)
+                if overlay:
+                    draw_overlay(frame, metrics.snapshot())
 
-            if display_fn:
-                display_fn(frame)
-                time.sleep(0.03) # Keep for live preview consistency
-            else: # CLI fallback, though less relevant if GUI is primary
-                cv2.imshow('Video Preview', frame) # Changed window name for clarity
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                if out: # Write frame if VideoWriter is initialized
+                    out.write(frame)
+
+                if display_fn:
+                    display_fn(frame)
+                else: # CLI fallback, though less relevant if GUI is primary
+                    cv2.imshow('Video Preview', frame) # Changed window name for clarity
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        quit_requested = True
+                        break
         cap.release()
+        if identity_cache is not None:
+            print(f'Identity cache: {identity_cache.stats()}')
+        if gate is not None:
+            print(f'Motion gate: {gate.stats()}')
         
         final_output_path = output_file_path_for_writer # Path to be returned, possibly modified for hidden attribute
 
@@ -200,31 +322,397 @@ def main():
     """Main entry point for the application"""
     parser = argparse.ArgumentParser(description='Real-time Object Detection and Face Recognition')
     parser.add_argument('--threshold', type=float, default=0.5, help='Face recognition threshold (0-1)')
+    parser.add_argument('--metrics-file', help='Write performance metrics (JSON) to this file periodically')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus-style metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--metrics-interval', type=float, default=5.0, help='Seconds between metrics file updates')
+    subparsers = parser.add_subparsers(dest='command')
+    batch_parser = subparsers.add_parser('batch', help='Process images and videos without a display')
+    batch_parser.add_argument('inputs', nargs='+', help='Files, directories, glob patterns or manifests (.txt/.lst, one path per line)')
+    batch_parser.add_argument('--output', default=os.path.join(OUTPUT_DIR_BASE, 'Batch'), help='Directory for annotated outputs and detections')
+    batch_parser.add_argument('--workers', type=int, default=1, help='Worker processes, each with its own model')
+    batch_parser.add_argument('--batch-size', type=int, default=8, help='Video frames per detector call')
+    batch_parser.add_argument('--identity-cache', action='store_true', help='Reuse identities of tracked people in videos')
+    batch_parser.add_argument('--no-resume', action='store_true', help='Reprocess inputs that already have detections')
+    batch_parser.add_argument('--detections-format', choices=['jsonl', 'parquet'], default='jsonl',
+                              help='Format of the per-input detections files (parquet needs pyarrow)')
+    batch_parser.add_argument('--motion-gate', type=float, nargs='?', const=True, metavar='THRESHOLD',
+                              help='Skip detection on video frames where less than THRESHOLD of the pixels changed (default 0.005)')
+    add_inference_args(batch_parser)
+    multicam_parser = subparsers.add_parser('multicam', help='Serve several cameras or streams with one shared detector')
+    multicam_parser.add_argument('sources', nargs='+', help='Camera indices, RTSP/HTTP URLs or video files (stand-ins for live streams)')
+    multicam_parser.add_argument('--policy', choices=['round_robin', 'deadline'], default='round_robin')
+    multicam_parser.add_argument('--max-batch', type=int, default=8, help='Frames per shared detector call')
+    multicam_parser.add_argument('--max-age', type=float, default=0.5, help='Drop frames older than this many seconds')
+    multicam_parser.add_argument('--workers', type=int, default=2, help='Face recognition workers; above 1, dlib runs on as many processes')
+    multicam_parser.add_argument('--output', help='Directory for per-camera annotated videos and detections')
+    multicam_parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    multicam_parser.add_argument('--no-pace', action='store_true', help='Read video files as fast as possible instead of at their frame rate')
+    add_inference_args(multicam_parser)
+    serve_parser = subparsers.add_parser('serve', help='Local HTTP recognition service with a resident model and gallery')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--unix', help='Listen on this Unix socket instead of TCP')
+    serve_parser.add_argument('--max-batch', type=int, default=8, help='Frames per micro-batch')
+    serve_parser.add_argument('--max-delay-ms', type=float, default=10.0, help='How long a request may wait for others to batch with')
+    serve_parser.add_argument('--workers', type=int, default=2, help='Inference threads')
+    serve_parser.add_argument('--queue-size', type=int, default=64, help='Frames allowed to wait; beyond this requests get 503')
+    add_inference_args(serve_parser)
+    render_parser = subparsers.add_parser('render', help='Draw stored detections onto their image or video')
+    render_parser.add_argument('source', help='Original image or video')
+    render_parser.add_argument('detections', help='Detections file (.jsonl or .parquet, e.g. from batch or detections_output)')
+    render_parser.add_argument('output', help='Annotated image or video to write')
+    render_parser.add_argument('--mode', choices=[m for m in RENDER_MODES if m != 'none'], default='full')
     args = parser.parse_args()
 
+    exporter = None
+    if args.metrics_file or args.metrics_port is not None:
+        if args.command == 'render':
+            print('Error: --metrics-file/--metrics-port do not apply to render')
+            return 2
+        if args.command == 'batch' and args.workers > 1:
+            print('Error: --metrics-file/--metrics-port need batch --workers 1 (worker processes keep their own metrics)')
+            return 2
+        enable_metrics()
+        exporter = MetricsExporter(args.metrics_file, args.metrics_port, args.metrics_interval)
+    try:
+        return run_command(args)
+    finally:
+        if exporter is not None:
+            exporter.stop()
+            disable_metrics()
+
+def run_command(args):
+    """Dispatch to a headless subcommand, or open the GUI; returns the exit code."""
+    if args.command == 'batch':
+        from batch import run_batch # Headless: the GUI toolkit is never imported
+        settings = dict(inference_settings(args), batch_size=args.batch_size, identity_cache=args.identity_cache,
+                        motion_gate=args.motion_gate, detections_format=args.detections_format)
+        try:
+            report = run_batch(args.inputs, args.output, settings, workers=args.workers, resume=not args.no_resume)
+        except (ValueError, ImportError) as e:
+            print(f'Error: {e}')
+            return 2
+        return 1 if report['failed'] else 0
+
+    if args.command == 'multicam':
+        return run_multicam(args)
+
+    if args.command == 'serve':
+        return run_service(args)
+
+    if args.command == 'render':
+        from render import render_detections
+        return 0 if render_detections(args.source, args.detections, args.output, args.mode) else 1
+
+    from gui import FaceRecognitionGUI
+
+    # Load the detector and gallery once, in the background so the window opens immediately
+    engine = RecognitionEngine()
+    threading.Thread(target=engine.load, daemon=True).start()
+
     # Initialize GUI with the processing callback
-    gui = FaceRecognitionGUI(process_callback=process_request)
+    gui = FaceRecognitionGUI(process_callback=functools.partial(process_request, engine=engine),
+                             threshold=args.threshold)
     
     # Run the GUI
     gui.run()
+    return 0
+
+def add_inference_args(parser):
+    """Detector, face and annotation options shared by the headless subcommands."""
+    parser.add_argument('--yolo-conf', type=float, default=0.5)
+    parser.add_argument('--yolo-iou', type=float, default=0.45)
+    parser.add_argument('--classes', default='all',
+                        help="YOLO classes to detect: 'all', 'person' (recognition fast path) or comma-separated class names")
+    parser.add_argument('--face-detect-mode', choices=['roi', 'frame'], default='roi')
+    parser.add_argument('--face-detect-scale', type=float, default=1.0)
+    parser.add_argument('--render', choices=RENDER_MODES, default='full',
+                        help="Annotation of the output copies; 'none' writes detections only")
+    parser.add_argument('--ann', choices=['auto', 'on', 'off'], default='auto',
+                        help='Approximate face search index; auto uses it for galleries of 5000+ encodings')
+    parser.add_argument('--ann-nprobe', type=int, default=16,
+                        help='Index lists scanned per face: higher is closer to exact search, lower is faster')
+    parser.add_argument('--ann-lists', type=int, help='Index lists (default: square root of the gallery size)')
+
+def inference_settings(args):
+    return {
+        'threshold': args.threshold,
+        'yolo_conf': args.yolo_conf,
+        'yolo_iou': args.yolo_iou,
+        'classes': args.classes,
+        'face_detect_mode': args.face_detect_mode,
+        'face_detect_scale': args.face_detect_scale,
+        'render': args.render,
+        'ann': args.ann,
+        'ann_nprobe': args.ann_nprobe,
+        'ann_lists': args.ann_lists,
+    }
+
+def run_multicam(args):
+    """multicam subcommand: serve all sources from one engine and print the per-camera report."""
+    from multicam import MultiCameraServer, format_multicam_report
+    settings = inference_settings(args)
+    sources = [LatestFrameCapture(url, name=f'cam{i}', pace=False if args.no_pace else None)
+               for i, url in enumerate(args.sources)]
+    server = MultiCameraServer(sources, RecognitionEngine(), settings, policy=args.policy,
+                               max_batch=args.max_batch, max_age=args.max_age, workers=args.workers)
+    writers, sinks = {}, {}
 
-def process_frame(frame, model, known_encodings, known_names, threshold):
-    """Detect, recognize faces, and annotate frame without displaying"""
-    results = model(frame)
+    def on_result(name, seq, frame, detections):
+        # Called under the server's lock, in capture order per camera
+        if args.output is None:
+            return
+        if name not in writers:
+            h, w = frame.shape[:2]
+            writers[name] = cv2.VideoWriter(os.path.join(args.output, f'{name}.mp4'), cv2.VideoWriter.fourcc(*'mp4v'), 25, (w, h))
+            sinks[name] = DetectionWriter(os.path.join(args.output, f'{name}.detections.jsonl'), source=name)
+        if args.render != 'none':
+            writers[name].write(frame)
+        sinks[name].write(seq, round(time.time(), 3), detections)
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    stop_event = threading.Event()
+    try:
+        report = server.run(on_result, stop_event, duration=args.duration)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return 2
+    except KeyboardInterrupt:
+        stop_event.set()
+        report = server.report()
+    finally:
+        for writer in writers.values():
+            writer.release()
+        for sink in sinks.values():
+            sink.close()
+    print(format_multicam_report(report))
+    return 0
+
+def run_service(args):
+    """serve subcommand: run service.RecognitionService until interrupted."""
+    import asyncio
+    from service import RecognitionService
+    service = RecognitionService(RecognitionEngine(), inference_settings(args), max_batch=args.max_batch,
+                                 max_delay=args.max_delay_ms / 1000, workers=args.workers, queue_size=args.queue_size)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except ValueError as e:
+        print(f'Error: {e}')
+        return 2
+    except KeyboardInterrupt:
+        print('Recognition service stopped.')
+    return 0
+
+def run_staged(cap, engine, settings, matcher, write_fn, stop_event=None, sink=None, fps=None):
+    """Process every frame of cap through pipeline.run_pipeline and print the per-stage report.
+
+    Uses settings 'batch_size', 'pipeline_workers' (recognition threads) and
+    'pipeline_queue' (bound of each inter-stage queue). With more than one
+    worker, dlib runs on the engine's face pool (one process per worker), so
+    recognition is not serialized on face_ops.DLIB_LOCK. Detections go to sink
+    if given, stamped with stream time for files (fps) or wall time for live sources.
+    """
+    workers = max(1, int(settings.get('pipeline_workers', 2)))
+    face_pool = engine.face_pool(workers) if workers > 1 else None
+
+    def read_fn():
+        ret, frame = cap.read()
+        return frame if ret else None
+
+    def detect_fn(frames):
+        return engine.detect_batch(frames, settings['yolo_conf'], settings['yolo_iou'], settings.get('classes'))
+
+    def recognize_fn(frame, results, index):
+        current = engine.current_matcher(settings) # Picks up re-encoded galleries
+        timestamp = round(index / fps, 3) if fps else time.time()
+        frame = process_frame(frame, None, current, settings['threshold'], results=[results], settings=settings,
+                              sink=sink, frame_index=index, timestamp=timestamp, face_pool=face_pool)
+        if settings.get('metrics_overlay'):
+            draw_overlay(frame, get_metrics().snapshot())
+        return frame
+
+    report = run_pipeline(read_fn, detect_fn, recognize_fn, write_fn, stop_event,
+                          queue_size=max(1, int(settings.get('pipeline_queue', 8))),
+                          workers=workers, batch_size=max(1, int(settings.get('batch_size', 1))))
+    print(format_report(report))
+    return report
+
+def read_frames(cap, count):
+    """Read up to count frames from cap; fewer (or none) at the end of the stream."""
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    return frames
+
+def detect_objects(frame, model, results=None):
+    """Run (or reuse) YOLO on frame and return its boxes as Detection records without faces."""
+    if results is None:
+        results = model(frame)
+    detections = []
     for r in results:
-        boxes = r.boxes.xyxy.cpu().numpy().astype(int)
-        classes = r.boxes.cls.cpu().numpy().astype(int)
-        for box, cls in zip(boxes, classes):
-            label = results[0].names[cls]  # Use class names from the results object
-            draw_box(frame, box, label)
-            if label == 'person':
-                x1, y1, x2, y2 = box
-                face_roi = frame[y1:y2, x1:x2]
-                faces = recognize_faces(face_roi, known_encodings, known_names, threshold)
-                for (l, t, r, b), name in faces:
-                    abs_box = (x1+l, y1+t, x1+r, y1+b)
-                    draw_box(frame, abs_box, name, color=(255,0,0))
+        names = r.names # Class id -> name, looked up once per result rather than per box
+        boxes = r.boxes.xyxy.cpu().numpy().astype(int).tolist()
+        classes = r.boxes.cls.cpu().numpy().astype(int).tolist()
+        confidences = r.boxes.conf.cpu().numpy().tolist()
+        detections.extend(Detection(tuple(box), names[cls], conf, [])
+                          for box, cls, conf in zip(boxes, classes, confidences))
+    return detections
+
+def recognize_boxes(frames, boxes_per_frame, matcher, threshold, mode='roi', scale=1.0, face_pool=None):
+    """Recognize faces inside person boxes of several frames with one encoder and one matcher call.
+
+    With a face_pool (face_ops.FacePool) face location and encoding run on
+    one of its worker processes. Returns, for each frame, one Face list per
+    box (frame coordinates).
+    """
+    metrics = get_metrics()
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if boxes else None
+                  for frame, boxes in zip(frames, boxes_per_frame)]
+    # Face chips of every box of every frame are encoded together, then scattered back
+    locate_fn = face_pool.locate_and_encode if face_pool is not None else locate_and_encode
+    located, encoded, timings = locate_fn(rgb_frames, boxes_per_frame, mode, scale)
+    for stage, seconds in timings.items():
+        metrics.record(stage, seconds)
+    with metrics.timer('match'):
+        matches = iter(matcher.match([e for per_image in encoded for e in per_image], tolerance=1-threshold))
+    results = []
+    for per_box_locations in located:
+        per_frame = []
+        for locations in per_box_locations:
+            faces = []
+            for top, right, bottom, left in locations:
+                match = next(matches)
+                faces.append(Face((left, top, right, bottom), match.name, match.distance))
+            per_frame.append(faces)
+        results.append(per_frame)
+    return results
+
+def recognize_in_box(frame, box, matcher, threshold, scale=1.0):
+    """Recognize faces inside a person box; face boxes are returned in frame coordinates."""
+    return recognize_boxes([frame], [[box]], matcher, threshold, 'roi', scale)[0][0]
+
+def recognize_in_frame(frame, boxes, matcher, threshold, scale=1.0):
+    """Recognize faces for several person boxes with one full-frame face detection pass.
+
+    Faces are assigned to boxes geometrically, so a face inside overlapping
+    boxes is located and encoded once. Returns one face list per box.
+    """
+    return recognize_boxes([frame], [boxes], matcher, threshold, 'frame', scale)[0]
+
+def analyze_frames(frames, model, matcher, threshold, results=None, tracker=None, identity_cache=None, settings=None,
+                   face_pool=None):
+    """Detect objects and recognize faces inside person boxes; returns a list of Detection per frame.
+
+    Pass results (one entry per frame) to reuse detections already computed
+    for these frames (batched video mode). With a tracker, boxes get stable
+    track ids; with an identity_cache as well, tracks recognized recently,
+    including in an earlier frame of the same batch, are not re-encoded.
+    Faces of all frames are encoded in one batch.
+    settings['face_detect_mode'] is 'roi' (face detection per person box) or
+    'frame' (one pass per frame); settings['face_detect_scale'] < 1 locates
+    faces on a downscaled image. face_pool is passed to recognize_boxes.
+    """
+    settings = settings or {}
+    scale = float(settings.get('face_detect_scale', 1.0))
+    mode = settings.get('face_detect_mode', 'roi')
+    results = results or [None] * len(frames)
+    metrics = get_metrics()
+    all_detections = []
+    all_faces = []
+    pending = []
+    deferred = [] # (frame, detection) positions of tracks already queued earlier in this batch
+    queued = set()
+    for fi, (frame, frame_results) in enumerate(zip(frames, results)):
+        detections = detect_objects(frame, model, frame_results)
+        if tracker is not None:
+            with metrics.timer('track'):
+                detections = tracker.update(detections)
+        faces_by_det = {}
+        waiting = []
+        for i, det in enumerate(detections):
+            if det.label != 'person':
+                continue
+            if identity_cache is not None and det.track_id in queued:
+                # Its cache entry only exists once the earlier frame is recognized
+                deferred.append((fi, i))
+                continue
+            cached = identity_cache.lookup(frame, det) if identity_cache is not None else None
+            if cached is not None:
+                faces_by_det[i] = cached
+            else:
+                waiting.append(i)
+                if identity_cache is not None and det.track_id is not None:
+                    queued.add(det.track_id)
+        all_detections.append(detections)
+        all_faces.append(faces_by_det)
+        pending.append(waiting)
+
+    def recognize(pending):
+        found = recognize_boxes(frames, [[dets[i].box for i in waiting] for dets, waiting in zip(all_detections, pending)],
+                                matcher, threshold, mode, scale, face_pool)
+        for frame, detections, faces_by_det, waiting, per_box in zip(frames, all_detections, all_faces, pending, found):
+            for i, faces in zip(waiting, per_box):
+                faces_by_det[i] = faces
+                if identity_cache is not None:
+                    identity_cache.store(frame, detections[i], faces)
+
+    if any(pending):
+        recognize(pending)
+    if deferred:
+        # Later frames of a track reuse what its first frame in the batch stored; only
+        # the ones the cache cannot serve (unknown faces, changed appearance) are encoded
+        retry = [[] for _ in frames]
+        for fi, i in deferred:
+            cached = identity_cache.lookup(frames[fi], all_detections[fi][i])
+            if cached is not None:
+                all_faces[fi][i] = cached
+            else:
+                retry[fi].append(i)
+        if any(retry):
+            recognize(retry)
+    if identity_cache is not None:
+        # Running totals, so the HUD and the exporters show the cache paying off (or not)
+        cache = identity_cache.stats()
+        metrics.gauge('identity_cache_hit_rate', cache['hit_rate'])
+        metrics.gauge('identity_cache_entries', cache['entries'])
+    analyzed = []
+    for detections, faces_by_det in zip(all_detections, all_faces):
+        frame_detections = []
+        for i, det in enumerate(detections):
+            faces = faces_by_det.get(i, [])
+            if tracker is not None and det.label == 'person':
+                tracker.attach_faces(det.track_id, faces)
+            frame_detections.append(det._replace(faces=faces))
+        metrics.observe('faces_per_frame', sum(len(det.faces) for det in frame_detections))
+        analyzed.append(frame_detections)
+    return analyzed
+
+def analyze_frame(frame, model, matcher, threshold, results=None, tracker=None, identity_cache=None, settings=None,
+                  face_pool=None):
+    """analyze_frames for a single frame; returns its list of Detection."""
+    return analyze_frames([frame], model, matcher, threshold, results=[results], tracker=tracker,
+                          identity_cache=identity_cache, settings=settings, face_pool=face_pool)[0]
+
+def process_frame(frame, model, matcher, threshold, results=None, tracker=None, identity_cache=None, settings=None,
+                  sink=None, frame_index=None, timestamp=None, face_pool=None):
+    """Detect, recognize faces, and annotate frame without displaying.
+
+    With a sink (detections.DetectionWriter) the detections are also recorded
+    under frame_index and timestamp. settings['render'] selects the annotation
+    ('full', 'minimal' or 'none'; see utils.draw_detections). With a face_pool
+    faces are located and encoded on its worker processes.
+    """
+    detections = analyze_frame(frame, model, matcher, threshold, results=results, tracker=tracker,
+                               identity_cache=identity_cache, settings=settings, face_pool=face_pool)
+    if sink is not None:
+        sink.write(frame_index, timestamp, detections)
+    with get_metrics().timer('draw'):
+        draw_detections(frame, detections, (settings or {}).get('render', 'full'))
     return frame
 
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class Metrics:
+    """Rolling performance counters: per-stage timings, frame rate, latency, gauges.
+
+    Every series keeps its last `window` samples, so the summary tracks the
+    current behaviour rather than the whole run. Safe to update from
+    several threads.
+    """
+
+    def __init__(self, window=300):
+        self.window = window
+        self.frames_total = 0
+        self._stages = {}
+        self._values = {}
+        self._gauges = {}
+        self._frames = deque(maxlen=window) # (finish time, latency or None)
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._snapshot_at = 0.0
+
+    def timer(self, stage):
+        """Context manager that records the duration of a stage."""
+        return _StageTimer(self, stage)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            series = self._stages.get(stage)
+            if series is None:
+                series = self._stages[stage] = deque(maxlen=self.window)
+            series.append(seconds)
+
+    def observe(self, name, value):
+        """Add a sample to a distribution, e.g. faces per frame."""
+        with self._lock:
+            series = self._values.get(name)
+            if series is None:
+                series = self._values[name] = deque(maxlen=self.window)
+            series.append(value)
+
+    def gauge(self, name, value):
+        """Set a point-in-time value: queue depths are named queue_<name>, e.g. queue_read."""
+        self._gauges[name] = value
+
+    def frame_done(self, latency=None):
+        """Count a finished frame; latency is its capture-to-output time in seconds, if known."""
+        with self._lock:
+            self.frames_total += 1
+            self._frames.append((time.perf_counter(), latency))
+
+    def snapshot(self, max_age=0.5):
+        """Summary dict; cached for max_age seconds so per-frame overlays stay cheap."""
+        now = time.perf_counter()
+        if self._snapshot is not None and now - self._snapshot_at < max_age:
+            return self._snapshot
+        with self._lock:
+            frames = list(self._frames)
+            stages = {name: np.array(s) for name, s in self._stages.items() if s}
+            values = {name: np.array(v) for name, v in self._values.items() if v}
+            gauges = dict(self._gauges)
+            total = self.frames_total
+        latencies = np.array([lat for _, lat in frames if lat is not None])
+        span = frames[-1][0] - frames[0][0] if len(frames) > 1 else 0.0
+        snapshot = {
+            'frames': total,
+            'fps': round((len(frames) - 1) / span, 2) if span > 0 else 0.0,
+            'latency_ms': _percentiles_ms(latencies),
+            'stages_ms': {name: dict(_percentiles_ms(s), mean=round(float(s.mean()) * 1000, 2)) for name, s in stages.items()},
+            'values': {name: {'mean': round(float(v.mean()), 3), 'max': float(v.max())} for name, v in values.items()},
+            'gauges': gauges,
+        }
+        self._snapshot, self._snapshot_at = snapshot, now
+        return snapshot
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.stage, time.perf_counter() - self.start)
+
+
+class NullMetrics:
+    """Stand-in used while instrumentation is off; every call is a no-op."""
+
+    frames_total = 0
+    _timer = nullcontext()
+
+    def timer(self, stage):
+        return self._timer
+
+    def record(self, stage, seconds):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+    def frame_done(self, latency=None):
+        pass
+
+    def snapshot(self, max_age=0.5):
+        return None
+
+
+_active = NullMetrics()
+
+
+def get_metrics():
+    """The process-wide metrics object (a NullMetrics unless enabled)."""
+    return _active
+
+
+def enable_metrics(window=300):
+    """Turn instrumentation on; returns the active Metrics. Calling it again keeps the existing one."""
+    global _active
+    if not isinstance(_active, Metrics):
+        _active = Metrics(window)
+    return _active
+
+
+def metrics_enabled():
+    return isinstance(_active, Metrics)
+
+
+def disable_metrics():
+    global _active
+    _active = NullMetrics()
+
+
+def _percentiles_ms(samples):
+    if not len(samples):
+        return {f'p{p}': None for p in PERCENTILES}
+    values = np.percentile(samples, PERCENTILES) * 1000
+    return {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, values)}
+
+
+def format_metrics(snapshot):
+    """Short multi-line text for the GUI panel and the frame overlay."""
+    if snapshot is None:
+        return 'Metrics off'
+    lat = snapshot['latency_ms']
+    lines = [f"{snapshot['fps']:.1f} fps  latency p50 {lat['p50']} / p95 {lat['p95']} / p99 {lat['p99']} ms"]
+    for name, s in snapshot['stages_ms'].items():
+        lines.append(f"{name:<8} {s['mean']:>7.1f} ms  p95 {s['p95']}")
+    faces = snapshot['values'].get('faces_per_frame')
+    if faces:
+        lines.append(f"faces/frame {faces['mean']:.2f} (max {faces['max']:.0f})")
+    gauges = snapshot['gauges']
+    if 'identity_cache_hit_rate' in gauges:
+        lines.append(f"id cache hit {gauges['identity_cache_hit_rate']:.0%} ({gauges.get('identity_cache_entries', 0)} tracks)")
+    queues = _queue_gauges(gauges)
+    if queues:
+        lines.append('queues ' + ' '.join(f'{k}={v}' for k, v in queues))
+    return '\n'.join(lines)
+
+
+def _queue_gauges(gauges):
+    return sorted((k[len('queue_'):], v) for k, v in gauges.items() if k.startswith('queue_'))
+
+
+def draw_overlay(img, snapshot):
+    """Draw format_metrics text in the top-left corner of img."""
+    if snapshot is None:
+        return
+    scale = max(img.shape[:2]) / 1280
+    font_scale = max(0.4, 0.5 * scale)
+    line_h = int(22 * max(scale, 0.8))
+    lines = format_metrics(snapshot).split('\n')
+    width = int(max(len(line) for line in lines) * 10 * font_scale / 0.5)
+    # Darken the panel area in place instead of blending a copy of the whole frame
+    panel = img[0:line_h * len(lines) + 8, 0:width]
+    panel //= 3
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (6, line_h * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 255, 255), 1, cv2.LINE_AA)
+
+
+def to_prometheus(snapshot, prefix='facerec'):
+    """Prometheus text exposition of a snapshot."""
+    if snapshot is None:
+        return ''
+    lines = [f'# TYPE {prefix}_frames_total counter', f"{prefix}_frames_total {snapshot['frames']}",
+             f'# TYPE {prefix}_fps gauge', f"{prefix}_fps {snapshot['fps']}",
+             f'# TYPE {prefix}_latency_seconds summary']
+    for p in PERCENTILES:
+        value = snapshot['latency_ms'][f'p{p}']
+        if value is not None:
+            lines.append(f'{prefix}_latency_seconds{{quantile="{p / 100}"}} {round(value / 1000, 6)}')
+    lines.append(f'# TYPE {prefix}_stage_seconds summary')
+    for name, s in snapshot['stages_ms'].items():
+        for p in PERCENTILES:
+            lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="{p / 100}"}} {round(s[f"p{p}"] / 1000, 6)}')
+    for name, v in snapshot['values'].items():
+        lines += [f'# TYPE {prefix}_{name} gauge', f"{prefix}_{name} {v['mean']}"]
+    for name, v in sorted(snapshot['gauges'].items()):
+        if not name.startswith('queue_'):
+            lines += [f'# TYPE {prefix}_{name} gauge', f'{prefix}_{name} {v}']
+    queues = _queue_gauges(snapshot['gauges'])
+    if queues:
+        lines.append(f'# TYPE {prefix}_queue_depth gauge')
+        lines += [f'{prefix}_queue_depth{{queue="{k}"}} {v}' for k, v in queues]
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsExporter:
+    """Publish the active metrics periodically to a JSON file and/or on a local HTTP endpoint.
+
+    path is rewritten atomically every interval seconds. port serves
+    Prometheus text at http://127.0.0.1:<port>/metrics. Both run on daemon
+    threads; call stop() to shut them down.
+    """
+
+    def __init__(self, path=None, port=None, interval=5.0, host='127.0.0.1'):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._server = None
+        if path:
+            threading.Thread(target=self._write_loop, name='metrics-file', daemon=True).start()
+        if port is not None:
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(handler):
+                    if handler.path.split('?')[0] != '/metrics':
+                        handler.send_error(404)
+                        return
+                    body = to_prometheus(get_metrics().snapshot(max_age=0)).encode()
+                    handler.send_response(200)
+                    handler.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    handler.send_header('Content-Length', str(len(body)))
+                    handler.end_headers()
+                    handler.wfile.write(body)
+
+                def log_message(handler, *args):
+                    pass # Keep scrapes out of the console
+
+            self._server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+            print(f'Metrics at http://{host}:{self._server.server_address[1]}/metrics')
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        snapshot = get_metrics().snapshot(max_age=0)
+        if snapshot is None:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(snapshot, time=time.time()), f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self.path:
+            self.write()
@@ -0,0 +1,188 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from main import analyze_frames
+from metrics import get_metrics
+from utils import draw_detections
+
+
+class FairScheduler:
+    """Choose which cameras' frames go into the next detector batch.
+
+    'round_robin' serves cameras in a rotating order, so every camera gets a
+    slot before any gets a second one. 'deadline' serves the oldest frames
+    first (earliest deadline = capture time + max_age). Frames older than
+    max_age seconds are dropped as stale instead of being processed late.
+    """
+
+    def __init__(self, names, policy='round_robin', max_batch=8, max_age=0.5):
+        if policy not in ('round_robin', 'deadline'):
+            raise ValueError(f'Unknown scheduling policy {policy!r}')
+        self.names = list(names)
+        self.policy = policy
+        self.max_batch = max_batch
+        self.max_age = max_age
+        self.stale = {name: 0 for name in self.names}
+        self._next = 0
+
+    def pick(self, ready, now):
+        """ready maps camera name -> (seq, frame, captured_at); returns [(name, seq, frame, captured_at)]."""
+        fresh = {}
+        for name, item in ready.items():
+            if self.max_age and now - item[2] > self.max_age:
+                self.stale[name] += 1
+            else:
+                fresh[name] = item
+        if self.policy == 'deadline':
+            order = sorted(fresh, key=lambda name: fresh[name][2])
+        else:
+            n = len(self.names)
+            order = [self.names[(self._next + i) % n] for i in range(n) if self.names[(self._next + i) % n] in fresh]
+        picked = order[:self.max_batch]
+        if picked and self.policy == 'round_robin':
+            self._next = (self.names.index(picked[-1]) + 1) % len(self.names)
+        return [(name,) + fresh[name] for name in picked]
+
+
+class MultiCameraServer:
+    """Serve many streams with one detector and one gallery.
+
+    sources are capture.LatestFrameCapture objects (not started yet), which
+    keep only the newest frame per camera. A scheduler
+    thread batches frames across cameras into one detector call, and face
+    recognition for each batch runs on a pool of `workers` threads, so the
+    next batch is detected while the previous one is recognized. With more
+    than one worker, the threads hand face location and encoding to the
+    engine's face pool (one process per worker, each with its own dlib
+    models), so recognition scales with cores. on_result(name, seq, frame, detections) is called per
+    processed frame in capture order (seq counts the camera's frames);
+    frames finishing after a newer frame of the same camera are counted as
+    late and skipped.
+    """
+
+    def __init__(self, sources, engine, settings, policy='round_robin', max_batch=8, max_age=0.5, workers=2):
+        self.sources = sources
+        self.engine = engine
+        self.settings = settings
+        self.workers = max(1, workers)
+        self.scheduler = FairScheduler([s.name for s in sources], policy, max_batch, max_age)
+        self._lock = threading.Lock()
+        self._stats = {s.name: {'processed': 0, 'late': 0, 'superseded': 0, 'latencies': deque(maxlen=1000), 'last_seq': 0}
+                       for s in sources}
+        self.batches = 0
+        self.batched_frames = 0
+        self.started = None
+        self.elapsed = None
+        self._face_pool = None
+
+    def run(self, on_result=None, stop_event=None, duration=None):
+        """Process until every source ends, stop_event is set or duration seconds pass; returns report()."""
+        self.engine.load(self.settings)
+        self.engine.class_ids(self.settings.get('classes')) # Unknown class names fail before any camera opens
+        self._face_pool = self.engine.face_pool(self.workers) if self.workers > 1 else None
+        for source in self.sources:
+            source.start()
+        started = self.started = time.perf_counter()
+        inflight = deque()
+        ready = {} # Newest unprocessed frame per camera; waits here if the batch was full
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='multicam-recognize')
+        try:
+            while not (stop_event is not None and stop_event.is_set()):
+                now = time.perf_counter()
+                if duration and now - started >= duration:
+                    break
+                for source in self.sources:
+                    item = source.take()
+                    if item is not None:
+                        if source.name in ready:
+                            self._stats[source.name]['superseded'] += 1
+                        ready[source.name] = item
+                picked = self.scheduler.pick(ready, now) if ready else []
+                # Picked frames leave the queue; so do stale ones, which pick() has counted
+                ready = {name: item for name, item in ready.items()
+                         if not (self.scheduler.max_age and now - item[2] > self.scheduler.max_age)}
+                for name, _, _, _ in picked:
+                    del ready[name]
+                if not picked:
+                    if all(s.finished for s in self.sources) and not ready:
+                        break
+                    time.sleep(0.002)
+                    continue
+                results = self.engine.detect_batch([frame for _, _, frame, _ in picked],
+                                                   self.settings['yolo_conf'], self.settings['yolo_iou'],
+                                                   self.settings.get('classes'))
+                self.batches += 1
+                self.batched_frames += len(picked)
+                # Bound the work in flight; while we wait, newer frames replace older ones at the cameras
+                while len(inflight) >= self.workers:
+                    inflight.popleft().result()
+                inflight.append(pool.submit(self._recognize, picked, results, on_result))
+            for future in inflight:
+                future.result()
+        finally:
+            pool.shutdown(wait=True)
+            for source in self.sources:
+                source.stop()
+        self.elapsed = time.perf_counter() - started
+        return self.report()
+
+    def _recognize(self, picked, results, on_result):
+        matcher = self.engine.current_matcher(self.settings)
+        frames = [frame for _, _, frame, _ in picked]
+        batch_detections = analyze_frames(frames, None, matcher, self.settings['threshold'],
+                                          results=[[r] for r in results], settings=self.settings,
+                                          face_pool=self._face_pool)
+        render_mode = self.settings.get('render', 'full')
+        for (name, seq, frame, captured_at), detections in zip(picked, batch_detections):
+            draw_detections(frame, detections, render_mode)
+            with self._lock:
+                stats = self._stats[name]
+                if seq < stats['last_seq']:
+                    stats['late'] += 1
+                    continue
+                stats['last_seq'] = seq
+                stats['processed'] += 1
+                stats['latencies'].append(time.perf_counter() - captured_at)
+                get_metrics().frame_done(stats['latencies'][-1])
+                if on_result is not None:
+                    on_result(name, seq, frame, detections)
+
+    def report(self):
+        elapsed = self.elapsed or (time.perf_counter() - self.started if self.started else 0.0) or 1e-9
+        cameras = {}
+        for source in self.sources:
+            stats = self._stats[source.name]
+            latencies = np.array(stats['latencies']) * 1000
+            cameras[source.name] = {
+                'url': str(source.source),
+                'captured': source.captured,
+                'processed': stats['processed'],
+                'dropped_overwritten': source.dropped + stats['superseded'],
+                'dropped_stale': self.scheduler.stale[source.name],
+                'late': stats['late'],
+                'fps': round(stats['processed'] / elapsed, 2),
+                'latency_ms': {'p50': round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+                               'p95': round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None},
+            }
+        processed = sum(c['processed'] for c in cameras.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'policy': self.scheduler.policy,
+            'batches': self.batches,
+            'mean_batch': round(self.batched_frames / self.batches, 2) if self.batches else 0.0,
+            'processed': processed,
+            'fps': round(processed / elapsed, 2),
+            'cameras': cameras,
+        }
+
+
+def format_multicam_report(report):
+    lines = [f"{report['processed']} frames in {report['elapsed_s']}s ({report['fps']} fps total), "
+             f"{report['batches']} batches of {report['mean_batch']} frames, policy {report['policy']}"]
+    for name, c in report['cameras'].items():
+        lines.append(f"  {name:<8} {c['processed']:>6} processed / {c['captured']:>6} captured  "
+                     f"{c['fps']:>6} fps  overwritten {c['dropped_overwritten']}  stale {c['dropped_stale']}  "
+                     f"late {c['late']}  latency p50 {c['latency_ms']['p50']} / p95 {c['latency_ms']['p95']} ms")
+    return '\n'.join(lines)
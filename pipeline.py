@@ -0,0 +1,216 @@
+import queue
+import threading
+import time
+import numpy as np
+from metrics import get_metrics
+
+_END = object() # Sentinel passed down the stages when the source is exhausted
+
+
+class StageStats:
+    """Items processed and busy time for one pipeline stage."""
+
+    def __init__(self, name, parallelism=1):
+        self.name = name
+        self.parallelism = parallelism
+        self.items = 0
+        self.busy = 0.0
+        self.queue_depths = []
+
+    def add(self, items, seconds):
+        self.items += items
+        self.busy += seconds
+
+    def summary(self):
+        return {
+            'items': self.items,
+            'busy_s': round(self.busy, 3),
+            # Throughput the stage could sustain on its own; the lowest one is the bottleneck
+            'capacity_per_s': round(self.parallelism * self.items / self.busy, 2) if self.busy else None,
+            'mean_queue_depth': round(float(np.mean(self.queue_depths)), 2) if self.queue_depths else 0.0,
+        }
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def run_pipeline(read_fn, detect_fn, recognize_fn, write_fn, stop_event=None,
+                 queue_size=8, workers=2, batch_size=1):
+    """Run decode -> detect -> recognize -> write on separate threads.
+
+    read_fn() returns the next frame or None at the end. detect_fn(frames)
+    returns one detection result per frame. recognize_fn(frame, result, index)
+    returns the finished frame and runs on a pool of `workers` threads;
+    index is the frame's position in the source. For dlib work to run in
+    parallel as well, recognize_fn hands it to a face_ops.FacePool (main.run_staged
+    does); dlib calls made on the threads themselves take turns on face_ops.DLIB_LOCK.
+    write_fn(frame) is called in the original frame order and may return
+    False to stop early. Stages are joined by bounded queues, so a slow
+    stage applies backpressure instead of buffering the whole video.
+
+    Returns a report with per-stage stats, throughput and end-to-end latency.
+    """
+    stop = threading.Event()
+    metrics = get_metrics()
+    read_q = queue.Queue(maxsize=queue_size)
+    detect_q = queue.Queue(maxsize=queue_size)
+    done_q = queue.Queue(maxsize=queue_size)
+    stats = {'read': StageStats('read'), 'detect': StageStats('detect'),
+             'recognize': StageStats('recognize', parallelism=workers), 'write': StageStats('write')}
+    latencies = []
+    errors = []
+
+    def guarded(fn):
+        def run():
+            try:
+                fn()
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+        return run
+
+    def watch_stop():
+        # Mirror the caller's stop_event into the internal one
+        while not stop.is_set():
+            if stop_event is not None and stop_event.wait(0.1):
+                stop.set()
+            elif stop_event is None:
+                return
+
+    def reader():
+        index = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            frame = read_fn()
+            if frame is None:
+                break
+            stats['read'].add(1, time.perf_counter() - start)
+            if not _put(read_q, (index, frame, start), stop):
+                return
+            index += 1
+        _put(read_q, _END, stop)
+
+    def detector():
+        finished = False
+        while not finished and not stop.is_set():
+            batch = []
+            item = _get(read_q, stop)
+            while item is not _END:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    break
+                try:
+                    item = read_q.get_nowait()
+                except queue.Empty:
+                    break
+            finished = item is _END
+            if batch:
+                stats['detect'].queue_depths.append(read_q.qsize())
+                metrics.gauge('queue_read', read_q.qsize())
+                metrics.gauge('queue_detect', detect_q.qsize())
+                start = time.perf_counter()
+                results = detect_fn([frame for _, frame, _ in batch])
+                stats['detect'].add(len(batch), time.perf_counter() - start)
+                for (index, frame, t0), result in zip(batch, results):
+                    if not _put(detect_q, (index, frame, result, t0), stop):
+                        return
+        for _ in range(workers):
+            _put(detect_q, _END, stop)
+
+    def recognizer():
+        while True:
+            item = _get(detect_q, stop)
+            if item is _END:
+                break
+            index, frame, result, t0 = item
+            start = time.perf_counter()
+            frame = recognize_fn(frame, result, index)
+            stats['recognize'].add(1, time.perf_counter() - start)
+            if not _put(done_q, (index, frame, t0), stop):
+                return
+        _put(done_q, _END, stop)
+
+    def writer():
+        pending = {}
+        next_index = 0
+        ended = 0
+        while ended < workers:
+            item = _get(done_q, stop)
+            if item is _END:
+                if stop.is_set():
+                    return
+                ended += 1
+                continue
+            index, frame, t0 = item
+            pending[index] = (frame, t0)
+            stats['write'].queue_depths.append(len(pending))
+            metrics.gauge('queue_reorder', len(pending))
+            # Reorder buffer: release frames strictly in source order
+            while next_index in pending:
+                frame, t0 = pending.pop(next_index)
+                start = time.perf_counter()
+                keep_going = write_fn(frame)
+                now = time.perf_counter()
+                stats['write'].add(1, now - start)
+                latencies.append(now - t0)
+                metrics.frame_done(now - t0)
+                next_index += 1
+                if keep_going is False:
+                    stop.set()
+                    return
+        stop.set() # Everything written; releases the stop watcher
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=guarded(reader), name='pipeline-read'),
+               threading.Thread(target=guarded(detector), name='pipeline-detect'),
+               threading.Thread(target=guarded(writer), name='pipeline-write')]
+    threads += [threading.Thread(target=guarded(recognizer), name=f'pipeline-recognize-{i}') for i in range(workers)]
+    watcher = threading.Thread(target=watch_stop, daemon=True)
+    for t in threads:
+        t.start()
+    watcher.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+
+    written = stats['write'].items
+    report = {
+        'frames': written,
+        'elapsed_s': round(elapsed, 3),
+        'fps': round(written / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies else None,
+            'p95': round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies else None,
+        },
+        'stages': {name: s.summary() for name, s in stats.items()},
+    }
+    return report
+
+
+def format_report(report):
+    """Human-readable multi-line summary of a run_pipeline report."""
+    lines = [f"{report['frames']} frames in {report['elapsed_s']}s ({report['fps']} fps), "
+             f"latency p50 {report['latency_ms']['p50']} ms / p95 {report['latency_ms']['p95']} ms"]
+    for name, s in report['stages'].items():
+        lines.append(f"  {name:<10} {s['items']:>6} items  {s['busy_s']:>8}s busy  "
+                     f"{s['capacity_per_s']} /s capacity  queue {s['mean_queue_depth']}")
+    return '\n'.join(lines)
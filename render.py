@@ -0,0 +1,73 @@
+import os
+import json
+from collections import defaultdict
+import cv2
+from detections import Detection, Face
+from utils import draw_detections
+
+
+def _from_records(records):
+    """Group flat DetectionWriter records back into Detection lists per frame."""
+    frames = defaultdict(dict)
+    for r in records:
+        box = (r['x1'], r['y1'], r['x2'], r['y2'])
+        key = (r['track_id'], r['label'], box, r['confidence'])
+        det = frames[r['frame']].setdefault(key, Detection(box, r['label'], r['confidence'], [], r['track_id']))
+        if r.get('face_x1') is not None:
+            det.faces.append(Face((r['face_x1'], r['face_y1'], r['face_x2'], r['face_y2']), r['name'], r['distance']))
+    return {frame: list(dets.values()) for frame, dets in frames.items()}
+
+
+def load_detections(path):
+    """Detections per frame index from a .jsonl/.parquet DetectionWriter file or a legacy batch .detections.json."""
+    if path.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return _from_records(pq.read_table(path).to_pylist())
+    if path.lower().endswith('.jsonl'):
+        with open(path) as f:
+            return _from_records(json.loads(line) for line in f if line.strip())
+    with open(path) as f:
+        payload = json.load(f)
+    return {entry['frame']: [Detection(tuple(d['box']), d['label'], d['confidence'],
+                                       [Face(tuple(fc['box']), fc['name'], fc['distance']) for fc in d['faces']],
+                                       d.get('track_id'))
+                             for d in entry['detections']]
+            for entry in payload['frames']}
+
+
+def render_detections(source, detections_path, output_path, mode='full'):
+    """Replay stored detections onto the original image or video and write an annotated copy.
+
+    Inference and drawing are decoupled: a run with render 'none' plus a
+    detections file can be annotated later, only when an export is needed.
+    Returns the output path, or None if the source cannot be read.
+    """
+    by_frame = load_detections(detections_path)
+    out_dir = os.path.dirname(output_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    image = cv2.imread(source) if not source.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.m4v')) else None
+    if image is not None:
+        draw_detections(image, by_frame.get(0, []), mode)
+        cv2.imwrite(output_path, image)
+        print(f'Annotated image saved to {output_path}')
+        return output_path
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f'Cannot open {source}')
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter.fourcc(*'mp4v'), fps, size)
+    index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        draw_detections(frame, by_frame.get(index, []), mode)
+        out.write(frame)
+        index += 1
+    cap.release()
+    out.release()
+    print(f'Rendered {index} frames ({len(by_frame)} with detections) to {output_path}')
+    return output_path
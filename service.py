@@ -0,0 +1,220 @@
+import asyncio
+import base64
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from detections import detection_to_dict
+from main import analyze_frames
+from metrics import enable_metrics, to_prometheus
+
+MAX_BODY = 32 * 1024 * 1024 # Largest accepted request body, in bytes
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class RecognitionService:
+    """Local recognition service: one resident engine, concurrent requests coalesced into micro-batches.
+
+    Endpoints:
+      POST /recognize        raw JPEG/PNG body -> {"detections": [...]}
+      POST /recognize_batch  {"images": [base64, ...]} -> {"results": [{"detections": [...]}, ...]}
+      GET  /health           model and gallery status, queue depth
+      GET  /metrics          Prometheus text (stage timings, latency, batch sizes)
+
+    Frames waiting for inference are collected for up to max_delay seconds
+    or until max_batch frames are queued, then run as one detector call and
+    one face-encoding batch on a pool of `workers` threads. The engine
+    runs one detector call at a time, so the threads overlap recognition of
+    one batch with detection of the next. At most
+    queue_size frames may wait; beyond that requests get 503 right away
+    instead of piling up.
+    """
+
+    def __init__(self, engine, settings, max_batch=8, max_delay=0.01, workers=2, queue_size=64):
+        self.engine = engine
+        self.settings = settings
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.metrics = enable_metrics()
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self._queue = None
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='service-infer')
+        self._slots = None
+
+    # Inference ------------------------------------------------------------
+
+    def _infer(self, frames):
+        """Run on a pool thread: one detector call and one recognition batch for all frames."""
+        with self.metrics.timer('batch'):
+            matcher = self.engine.current_matcher(self.settings)
+            results = self.engine.detect_batch(frames, self.settings['yolo_conf'], self.settings['yolo_iou'],
+                                               self.settings.get('classes'))
+            return analyze_frames(frames, None, matcher, self.settings['threshold'],
+                                  results=[[r] for r in results], settings=self.settings)
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._slots.acquire() # Bounded worker pool: wait for a free inference slot
+            self.metrics.observe('batch_size', len(batch))
+            task = loop.run_in_executor(self._pool, self._infer, [frame for frame, _ in batch])
+            task.add_done_callback(lambda t, batch=batch: self._finish(t, batch))
+
+    def _finish(self, task, batch):
+        self._slots.release()
+        error = task.exception()
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(task.result()[i])
+
+    async def recognize(self, frames):
+        """Queue frames for the next micro-batches; returns one detection list per frame."""
+        if self._queue.qsize() + len(frames) > self.queue_size:
+            raise OverflowError('Inference queue is full')
+        loop = asyncio.get_running_loop()
+        futures = []
+        for frame in frames:
+            future = loop.create_future()
+            self._queue.put_nowait((frame, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    # HTTP -----------------------------------------------------------------
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Malformed request line'}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if length < 0:
+                    # Without a usable length the body cannot be framed, so the connection is closed
+                    await self._respond(writer, 400, {'error': 'Bad Content-Length'}, keep_alive=False)
+                    break
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {'error': 'Body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self._route(method, path.split('?')[0], body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if path == '/health':
+            matcher = self.engine.matcher
+            return 200, {'status': 'ok' if self.engine.model is not None else 'loading',
+                         'gallery': len(matcher) if matcher is not None else 0,
+                         'queued': self._queue.qsize(), 'requests': self.requests,
+                         'rejected': self.rejected, 'errors': self.errors}
+        if path == '/metrics':
+            text = to_prometheus(self.metrics.snapshot(max_age=0))
+            text += (f'facerec_requests_total {self.requests}\nfacerec_rejected_total {self.rejected}\n'
+                     f'facerec_errors_total {self.errors}\nfacerec_queue_depth{{queue="service"}} {self._queue.qsize()}\n')
+            return 200, text
+        if path not in ('/recognize', '/recognize_batch'):
+            return 404, {'error': f'Unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST'}
+        self.requests += 1
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            if path == '/recognize':
+                images = [body]
+            else:
+                images = [base64.b64decode(item) for item in json.loads(body)['images']]
+            if not images or not all(images):
+                return 400, {'error': 'Empty image body'} # cv2.imdecode asserts on empty buffers
+            # Decoding is CPU work too; keep it off the event loop
+            frames = await loop.run_in_executor(None, lambda: [cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR)
+                                                               for b in images])
+            if not frames or any(f is None for f in frames):
+                return 400, {'error': 'Body must be a JPEG/PNG image (or a JSON list of base64 images for /recognize_batch)'}
+            detections = await self.recognize(frames)
+        except OverflowError as e:
+            self.rejected += 1
+            return 503, {'error': str(e)}
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': f'Bad request: {e}'}
+        except Exception as e:
+            self.errors += 1
+            return 500, {'error': f'{type(e).__name__}: {e}'}
+        latency = time.perf_counter() - start
+        self.metrics.frame_done(latency)
+        results = [{'detections': [detection_to_dict(d) for d in dets]} for dets in detections]
+        payload = results[0] if path == '/recognize' else {'results': results}
+        payload['latency_ms'] = round(latency * 1000, 2)
+        return 200, payload
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), 'text/plain; version=0.0.4'
+        else:
+            body, content_type = json.dumps(payload).encode(), 'application/json'
+        head = (f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8080, unix_path=None):
+        """Load the engine and serve until cancelled."""
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.engine.load, self.settings)
+        self.engine.class_ids(self.settings.get('classes')) # Reject unknown class names before serving
+        batcher = asyncio.create_task(self._batcher())
+        if unix_path:
+            server = await asyncio.start_unix_server(self._handle, path=unix_path)
+            print(f'Recognition service listening on unix:{unix_path}')
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+            print(f'Recognition service listening on http://{host}:{port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def gallery():
+    """Three identities with four encodings each, spread around well-separated centres."""
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(3, 128)).astype(np.float32)
+    encodings, names = [], []
+    for name, centre in zip(['alice', 'bob', 'carol'], centres):
+        for _ in range(4):
+            encodings.append(centre + rng.normal(scale=0.01, size=128).astype(np.float32))
+            names.append(name)
+    return np.array(encodings), names, centres
@@ -0,0 +1,106 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex, load_or_build_index
+from face_matcher import FaceMatcher
+
+
+@pytest.fixture
+def large_gallery():
+    rng = np.random.default_rng(0)
+    n_identities, per_identity = 200, 5
+    centres = rng.normal(size=(n_identities, 128)).astype(np.float32)
+    encodings = np.repeat(centres, per_identity, axis=0) + rng.normal(scale=0.05, size=(n_identities * per_identity, 128)).astype(np.float32)
+    names = [f'id{i}' for i in range(n_identities) for _ in range(per_identity)]
+    queries = centres + rng.normal(scale=0.05, size=centres.shape).astype(np.float32)
+    return encodings, names, queries
+
+
+def test_ivf_recall(large_gallery):
+    encodings, names, queries = large_gallery
+    exact = FaceMatcher(encodings, names).match(queries, tolerance=10.0)
+
+    matcher = FaceMatcher(encodings, names)
+    index = IVFIndex.build(matcher.encodings, n_lists=32)
+    matcher.attach_index(index, nprobe=8)
+    approx = matcher.match(queries, tolerance=10.0)
+    recall = np.mean([a.name == e.name for a, e in zip(approx, exact)])
+    assert recall >= 0.95
+    for a, e in zip(approx, exact):
+        if a.name == e.name:
+            assert a.distance == pytest.approx(e.distance, rel=1e-3)
+
+    # Probing every list is exact search
+    matcher.attach_index(index, nprobe=index.n_lists)
+    assert [m.name for m in matcher.match(queries, tolerance=10.0)] == [m.name for m in exact]
+
+
+def test_round_trip_maps_vectors(tmp_path, large_gallery):
+    encodings, names, queries = large_gallery
+    matcher = FaceMatcher(encodings, names)
+    index = IVFIndex.build(matcher.encodings, n_lists=16)
+    path = str(tmp_path / 'index.npz')
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    assert loaded.fingerprint == index.fingerprint
+    assert isinstance(loaded.vectors, np.memmap)
+    np.testing.assert_array_equal(loaded.list_ids, index.list_ids)
+    np.testing.assert_array_equal(loaded.vectors, matcher.encodings[index.list_ids])
+
+    matcher.attach_index(loaded, nprobe=4)
+    reference = FaceMatcher(encodings, names)
+    reference.attach_index(index, nprobe=4)
+    assert matcher.match(queries) == reference.match(queries)
+
+
+def test_index_size_must_match_gallery(gallery):
+    encodings, names, _ = gallery
+    matcher = FaceMatcher(encodings, names)
+    with pytest.raises(ValueError):
+        matcher.attach_index(IVFIndex.build(encodings[:6], n_lists=2))
+
+
+def test_truncated_index_is_rebuilt(tmp_path, large_gallery):
+    encodings = FaceMatcher(*large_gallery[:2]).encodings
+    path = str(tmp_path / 'index.npz')
+    load_or_build_index(path, encodings, n_lists=8).save(path)
+    with open(path, 'r+b') as f:
+        f.truncate(100)
+    index = load_or_build_index(path, encodings, n_lists=8)
+    assert index.n_lists == 8 and isinstance(index.vectors, np.memmap)
+    assert IVFIndex.load(path).fingerprint == index.fingerprint
+
+
+def test_stale_index_is_rebuilt(tmp_path, large_gallery):
+    encodings = FaceMatcher(*large_gallery[:2]).encodings
+    path = str(tmp_path / 'index.npz')
+    old = load_or_build_index(path, encodings[:500], n_lists=8)
+    new = load_or_build_index(path, encodings, n_lists=8)
+    assert new.fingerprint != old.fingerprint and len(new.list_ids) == len(encodings)
+    assert load_or_build_index(path, encodings, n_lists=4).n_lists == 4 # A new list count rebuilds too
+    # Only the current vectors file is kept
+    assert len([f for f in os.listdir(str(tmp_path)) if f.endswith('.vectors.npy')]) == 1
+
+
+def test_concurrent_builders(tmp_path, large_gallery):
+    encodings = FaceMatcher(*large_gallery[:2]).encodings
+    path = str(tmp_path / 'index.npz')
+    errors = []
+
+    def build():
+        try:
+            load_or_build_index(path, encodings, n_lists=8)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert not [f for f in os.listdir(str(tmp_path)) if f.endswith('.tmp')]
+    assert IVFIndex.load(path).n_lists == 8
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+pytest.importorskip('face_recognition')
+
+from batch import collect_inputs, output_paths
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+    return path
+
+
+def test_collect_inputs(tmp_path):
+    root = str(tmp_path)
+    a = touch(os.path.join(root, 'in', 'a.jpg'))
+    b = touch(os.path.join(root, 'in', 'sub', 'b.MP4'))
+    touch(os.path.join(root, 'in', 'notes.md')) # Not media
+    c = touch(os.path.join(root, 'other', 'c.png'))
+    d = touch(os.path.join(root, 'other', 'd.avi'))
+    manifest = os.path.join(root, 'list.txt')
+    with open(manifest, 'w') as f:
+        f.write(f'# comment\n\n{d}\n{a}\n')
+    paths = collect_inputs([os.path.join(root, 'in'), os.path.join(root, 'other', '*.png'), manifest, c])
+    assert paths == [a, b, c, d] # Order of first appearance, duplicates dropped
+
+
+def test_collect_inputs_reports_missing(tmp_path, capsys):
+    assert collect_inputs([str(tmp_path / 'missing' / '*.jpg')]) == []
+    assert 'No input matches' in capsys.readouterr().out
+
+
+def test_output_paths_are_stable_and_distinct(tmp_path):
+    first = output_paths(str(tmp_path / 'x' / 'clip.MOV'), 'out')
+    second = output_paths(str(tmp_path / 'y' / 'clip.MOV'), 'out')
+    assert first == output_paths(str(tmp_path / 'x' / 'clip.MOV'), 'out')
+    assert first != second
+    media, detections = first
+    assert media.startswith(os.path.join('out', 'clip_')) and media.endswith('.mov')
+    assert detections == media[:-len('.mov')] + '.detections.jsonl'
+    assert output_paths(str(tmp_path / 'x' / 'clip.MOV'), 'out', 'parquet')[1].endswith('.detections.parquet')
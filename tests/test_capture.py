@@ -0,0 +1,76 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from capture import LatestFrameCapture
+
+
+def write_video(path, count, size=(64, 48)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, size)
+    for i in range(count):
+        writer.write(np.full((size[1], size[0], 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+class StallingCapture:
+    """A cv2.VideoCapture stand-in: one frame, a stall until `resume` is set, one more frame, then the end."""
+
+    def __init__(self, source):
+        self.resume = threading.Event()
+        self.frames = 0
+
+    def read(self):
+        if self.frames == 1 and not self.resume.wait(2.0):
+            return False, None
+        if self.frames >= 2:
+            return False, None
+        self.frames += 1
+        return True, np.full((8, 8, 3), self.frames, dtype=np.uint8)
+
+    def get(self, prop):
+        return 0.0
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        self.resume.set()
+
+
+def test_file_is_read_to_the_end(tmp_path):
+    path = write_video(str(tmp_path / 'clip.avi'), 10)
+    cap = LatestFrameCapture(path, pace=False).start()
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    assert cap.finished and cap.captured == 10
+    assert 1 <= len(frames) == cap.delivered and cap.delivered + cap.dropped == 10
+    assert cap.take() is None # Nothing newer than the last frame read
+    assert cap.read() == (False, None)
+
+
+def test_read_waits_out_a_stall(monkeypatch):
+    monkeypatch.setattr(cv2, 'VideoCapture', StallingCapture)
+    cap = LatestFrameCapture('camera', pace=False).start()
+    assert cap.read(poll=0.05)[0]
+    threading.Timer(0.3, cap._cap.resume.set).start()
+    started = time.perf_counter()
+    ret, frame = cap.read(poll=0.05) # Longer than several polls: still a frame, not the end
+    assert ret and frame[0, 0, 0] == 2 and time.perf_counter() - started >= 0.25
+    assert cap.read(poll=0.05) == (False, None) # Source ended
+    cap.release()
+
+
+def test_release_ends_a_waiting_read(monkeypatch):
+    monkeypatch.setattr(cv2, 'VideoCapture', StallingCapture)
+    cap = LatestFrameCapture('camera', pace=False).start()
+    assert cap.read(poll=0.05)[0]
+    threading.Timer(0.1, cap.release).start()
+    assert cap.read(poll=0.05) == (False, None)
@@ -0,0 +1,43 @@
+import json
+import sys
+
+from detections import Detection, DetectionWriter, Face, RECORD_FIELDS, available_formats, detection_to_dict
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_writer_streams_jsonl(tmp_path):
+    path = str(tmp_path / 'out.jsonl')
+    frame = [Detection((0, 0, 100, 200), 'person', 0.91, [Face((10, 10, 50, 50), 'alice', 0.31),
+                                                           Face((60, 10, 90, 40), 'Unknown', float('inf'))], 3),
+             Detection((200, 0, 300, 80), 'car', 0.5, [])]
+    with DetectionWriter(path, source='cam.mp4', buffer_size=4) as writer:
+        writer.write(0, 0.0, frame)
+        assert writer.rows == 0 # Still buffered
+        writer.write(1, 0.04, frame)
+        assert writer.rows == 6 # Flushed at the buffer size
+        assert len(read_jsonl(path)) == 6
+    records = read_jsonl(path)
+    assert writer.rows == len(records) == 6
+    assert all(tuple(r) == RECORD_FIELDS for r in records)
+    alice, unknown, car = records[:3]
+    assert (alice['name'], alice['distance'], alice['track_id'], alice['source']) == ('alice', 0.31, 3, 'cam.mp4')
+    assert unknown['distance'] is None # inf is not valid JSON
+    assert car['label'] == 'car' and car['name'] is None and car['face_x1'] is None
+    assert records[3]['frame'] == 1 and records[3]['timestamp'] == 0.04
+
+
+def test_detection_to_dict():
+    det = Detection((1.0, 2.0, 3.0, 4.0), 'person', 0.123456, [Face((1, 2, 3, 4), 'bob', 0.4)], 7)
+    assert detection_to_dict(det) == {'box': [1, 2, 3, 4], 'label': 'person', 'confidence': 0.1235, 'track_id': 7,
+                                      'faces': [{'box': [1, 2, 3, 4], 'name': 'bob', 'distance': 0.4}]}
+
+
+def test_parquet_offered_only_with_pyarrow(monkeypatch):
+    assert available_formats()[0] == 'jsonl'
+    monkeypatch.setitem(sys.modules, 'pyarrow', None) # Makes the import fail
+    monkeypatch.delitem(sys.modules, 'pyarrow.parquet', raising=False)
+    assert available_formats() == ('jsonl',)
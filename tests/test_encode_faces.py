@@ -0,0 +1,55 @@
+import argparse
+
+import numpy as np
+import pytest
+
+pytest.importorskip('face_recognition') # encode_faces imports it at module level
+from encode_faces import compact_identities, _non_negative_int, MIN_IDENTITY_TOLERANCE, MAX_IDENTITY_TOLERANCE
+from face_matcher import FaceMatcher
+
+
+def grouped(gallery):
+    encodings, names, _ = gallery
+    return list(encodings), names
+
+
+def test_centroid_plus_medoids(gallery):
+    encodings, names = grouped(gallery)
+    out, out_names, stats = compact_identities(encodings, names, k=2)
+    assert out_names == ['alice'] * 3 + ['bob'] * 3 + ['carol'] * 3
+    np.testing.assert_allclose(out[0], np.mean(encodings[:4], axis=0), rtol=1e-5)
+    # Medoids are actual samples of the identity
+    assert any(np.allclose(out[1], e) for e in encodings[:4])
+    assert set(stats) == {'alice', 'bob', 'carol'}
+    assert stats['alice']['count'] == 4
+    assert MIN_IDENTITY_TOLERANCE <= stats['alice']['tolerance'] <= MAX_IDENTITY_TOLERANCE
+
+
+def test_k_zero_keeps_only_the_centroid(gallery):
+    # Regression: k=0 used to crash with "attempt to get argmin of an empty sequence"
+    encodings, names = grouped(gallery)
+    out, out_names, stats = compact_identities(encodings, names, k=0)
+    assert out_names == ['alice', 'bob', 'carol']
+    np.testing.assert_allclose(out[1], np.mean(encodings[4:8], axis=0), rtol=1e-5)
+    assert stats['bob']['count'] == 4
+
+
+def test_small_identities_are_kept_as_is(gallery):
+    encodings, names = grouped(gallery)
+    out, out_names, stats = compact_identities(encodings[:2] + encodings[4:5], ['alice', 'alice', 'bob'], k=2)
+    assert out_names == ['alice', 'alice', 'bob']
+    assert 'bob' not in stats # A single sample has no spread to derive a tolerance from
+
+
+def test_compacted_gallery_still_matches(gallery):
+    encodings, names = grouped(gallery)
+    _, _, centres = gallery
+    out, out_names, stats = compact_identities(encodings, names, k=1)
+    matcher = FaceMatcher(out, out_names, tolerances={name: s['tolerance'] for name, s in stats.items()})
+    assert [m.name for m in matcher.match(centres)] == ['alice', 'bob', 'carol']
+
+
+def test_negative_compact_is_rejected():
+    assert _non_negative_int('0') == 0
+    with pytest.raises(argparse.ArgumentTypeError):
+        _non_negative_int('-1')
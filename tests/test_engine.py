@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip('ultralytics')
+pytest.importorskip('face_recognition')
+
+from engine import resolve_classes
+
+NAMES = {0: 'person', 1: 'bicycle', 2: 'car'}
+
+
+def test_presets_and_names():
+    assert resolve_classes(NAMES, None) is None
+    assert resolve_classes(NAMES, 'all') is None
+    assert resolve_classes(NAMES, 'person') == [0]
+    assert resolve_classes(NAMES, 'car, person') == [0, 2]
+    assert resolve_classes(NAMES, ['car', 2, 1]) == [1, 2]
+
+
+def test_unknown_name():
+    with pytest.raises(ValueError, match='prson'):
+        resolve_classes(NAMES, 'prson')
+
+
+@pytest.mark.parametrize('class_id', [99, -1, 3])
+def test_unknown_id(class_id):
+    with pytest.raises(ValueError, match='class id'):
+        resolve_classes(NAMES, [class_id])
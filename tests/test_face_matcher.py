@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from face_matcher import FaceMatcher, UNKNOWN_NAME
+
+
+def test_nearest_identity(gallery):
+    encodings, names, centres = gallery
+    matcher = FaceMatcher(encodings, names)
+    matches = matcher.match(centres[[2, 0, 1]], tolerance=0.6)
+    assert [m.name for m in matches] == ['carol', 'alice', 'bob']
+    assert all(m.distance < 0.6 for m in matches)
+
+
+def test_distance_matches_brute_force(gallery):
+    encodings, names, centres = gallery
+    matcher = FaceMatcher(encodings, names)
+    query = centres[1] + 0.05
+    match, = matcher.match([query], tolerance=10.0)
+    expected = np.linalg.norm(encodings - query, axis=1)
+    assert match.distance == pytest.approx(float(expected.min()), rel=1e-4)
+
+
+def test_far_face_is_unknown(gallery):
+    encodings, names, centres = gallery
+    matcher = FaceMatcher(encodings, names)
+    match, = matcher.match([centres[0] + 5.0], tolerance=0.6)
+    assert match.name == UNKNOWN_NAME
+
+
+def test_margin_to_runner_up(gallery):
+    encodings, names, centres = gallery
+    matcher = FaceMatcher(encodings, names)
+    match, = matcher.match([centres[0]], tolerance=0.6)
+    per_identity = matcher.identity_distances([centres[0]])[0]
+    assert match.margin == pytest.approx(float(np.sort(per_identity)[1] - per_identity.min()), rel=1e-4)
+    assert match.margin > 1.0
+
+
+def test_single_identity_margin_is_infinite(gallery):
+    encodings, names, centres = gallery
+    matcher = FaceMatcher(encodings[:4], names[:4])
+    match, = matcher.match([centres[0]])
+    assert match.name == 'alice'
+    assert match.margin == float('inf')
+
+
+def test_unsorted_names_are_grouped(gallery):
+    encodings, names, centres = gallery
+    order = np.random.default_rng(1).permutation(len(names))
+    matcher = FaceMatcher(encodings[order], [names[i] for i in order])
+    assert [m.name for m in matcher.match(centres)] == ['alice', 'bob', 'carol']
+
+
+def test_empty_gallery():
+    matcher = FaceMatcher([], [])
+    assert len(matcher) == 0
+    assert matcher.match([]) == []
+    match, = matcher.match([np.zeros(128, dtype=np.float32)])
+    assert match.name == UNKNOWN_NAME and match.distance == float('inf')
+
+
+def test_mismatched_lengths():
+    with pytest.raises(ValueError):
+        FaceMatcher(np.zeros((2, 128)), ['alice'])
+
+
+def test_per_identity_tolerance(gallery):
+    encodings, names, centres = gallery
+    query = centres[0] + np.full(128, 0.02, dtype=np.float32) # About 0.23 away from alice
+    assert FaceMatcher(encodings, names).match([query], tolerance=0.6)[0].name == 'alice'
+    strict = FaceMatcher(encodings, names, tolerances={'alice': 0.1})
+    assert strict.match([query], tolerance=0.6)[0].name == UNKNOWN_NAME
+    # The tolerance passed to match() is a ceiling for per-identity ones
+    loose = FaceMatcher(encodings, names, tolerances={'alice': 1.0})
+    assert loose.match([query], tolerance=0.1)[0].name == UNKNOWN_NAME
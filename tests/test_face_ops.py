@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip('face_recognition')
+
+from face_ops import assign_faces_to_boxes
+
+
+def face(cx, cy, size=20):
+    """A (top, right, bottom, left) face location centred on (cx, cy)."""
+    half = size // 2
+    return (cy - half, cx + half, cy + half, cx - half)
+
+
+def test_faces_go_to_the_box_containing_their_centre():
+    boxes = [(0, 0, 100, 200), (200, 0, 300, 200)]
+    assert assign_faces_to_boxes([face(250, 40), face(50, 40)], boxes) == [[1], [0]]
+
+
+def test_face_outside_every_box_is_dropped():
+    assert assign_faces_to_boxes([face(500, 500)], [(0, 0, 100, 100)]) == [[]]
+    assert assign_faces_to_boxes([face(50, 50)], []) == []
+
+
+def test_overlapping_boxes_count_a_face_once():
+    # The face lies fully inside both boxes: the smaller box wins the tie
+    big, small = (0, 0, 300, 300), (40, 20, 140, 220)
+    assert assign_faces_to_boxes([face(90, 60)], [big, small]) == [[], [0]]
+
+
+def test_box_covering_more_of_the_face_wins():
+    # Centre in both boxes, but the face is cut off by the first one
+    left, right = (0, 0, 105, 200), (90, 0, 300, 200)
+    assert assign_faces_to_boxes([face(100, 50)], [left, right]) == [[], [0]]
@@ -0,0 +1,140 @@
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from face_matcher import FaceMatcher
+import face_store
+from face_store import load_store, migrate_pickle, save_store, ENCODINGS_FILE, HEADER_FILE, LABELS_FILE, NAMES_FILE
+
+
+def test_round_trip(tmp_path, gallery):
+    encodings, names, centres = gallery
+    order = [0, 4, 8, 1, 5, 9, 2, 6, 10, 3, 7, 11] # Interleaved identities
+    header = save_store(str(tmp_path), encodings[order], [names[i] for i in order],
+                        tolerances={'bob': 0.4}, stats={'images': 12})
+    store = load_store(str(tmp_path))
+    assert header['count'] == 12 and header['identities'] == 3
+    assert store.names == ['alice', 'bob', 'carol']
+    assert np.all(np.diff(store.labels) >= 0) # Grouped by identity
+    assert isinstance(store.encodings, np.memmap)
+    np.testing.assert_allclose(np.sort(store.encodings, axis=0), np.sort(encodings, axis=0))
+    assert store.header['tolerances'] == {'bob': 0.4}
+    assert store.header['stats'] == {'images': 12}
+
+    matcher = FaceMatcher.from_store(store)
+    assert [m.name for m in matcher.match(centres)] == ['alice', 'bob', 'carol']
+    assert matcher.identity_tolerances[1] == 0.4
+
+
+def test_load_without_mmap(tmp_path, gallery):
+    encodings, names, _ = gallery
+    save_store(str(tmp_path), encodings, names)
+    store = load_store(str(tmp_path), mmap=False)
+    assert not isinstance(store.encodings, np.memmap)
+    assert len(store.encodings) == len(names)
+
+
+def test_empty_store(tmp_path):
+    save_store(str(tmp_path), [], [])
+    store = load_store(str(tmp_path))
+    assert len(store.encodings) == 0 and store.names == []
+    assert len(FaceMatcher.from_store(store)) == 0
+
+
+def test_pickle_migration(tmp_path, gallery):
+    encodings, names, centres = gallery
+    pickle_path = str(tmp_path / 'known_faces_encodings.pkl')
+    with open(pickle_path, 'wb') as f:
+        pickle.dump({'encodings': list(encodings), 'names': names, 'tolerances': {'carol': 0.5}}, f)
+    store_dir = str(tmp_path / 'store')
+    header = migrate_pickle(pickle_path, store_dir)
+    assert header['encoder'] == {'migrated_from': 'known_faces_encodings.pkl'}
+    store = load_store(store_dir)
+    assert store.header['tolerances'] == {'carol': 0.5}
+    matcher = FaceMatcher.from_store(store)
+    assert [m.name for m in matcher.match(centres)] == ['alice', 'bob', 'carol']
+
+
+def test_unsupported_schema(tmp_path, gallery):
+    encodings, names, _ = gallery
+    save_store(str(tmp_path), encodings, names)
+    path = os.path.join(str(tmp_path), HEADER_FILE)
+    with open(path) as f:
+        header = json.load(f)
+    header['schema_version'] = 99
+    with open(path, 'w') as f:
+        json.dump(header, f)
+    with pytest.raises(ValueError, match='schema'):
+        load_store(str(tmp_path))
+
+
+def test_mixed_generation_is_detected(tmp_path, gallery):
+    encodings, names, _ = gallery
+    save_store(str(tmp_path), encodings, names)
+    # Same row count, different labels: a labels file from another update
+    labels = np.load(os.path.join(str(tmp_path), LABELS_FILE))
+    np.save(os.path.join(str(tmp_path), LABELS_FILE), labels[::-1].copy())
+    with pytest.raises(ValueError, match='incomplete'):
+        load_store(str(tmp_path), retries=1, retry_delay=0)
+
+
+def test_swapped_encodings_are_detected(tmp_path, gallery):
+    encodings, names, _ = gallery
+    save_store(str(tmp_path / 'old'), encodings + 1.0, names)
+    save_store(str(tmp_path), encodings, names)
+    # Same shape and labels: only the encodings come from another update
+    os.replace(os.path.join(str(tmp_path / 'old'), ENCODINGS_FILE), os.path.join(str(tmp_path), ENCODINGS_FILE))
+    with pytest.raises(ValueError, match='incomplete'):
+        load_store(str(tmp_path), retries=0)
+
+
+def test_names_from_another_generation_are_detected(tmp_path, gallery):
+    encodings, names, _ = gallery
+    save_store(str(tmp_path / 'old'), encodings, names)
+    save_store(str(tmp_path), encodings, names)
+    os.replace(os.path.join(str(tmp_path / 'old'), NAMES_FILE), os.path.join(str(tmp_path), NAMES_FILE))
+    with pytest.raises(ValueError, match='incomplete'):
+        load_store(str(tmp_path), retries=0)
+
+
+def test_load_does_not_hash_the_matrix(tmp_path, gallery, monkeypatch):
+    encodings, names, _ = gallery
+    save_store(str(tmp_path), encodings, names)
+
+    def fail(matrix):
+        raise AssertionError('full fingerprint computed on load')
+    monkeypatch.setattr(face_store, 'gallery_fingerprint', fail)
+    assert load_store(str(tmp_path)).names == ['alice', 'bob', 'carol']
+
+
+def test_schema_1_store(tmp_path, gallery):
+    encodings, names, _ = gallery
+    save_store(str(tmp_path), encodings, names)
+    path = os.path.join(str(tmp_path), HEADER_FILE)
+    with open(path) as f:
+        header = json.load(f)
+    header['schema_version'] = 1
+    for key in ('generation', 'sizes', 'sample_digest'):
+        del header[key]
+    with open(path, 'w') as f:
+        json.dump(header, f)
+    with open(os.path.join(str(tmp_path), NAMES_FILE), 'w') as f:
+        json.dump(['alice', 'bob', 'carol'], f) # Schema 1 names.json is a plain list
+    assert load_store(str(tmp_path)).names == ['alice', 'bob', 'carol']
+
+
+def test_legacy_header_without_digests(tmp_path, gallery):
+    encodings, names, _ = gallery
+    save_store(str(tmp_path), encodings, names)
+    path = os.path.join(str(tmp_path), HEADER_FILE)
+    with open(path) as f:
+        header = json.load(f)
+    header['schema_version'] = 1
+    for key in ('labels_digest', 'names_digest', 'generation', 'sizes', 'sample_digest'):
+        del header[key]
+    with open(path, 'w') as f:
+        json.dump(header, f)
+    assert len(load_store(str(tmp_path)).labels) == len(names)
@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip('face_recognition')
+
+from multicam import FairScheduler
+
+
+def ready(*names, captured_at=10.0):
+    return {name: (1, f'frame-{name}', captured_at) for name in names}
+
+
+def test_round_robin_rotates():
+    scheduler = FairScheduler(['a', 'b', 'c'], max_batch=2, max_age=0)
+    assert [p[0] for p in scheduler.pick(ready('a', 'b', 'c'), 10.0)] == ['a', 'b']
+    assert [p[0] for p in scheduler.pick(ready('a', 'b', 'c'), 10.0)] == ['c', 'a']
+    # A camera with nothing ready does not hold up the rotation
+    assert [p[0] for p in scheduler.pick(ready('a', 'c'), 10.0)] == ['c', 'a']
+
+
+def test_deadline_serves_oldest_first():
+    scheduler = FairScheduler(['a', 'b', 'c'], policy='deadline', max_batch=2, max_age=1.0)
+    frames = {'a': (1, 'fa', 9.8), 'b': (1, 'fb', 9.5), 'c': (1, 'fc', 9.9)}
+    assert scheduler.pick(frames, 10.0) == [('b', 1, 'fb', 9.5), ('a', 1, 'fa', 9.8)]
+
+
+def test_stale_frames_are_dropped():
+    scheduler = FairScheduler(['a', 'b'], max_age=0.5)
+    frames = {'a': (3, 'fa', 9.0), 'b': (4, 'fb', 9.9)}
+    assert [p[0] for p in scheduler.pick(frames, 10.0)] == ['b']
+    assert scheduler.stale == {'a': 1, 'b': 0}
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        FairScheduler(['a'], policy='fifo')
@@ -0,0 +1,133 @@
+import random
+import threading
+import time
+
+import pytest
+
+from pipeline import run_pipeline
+
+
+def counting_source(n):
+    frames = iter(range(n))
+    return lambda: next(frames, None)
+
+
+def jittery_recognize(frame, result, index):
+    time.sleep(random.random() * 0.002) # Workers finish out of order
+    return (frame, result, index)
+
+
+def test_output_is_in_source_order():
+    written = []
+    report = run_pipeline(counting_source(50), lambda frames: [f * 10 for f in frames], jittery_recognize,
+                          written.append, workers=4, queue_size=4, batch_size=3)
+    assert written == [(i, i * 10, i) for i in range(50)]
+    assert report['frames'] == 50
+    assert report['stages']['detect']['items'] == 50
+    assert report['stages']['recognize']['items'] == 50
+
+
+def test_empty_source():
+    written = []
+    report = run_pipeline(counting_source(0), lambda frames: frames, jittery_recognize, written.append)
+    assert written == [] and report['frames'] == 0
+
+
+def test_writer_can_stop_early():
+    written = []
+
+    def write(frame):
+        written.append(frame)
+        return len(written) < 5
+
+    report = run_pipeline(counting_source(1000), lambda frames: frames, jittery_recognize, write, workers=3)
+    assert [frame for frame, _, _ in written] == [0, 1, 2, 3, 4]
+    assert report['frames'] == 5
+
+
+def test_stop_event():
+    stop_event = threading.Event()
+    written = []
+
+    def read():
+        time.sleep(0.001)
+        return 0 # Endless source
+
+    def write(frame):
+        written.append(frame)
+        if len(written) == 10:
+            stop_event.set()
+
+    report = run_pipeline(read, lambda frames: frames, jittery_recognize, write, stop_event=stop_event, workers=2)
+    assert report['frames'] >= 10
+    assert [index for _, _, index in written] == list(range(len(written)))
+
+
+def fail_on(bad, fn):
+    """Wrap a stage function so it raises once it sees item `bad` (the last argument)."""
+    def run(*args):
+        if args[-1] == bad:
+            raise RuntimeError('stage failed')
+        return fn(*args)
+    return run
+
+
+def test_read_error_propagates():
+    frames = iter(range(100))
+    def read():
+        frame = next(frames)
+        if frame == 7:
+            raise RuntimeError('stage failed')
+        return frame
+    with pytest.raises(RuntimeError, match='stage failed'):
+        run_pipeline(read, lambda frames: frames, jittery_recognize, lambda frame: None, workers=3, queue_size=2)
+
+
+def test_detect_error_propagates():
+    def detect(frames):
+        if 7 in frames:
+            raise RuntimeError('stage failed')
+        return frames
+    with pytest.raises(RuntimeError, match='stage failed'):
+        run_pipeline(counting_source(100), detect, jittery_recognize, lambda frame: None, workers=3, queue_size=2)
+
+
+def test_recognize_error_propagates():
+    with pytest.raises(RuntimeError, match='stage failed'):
+        run_pipeline(counting_source(100), lambda frames: frames, fail_on(7, jittery_recognize),
+                     lambda frame: None, workers=3, queue_size=2)
+
+
+def test_write_error_propagates():
+    with pytest.raises(RuntimeError, match='stage failed'):
+        run_pipeline(counting_source(100), lambda frames: frames, lambda frame, result, index: index,
+                     fail_on(7, lambda frame: None), workers=3, queue_size=2)
+
+
+class RecordingPool:
+    """Stands in for face_ops.FacePool: one face per box, with a known encoding."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.calls = []
+
+    def locate_and_encode(self, rgb_images, boxes_per_image, mode='roi', scale=1.0):
+        self.calls.append((len(rgb_images), mode, scale))
+        located = [[[(y1, x2, y2, x1)] for x1, y1, x2, y2 in boxes] for boxes in boxes_per_image]
+        encoded = [[self.encoding] * len(boxes) for boxes in boxes_per_image]
+        return located, encoded, {'locate': 0.0, 'encode': 0.0}
+
+
+def test_recognize_boxes_uses_face_pool(gallery):
+    pytest.importorskip('face_recognition')
+    import numpy as np
+    from face_matcher import FaceMatcher
+    from main import recognize_boxes
+    encodings, names, centres = gallery
+    pool = RecordingPool(centres[1])
+    frames = [np.zeros((40, 40, 3), dtype=np.uint8)] * 2
+    found = recognize_boxes(frames, [[(0, 0, 10, 10), (10, 10, 20, 20)], []], FaceMatcher(encodings, names),
+                            0.5, 'frame', 0.5, face_pool=pool)
+    assert pool.calls == [(2, 'frame', 0.5)]
+    assert [[f.name for f in faces] for faces in found[0]] == [['bob'], ['bob']]
+    assert found[0][1][0].box == (10, 10, 20, 20) and found[1] == []
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('face_recognition')
+
+from metrics import disable_metrics
+from service import RecognitionService
+
+
+class BufferWriter:
+    def __init__(self):
+        self.data = b''
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def exchange(raw):
+    """Feed one raw HTTP request to RecognitionService._handle; returns (status, payload)."""
+    service = RecognitionService(engine=None, settings={})
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        writer = BufferWriter()
+        await service._handle(reader, writer)
+        return writer
+
+    try:
+        writer = asyncio.run(run())
+    finally:
+        disable_metrics()
+    head, _, body = writer.data.partition(b'\r\n\r\n')
+    assert writer.closed
+    return int(head.split()[1]), json.loads(body)
+
+
+@pytest.mark.parametrize('length', ['abc', '-5', '1.5'])
+def test_bad_content_length(length):
+    raw = f'POST /recognize HTTP/1.1\r\nContent-Length: {length}\r\n\r\nxx'.encode()
+    assert exchange(raw) == (400, {'error': 'Bad Content-Length'})
+
+
+def test_empty_body_is_rejected():
+    raw = b'POST /recognize HTTP/1.1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+    assert exchange(raw)[0] == 400
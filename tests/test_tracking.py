@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from detections import Detection, Face
+from tracking import DetectionScheduler, IdentityCache, IoUTracker, MotionGate, make_motion_gate
+
+
+def person(box, faces=()):
+    return Detection(box, 'person', 0.9, list(faces))
+
+
+def test_tracker_keeps_ids_and_predicts():
+    tracker = IoUTracker()
+    first = tracker.update([person((0, 0, 100, 200)), person((300, 0, 400, 200))])
+    second = tracker.update([person((310, 0, 410, 200)), person((10, 0, 110, 200))])
+    ids = {det.box[0] // 100: det.track_id for det in first}
+    assert {det.box[0] // 100: det.track_id for det in second} == ids
+    # Constant velocity between detections: both boxes moved 10 px per frame
+    predicted = sorted(tracker.predict())
+    assert [det.box[0] for det in predicted] == [15, 315]
+
+
+def test_tracker_drops_lost_tracks():
+    tracker = IoUTracker(max_missed=1)
+    tracker.update([person((0, 0, 100, 200))])
+    tracker.update([])
+    assert tracker.tracks
+    tracker.update([])
+    assert not tracker.tracks
+
+
+def test_tracker_carries_faces():
+    tracker = IoUTracker()
+    det, = tracker.update([person((0, 0, 100, 200))])
+    tracker.attach_faces(det.track_id, [Face((20, 10, 60, 50), 'alice', 0.3)])
+    moved, = tracker.update([person((10, 0, 110, 200))])
+    assert moved.faces == [] # A fresh detection brings its own (empty) faces
+    tracker.attach_faces(moved.track_id, [Face((30, 10, 70, 50), 'alice', 0.3)])
+    predicted, = tracker.predict()
+    assert predicted.faces[0].name == 'alice'
+    assert predicted.faces[0].box[0] - predicted.box[0] == 20
+
+
+def test_scheduler_fixed_interval():
+    scheduler = DetectionScheduler(interval=3)
+    assert [scheduler.should_detect() for _ in range(7)] == [True, False, False, True, False, False, True]
+    scheduler.record(5.0) # A fixed interval ignores latency
+    assert scheduler.interval == 3
+
+
+def test_scheduler_every_frame_by_default():
+    scheduler = DetectionScheduler()
+    assert all(scheduler.should_detect() for _ in range(5))
+
+
+def test_scheduler_auto_interval_follows_latency():
+    scheduler = DetectionScheduler(interval='auto', target_fps=30.0, max_interval=10)
+    assert scheduler.interval == 1
+    scheduler.record(0.09) # 2.7 frame budgets
+    assert scheduler.interval == 3
+    assert [scheduler.should_detect() for _ in range(4)] == [True, False, False, True]
+    for _ in range(50):
+        scheduler.record(2.0)
+    assert scheduler.interval == 10 # Capped at max_interval
+    for _ in range(50):
+        scheduler.record(0.001)
+    assert scheduler.interval == 1
+
+
+def test_motion_gate_skips_static_frames():
+    gate = MotionGate()
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    moved = frame.copy()
+    moved[60:180, 80:240] = 255
+    assert gate.select([frame, frame.copy(), moved, moved.copy()]) == [True, False, True, False]
+    assert gate.stats()['skipped'] == 2
+
+
+def test_motion_gate_max_skip():
+    gate = MotionGate(max_skip=2)
+    frame = np.zeros((120, 160), dtype=np.uint8)
+    assert gate.select([frame] * 5) == [True, False, False, True, False]
+
+
+def test_motion_gate_fill_reuses_last_detections():
+    gate = MotionGate()
+    a, b = [person((0, 0, 10, 10))], [person((5, 5, 15, 15))]
+    assert gate.fill([True, False, True, False], [a, b]) == [a, a, b, b]
+    assert gate.fill([False], []) == [b] # Carries over from the previous batch
+
+
+def test_make_motion_gate():
+    assert make_motion_gate(None) is None
+    assert make_motion_gate(False) is None
+    assert isinstance(make_motion_gate(True), MotionGate)
+
+
+def test_identity_cache_hit_and_reverify():
+    clock = [0.0]
+    cache = IdentityCache(reverify_after=2.0, clock=lambda: clock[0])
+    frame = np.full((200, 200, 3), 128, dtype=np.uint8)
+    det = Detection((50, 50, 150, 190), 'person', 0.9, [], 1)
+    assert cache.lookup(frame, det) is None
+    cache.store(frame, det, [Face((70, 60, 110, 100), 'alice', 0.3)])
+    clock[0] = 1.0
+    shifted = det._replace(box=(60, 50, 160, 190))
+    faces = cache.lookup(frame, shifted)
+    assert faces == [Face((80, 60, 120, 100), 'alice', 0.3)] # Follows the box
+    clock[0] = 2.5
+    assert cache.lookup(frame, det) is None # Too old: recognize again
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+
+def test_identity_cache_ignores_unknown_faces():
+    cache = IdentityCache(clock=lambda: 0.0)
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    det = Detection((10, 10, 60, 90), 'person', 0.9, [], 1)
+    cache.store(frame, det, [Face((20, 20, 40, 40), 'Unknown', 0.8)])
+    assert cache.lookup(frame, det) is None
+
+
+class CountingPool:
+    """Stands in for face_ops.FacePool: one face in the top third of every box."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.boxes = 0
+
+    def locate_and_encode(self, rgb_images, boxes_per_image, mode='roi', scale=1.0):
+        self.boxes += sum(len(boxes) for boxes in boxes_per_image)
+        located = [[[(y1, x2, y1 + (y2 - y1) // 3, x1)] for x1, y1, x2, y2 in boxes] for boxes in boxes_per_image]
+        encoded = [[self.encoding] * len(boxes) for boxes in boxes_per_image]
+        return located, encoded, {}
+
+
+def test_identity_cache_within_a_batch(gallery, monkeypatch):
+    pytest.importorskip('face_recognition')
+    import main
+    from face_matcher import FaceMatcher
+    encodings, names, centres = gallery
+    monkeypatch.setattr(main, 'detect_objects', lambda frame, model, results=None: [person((50, 50, 150, 190))])
+    frames = [np.full((200, 200, 3), 128, dtype=np.uint8) for _ in range(4)]
+    pool = CountingPool(centres[2])
+    analyzed = main.analyze_frames(frames, None, FaceMatcher(encodings, names), 0.5, tracker=IoUTracker(),
+                                   identity_cache=IdentityCache(clock=lambda: 0.0), face_pool=pool)
+    assert pool.boxes == 1 # The track's first frame is encoded, the other three reuse it
+    assert [[f.name for f in dets[0].faces] for dets in analyzed] == [['carol']] * 4
+
+    # Unknown faces are not cached, so every frame of the batch is encoded
+    pool = CountingPool(centres[2] + 5.0)
+    main.analyze_frames(frames, None, FaceMatcher(encodings, names), 0.5, tracker=IoUTracker(),
+                        identity_cache=IdentityCache(clock=lambda: 0.0), face_pool=pool)
+    assert pool.boxes == 4
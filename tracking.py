@@ -0,0 +1,320 @@
+import math
+import time
+import itertools
+from collections import OrderedDict
+import cv2
+import numpy as np
+from detections import Detection, Face
+
+
+def iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """A box followed across frames, with its faces stored relative to the box corner."""
+
+    def __init__(self, track_id, detection):
+        self.id = track_id
+        self.velocity = np.zeros(4)
+        self.identity = None # Last recognized (non-Unknown) name
+        self.missed = 0
+        self._set(detection)
+
+    def _set(self, detection):
+        self.box = np.asarray(detection.box, dtype=float)
+        self.anchor = self.box # Last detected box, the reference for velocity
+        self.label = detection.label
+        self.confidence = detection.confidence
+        self.set_faces(detection.faces)
+
+    def set_faces(self, faces):
+        x1, y1 = self.box[:2]
+        self.faces = [(np.asarray(f.box, dtype=float) - (x1, y1, x1, y1), f.name, f.distance) for f in faces]
+        named = [f.name for f in faces if f.name != 'Unknown']
+        if named:
+            self.identity = named[0]
+
+    def update(self, detection, frames_elapsed):
+        new_box = np.asarray(detection.box, dtype=float)
+        # Smoothed per-frame motion, used to extrapolate on frames without detection
+        self.velocity = 0.5 * self.velocity + 0.5 * (new_box - self.anchor) / max(frames_elapsed, 1)
+        self._set(detection)
+        self.missed = 0
+
+    def predict(self):
+        self.box = self.box + self.velocity
+
+    def detection(self):
+        box = tuple(int(round(v)) for v in self.box)
+        x1, y1 = self.box[:2]
+        faces = [Face(tuple(int(round(v)) for v in offset + (x1, y1, x1, y1)), name, distance)
+                 for offset, name, distance in self.faces]
+        return Detection(box, self.label, self.confidence, faces, self.id)
+
+
+class IoUTracker:
+    """Greedy IoU association of detections to tracks, with constant-velocity prediction in between.
+
+    update() is called on frames that ran full detection; predict() moves the
+    tracks on frames that did not. Tracks unmatched for more than max_missed
+    detection rounds are dropped.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=2):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._frames_since_update = 0
+
+    def update(self, detections):
+        elapsed = self._frames_since_update + 1
+        self._frames_since_update = 0
+        for track in self.tracks:
+            track.predict() # Compare against where the track should be now
+        pairs = sorted(((iou(track.box, det.box), ti, di)
+                        for ti, track in enumerate(self.tracks)
+                        for di, det in enumerate(detections)
+                        if track.label == det.label), reverse=True)
+        used_tracks, used_dets = set(), set()
+        for score, ti, di in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in used_tracks or di in used_dets:
+                continue
+            self.tracks[ti].update(detections[di], elapsed)
+            used_tracks.add(ti)
+            used_dets.add(di)
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        for di, det in enumerate(detections):
+            if di not in used_dets:
+                self.tracks.append(Track(next(self._ids), det))
+        return [t.detection() for t in self.tracks if t.missed == 0]
+
+    def attach_faces(self, track_id, faces):
+        """Set the faces of a track after recognition ran on its box."""
+        for track in self.tracks:
+            if track.id == track_id:
+                track.set_faces(faces)
+                return
+
+    def predict(self):
+        self._frames_since_update += 1
+        for track in self.tracks:
+            track.predict()
+        return [t.detection() for t in self.tracks if t.missed == 0]
+
+
+class DetectionScheduler:
+    """Decide which frames run full detection.
+
+    With a fixed interval N, every Nth frame is detected. With interval
+    'auto', N is chosen from the measured detection latency so that the
+    amortised cost per frame stays within the camera's frame budget.
+    """
+
+    def __init__(self, interval=1, target_fps=30.0, max_interval=30):
+        self.adaptive = interval == 'auto'
+        self.interval = 1 if self.adaptive else max(1, int(interval))
+        self.frame_budget = 1.0 / (target_fps or 30.0)
+        self.max_interval = max_interval
+        self._latency = None
+        self._skipped = None # Frames since the last detection; None before the first one
+
+    def should_detect(self):
+        if self._skipped is None or self._skipped + 1 >= self.interval:
+            self._skipped = 0
+            return True
+        self._skipped += 1
+        return False
+
+    def record(self, seconds):
+        """Report how long a full detection frame took."""
+        if not self.adaptive:
+            return
+        self._latency = seconds if self._latency is None else 0.8 * self._latency + 0.2 * seconds
+        self.interval = min(self.max_interval, max(1, math.ceil(self._latency / self.frame_budget)))
+
+
+class MotionGate:
+    """Skip detection on frames where nothing moved, reusing the last detected frame's results.
+
+    Each frame is reduced to a blurred grayscale thumbnail `size` pixels
+    wide and compared with the thumbnail of the last frame that went through
+    detection. The frame counts as changed when more than `threshold` of its
+    pixels differ by over pixel_threshold grey levels. Comparing against the
+    last detected frame, not the previous one, lets slow movement add up
+    until it triggers detection. At least every max_skip frames detection
+    runs anyway, so results never go stale for long.
+    """
+
+    def __init__(self, threshold=0.005, pixel_threshold=25, size=160, max_skip=250):
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.max_skip = max_skip
+        self.last = [] # Detections of the last detected frame
+        self.frames = 0
+        self.skipped = 0
+        self.gate_seconds = 0.0 # Cost of the gate itself
+        self.detect_seconds = 0.0 # Cost of the frames that were detected
+        self.detected = 0
+        self._reference = None
+        self._run = 0 # Frames skipped since the last detection
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (self.size, max(1, round(h * self.size / w))), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0) # Sensor noise and compression artefacts are not motion
+
+    def changed(self, frame):
+        """True if frame must go through detection; it then becomes the new reference."""
+        start = time.perf_counter()
+        self.frames += 1
+        thumb = self._thumbnail(frame)
+        if self._reference is None or self._reference.shape != thumb.shape or self._run >= self.max_skip:
+            changed = True
+        else:
+            moving = np.count_nonzero(cv2.absdiff(thumb, self._reference) > self.pixel_threshold)
+            changed = moving > self.threshold * thumb.size
+        if changed:
+            self._reference = thumb
+            self._run = 0
+        else:
+            self._run += 1
+            self.skipped += 1
+        self.gate_seconds += time.perf_counter() - start
+        return changed
+
+    def select(self, frames):
+        """changed() for each frame of a batch, in order."""
+        return [self.changed(frame) for frame in frames]
+
+    def fill(self, flags, detected):
+        """Per-frame detections for a batch: detected holds results for the flagged frames, in order;
+        the other frames reuse the results of the detected frame before them."""
+        detected = iter(detected)
+        out = []
+        for flag in flags:
+            if flag:
+                self.last = next(detected)
+            out.append(self.last)
+        return out
+
+    def record(self, seconds, frames=1):
+        """Report how long detection and recognition took for `frames` gated-in frames."""
+        self.detect_seconds += seconds
+        self.detected += frames
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def stats(self):
+        per_frame = self.detect_seconds / self.detected if self.detected else 0.0
+        saved = self.skipped * per_frame
+        return {'frames': self.frames, 'skipped': self.skipped, 'skip_ratio': round(self.skip_ratio, 3),
+                'gate_ms_per_frame': round(1000 * self.gate_seconds / self.frames, 3) if self.frames else 0.0,
+                'saved_s': round(saved, 2),
+                # Estimated speed-up of detection + recognition, gate cost included
+                'speedup': round((self.frames * per_frame) / (self.detect_seconds + self.gate_seconds), 2)
+                           if self.detect_seconds else 1.0}
+
+
+def make_motion_gate(setting):
+    """MotionGate for settings['motion_gate']: None/False is off, True uses the default threshold,
+    a number is the fraction of changed pixels that counts as motion."""
+    if setting is None or setting is False:
+        return None
+    return MotionGate() if setting is True else MotionGate(threshold=float(setting))
+
+
+class IdentityCache:
+    """Per-track cache of recognized faces, so a known person is not re-encoded every frame.
+
+    A track's faces are reused until the entry is older than reverify_after
+    seconds or the box content changes by more than appearance_threshold
+    (mean absolute difference of a small grayscale thumbnail, 0-1). Entries
+    unseen for ttl seconds expire, and at most max_entries are kept (LRU).
+    Only results with at least one known face are cached. clock supplies
+    the current time in seconds; offline video passes the stream position.
+    """
+
+    def __init__(self, reverify_after=2.0, ttl=10.0, max_entries=256, appearance_threshold=0.12, clock=time.monotonic):
+        self.clock = clock
+        self.reverify_after = reverify_after
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.appearance_threshold = appearance_threshold
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _signature(frame, box):
+        x1, y1, x2, y2 = box
+        crop = frame[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)]
+        if crop.size == 0:
+            return None
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        return cv2.resize(gray, (16, 32), interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+    def _evict(self, now):
+        expired = [tid for tid, e in self._entries.items() if now - e['seen'] > self.ttl]
+        for tid in expired:
+            del self._entries[tid]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, frame, detection, now=None):
+        """Cached faces for the detection's track, mapped onto its current box, or None."""
+        now = self.clock() if now is None else now
+        self._evict(now)
+        entry = self._entries.get(detection.track_id)
+        if entry is None or now - entry['verified'] > self.reverify_after:
+            self.misses += 1
+            return None
+        signature = self._signature(frame, detection.box)
+        if signature is None or entry['signature'] is None or float(np.mean(np.abs(signature - entry['signature']))) > self.appearance_threshold:
+            self.misses += 1
+            return None
+        entry['seen'] = now
+        self._entries.move_to_end(detection.track_id)
+        self.hits += 1
+        x1, y1, x2, y2 = detection.box
+        w, h = max(x2 - x1, 1), max(y2 - y1, 1)
+        return [Face((int(x1 + l * w), int(y1 + t * h), int(x1 + r * w), int(y1 + b * h)), name, distance)
+                for (l, t, r, b), name, distance in entry['faces']]
+
+    def store(self, frame, detection, faces, now=None):
+        if detection.track_id is None or not any(f.name != 'Unknown' for f in faces):
+            self._entries.pop(detection.track_id, None)
+            return
+        now = self.clock() if now is None else now
+        x1, y1, x2, y2 = detection.box
+        w, h = max(x2 - x1, 1), max(y2 - y1, 1)
+        # Faces relative to the box size so they follow the person as the box changes
+        relative = [(((f.box[0] - x1) / w, (f.box[1] - y1) / h, (f.box[2] - x1) / w, (f.box[3] - y1) / h), f.name, f.distance)
+                    for f in faces]
+        self._entries[detection.track_id] = {'faces': relative, 'signature': self._signature(frame, detection.box),
+                                             'verified': now, 'seen': now}
+        self._entries.move_to_end(detection.track_id)
+        self._evict(now)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hit_rate, 3), 'entries': len(self._entries)}
@@ -17,12 +17,39 @@ def draw_box(img, box, label=None, color=(0,255,0), thickness=2):
 
 def resize_image(image, width=None, height=None):
     h, w = image.shape[:2]
+    # Thin images (e.g. a narrow ROI) must not round a side down to 0, which cv2.resize rejects
     if width is not None:
         r = width / float(w)
-        dim = (width, int(h * r))
+        dim = (width, max(1, int(h * r)))
     elif height is not None:
         r = height / float(h)
-        dim = (int(w * r), height)
+        dim = (max(1, int(w * r)), height)
     else:
         return image
     return cv2.resize(image, dim, interpolation=cv2.INTER_AREA)
+
+RENDER_MODES = ('full', 'minimal', 'none')
+
+def draw_detections(img, detections, mode='full'):
+    """Draw YOLO boxes and the faces recognized inside them (see detections.Detection).
+
+    mode 'full' labels every box; 'minimal' draws plain rectangles and labels
+    only faces with their name; 'none' leaves the frame untouched.
+    """
+    if mode == 'none' or not detections:
+        return
+    if mode == 'full':
+        for det in detections:
+            draw_box(img, det.box, det.label)
+            for face in det.faces:
+                draw_box(img, face.box, face.name, color=(255,0,0))
+        return
+    # Minimal: one thickness for the frame, no text measuring except for face names
+    h, w = img.shape[:2]
+    thickness = max(int(2 * max(w, h) / 640), 2)
+    for det in detections:
+        x1, y1, x2, y2 = det.box
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0,255,0), thickness)
+    for det in detections:
+        for face in det.faces:
+            draw_box(img, face.box, face.name, color=(255,0,0))